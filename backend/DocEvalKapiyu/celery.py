@@ -0,0 +1,57 @@
+"""
+Celery config for DocEvalKapiyu project.
+
+Document uploads are processed by a separate worker pool:
+
+    celery -A DocEvalKapiyu worker --loglevel=info
+
+Broker and behaviour are read from Django settings with the ``CELERY_``
+prefix (e.g. ``CELERY_BROKER_URL``, ``CELERY_TASK_ALWAYS_EAGER`` for running
+tasks in-process during tests). Worker concurrency is independent of the web
+server and can be set with ``CELERY_WORKER_CONCURRENCY`` or ``--concurrency``.
+
+Scanned PDFs are OCR'd on a process pool (``DOCUMENT_EXTRACTION_WORKERS``).
+Children of the default prefork pool are daemonic and may not start processes,
+so under prefork OCR runs sequentially in each child (a warning is logged once).
+To OCR pages in parallel, run the worker with a thread pool:
+
+    celery -A DocEvalKapiyu worker --pool threads --concurrency 2 --loglevel=info
+
+or set ``CELERY_WORKER_POOL = 'threads'``.
+
+The classifier is loaded once in the worker's main process at start-up
+(``CLASSIFIER_WARM_UP``, see api/tasks.py); prefork children share it
+copy-on-write. ONNX and CUDA models don't survive fork, so with those each
+prefork child loads its own copy before reporting alive. That takes longer
+than Celery's default 4 s ``worker_proc_alive_timeout``, after which the
+parent kills and respawns the child, so the timeout is raised to
+``CELERY_WORKER_PROC_ALIVE_TIMEOUT`` (default 60 s; ``manage.py warm_up_classifier``
+reports the load time).
+"""
+
+import os
+
+from celery import Celery
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'DocEvalKapiyu.settings')
+
+app = Celery('DocEvalKapiyu')
+app.config_from_object('django.conf:settings', namespace='CELERY')
+
+if not app.conf.broker_url:
+    app.conf.broker_url = os.environ.get('CELERY_BROKER_URL', 'redis://localhost:6379/0')
+
+if not app.conf.worker_concurrency:
+    # Each upload can fan out its own OCR processes, so keep the default low.
+    app.conf.worker_concurrency = int(os.environ.get('CELERY_WORKER_CONCURRENCY', 2))
+
+# Children that load their own classifier need more than the default 4 s to start.
+app.conf.worker_proc_alive_timeout = max(
+    app.conf.worker_proc_alive_timeout or 0,
+    float(os.environ.get('CELERY_WORKER_PROC_ALIVE_TIMEOUT', 60)),
+)
+
+# Uploads take minutes; don't let one worker hoard queued jobs.
+app.conf.worker_prefetch_multiplier = 1
+
+app.autodiscover_tasks()
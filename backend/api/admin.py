@@ -1,6 +1,6 @@
 from django.contrib import admin
 from django.contrib.auth.admin import UserAdmin as BaseUserAdmin
-from .models import User, FacultyProfile, DocumentUpload
+from .models import User, FacultyProfile, DocumentUpload, ExtractedTextCache, ClassificationCache, LLMResponseCache
 
 class FacultyProfileInline(admin.StackedInline):
     model = FacultyProfile
@@ -19,7 +19,27 @@ admin.site.register(User, UserAdmin)
 
 @admin.register(DocumentUpload)
 class DocumentUploadAdmin(admin.ModelAdmin):
-    list_display = ('id', 'user', 'google_drive_link', 'status', 'created_at')
-    list_filter = ('status', 'created_at')
+    list_display = ('id', 'user', 'google_drive_link', 'status', 'created_at', 'classification_stage', 'cache_hits', 'cache_misses')
+    list_filter = ('status', 'classification_stage', 'created_at')
     search_fields = ('user__username', 'user__email', 'google_drive_link')
     readonly_fields = ('created_at',)
+
+@admin.register(ExtractedTextCache)
+class ExtractedTextCacheAdmin(admin.ModelAdmin):
+    list_display = ('file_name', 'file_id', 'revision', 'extraction_method', 'page_count', 'size_bytes', 'last_accessed')
+    list_filter = ('extraction_method',)
+    search_fields = ('file_name', 'file_id')
+    readonly_fields = ('created_at', 'last_accessed')
+
+@admin.register(ClassificationCache)
+class ClassificationCacheAdmin(admin.ModelAdmin):
+    list_display = ('text_hash', 'model_version', 'hits', 'created_at', 'last_accessed')
+    search_fields = ('text_hash', 'model_version')
+    readonly_fields = ('created_at', 'last_accessed')
+
+@admin.register(LLMResponseCache)
+class LLMResponseCacheAdmin(admin.ModelAdmin):
+    list_display = ('text_hash', 'llm_model', 'prompt_version', 'faculty_name', 'hits', 'created_at', 'last_accessed')
+    list_filter = ('llm_model', 'prompt_version')
+    search_fields = ('text_hash', 'faculty_name')
+    readonly_fields = ('created_at', 'last_accessed')
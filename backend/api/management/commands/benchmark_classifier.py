@@ -0,0 +1,69 @@
+# api/management/commands/benchmark_classifier.py
+import glob
+import os
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from api.models import ExtractedTextCache
+from api.services.ml_processing_service import classify_documents, get_model_components, warm_up_model
+
+
+class Command(BaseCommand):
+    help = "Measures classifier throughput (documents/second) for several batch sizes."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--texts', nargs='*', default=[],
+                            help="Text files or directories of .txt files. Defaults to cached extractions.")
+        parser.add_argument('--limit', type=int, default=64, help="Number of documents (default 64)")
+        parser.add_argument('--batch-sizes', nargs='+', type=int, default=[1, 8, 32])
+
+    def handle(self, *args, **options):
+        texts = self._load_texts(options['texts'], options['limit'])
+        if not texts:
+            raise CommandError("No texts found. Pass --texts or process some uploads first.")
+
+        if not warm_up_model():
+            raise CommandError("Classifier failed to load.")
+
+        # Explicit components: in-process model, no classification cache
+        components = get_model_components()
+
+        # One untimed pass so lazy allocations don't count against the first batch size
+        classify_documents(texts[:2], batch_size=2, components=components)
+
+        self.stdout.write(f"{len(texts)} document(s)")
+        baseline = None
+        for batch_size in options['batch_sizes']:
+            started = time.perf_counter()
+            results = classify_documents(texts, batch_size=batch_size, components=components)
+            elapsed = time.perf_counter() - started
+
+            labels = [(r['primary_kra'], r['criterion'], r['sub_criterion']) for r in results]
+            if baseline is None:
+                baseline = labels
+            agreement = sum(a == b for a, b in zip(labels, baseline)) / len(labels)
+
+            self.stdout.write(
+                f"batch {batch_size:>3}: {elapsed:.2f}s, {len(texts) / elapsed:.2f} docs/s, "
+                f"labels match batch {options['batch_sizes'][0]}: {agreement:.0%}"
+            )
+
+    def _load_texts(self, paths, limit):
+        if not paths:
+            return list(
+                ExtractedTextCache.objects.order_by('-last_accessed').values_list('text', flat=True)[:limit]
+            )
+
+        files = []
+        for path in paths:
+            if os.path.isdir(path):
+                files.extend(sorted(glob.glob(os.path.join(path, '*.txt'))))
+            else:
+                files.append(path)
+
+        texts = []
+        for path in files[:limit]:
+            with open(path, encoding='utf-8', errors='ignore') as f:
+                texts.append(f.read())
+        return texts
@@ -0,0 +1,97 @@
+# api/management/commands/benchmark_extractors.py
+import contextlib
+import io
+import json
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from api.models import ExtractedTextCache
+from api.services.extraction_strategies import (
+    extract_kra1a_evaluation,
+    extract_kra1b_program_leadAndContri,
+    extract_kra1c_adviser,
+    extract_kra1c_panel,
+)
+
+EXTRACTORS = {
+    'kra1a': lambda text, name: extract_kra1a_evaluation(text, faculty_name=name),
+    'kra1b_program': extract_kra1b_program_leadAndContri,
+    'kra1c_adviser': extract_kra1c_adviser,
+    'kra1c_panel': extract_kra1c_panel,
+}
+
+
+class Command(BaseCommand):
+    help = (
+        "Times the regex-based extractors over cached extracted texts (or given files). "
+        "--save-baseline writes the outputs and timings; --compare checks a later run "
+        "against them (identical outputs, speedup)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('files', nargs='*', help="Text files to use instead of the extraction cache")
+        parser.add_argument('--limit', type=int, default=200, help="Number of cached texts (default 200)")
+        parser.add_argument('--faculty', action='append', default=[],
+                            help="Faculty name to extract for (repeatable)")
+        parser.add_argument('--repeat', type=int, default=3, help="Timed passes; the fastest is reported")
+        parser.add_argument('--save-baseline', metavar='PATH', help="Write outputs and timings as JSON")
+        parser.add_argument('--compare', metavar='PATH', help="Compare against a saved baseline")
+
+    def _load_corpus(self, options):
+        if options['files']:
+            texts = []
+            for path in options['files']:
+                with open(path, encoding='utf-8', errors='replace') as f:
+                    texts.append(f.read())
+            return texts
+        return list(
+            ExtractedTextCache.objects.order_by('-last_accessed').values_list('text', flat=True)[:options['limit']]
+        )
+
+    def handle(self, *args, **options):
+        texts = self._load_corpus(options)
+        if not texts:
+            raise CommandError("No texts to benchmark. Pass files or process some uploads first.")
+        names = options['faculty'] or ['Juan Dela Cruz']
+
+        total_mb = sum(len(t) for t in texts) / (1024 * 1024)
+        self.stdout.write(f"{len(texts)} text(s), {total_mb:.1f} MB, faculty: {', '.join(names)}")
+
+        timings = {}
+        outputs = {}
+        for key, extractor in EXTRACTORS.items():
+            best = None
+            for _ in range(max(1, options['repeat'])):
+                results = []
+                started = time.perf_counter()
+                # The extractors print progress; keep it out of the timings.
+                with contextlib.redirect_stdout(io.StringIO()):
+                    for text in texts:
+                        for name in names:
+                            results.append(extractor(text, name))
+                elapsed = time.perf_counter() - started
+                best = elapsed if best is None else min(best, elapsed)
+            timings[key] = best
+            outputs[key] = json.loads(json.dumps(results, default=str))
+            self.stdout.write(f"{key:<15} {best:7.3f}s  {len(results) / best:9.1f} calls/s")
+
+        if options['save_baseline']:
+            with open(options['save_baseline'], 'w', encoding='utf-8') as f:
+                json.dump({'timings': timings, 'outputs': outputs}, f)
+            self.stdout.write(f"Baseline saved to {options['save_baseline']}")
+
+        if options['compare']:
+            with open(options['compare'], encoding='utf-8') as f:
+                baseline = json.load(f)
+            for key in EXTRACTORS:
+                if key not in baseline['outputs']:
+                    self.stdout.write(self.style.WARNING(f"{key:<15} not in baseline"))
+                    continue
+                expected = baseline['outputs'][key]
+                if len(expected) != len(outputs[key]):
+                    raise CommandError(f"{key}: baseline was recorded over a different corpus or faculty list.")
+                mismatches = sum(a != b for a, b in zip(expected, outputs[key]))
+                speedup = baseline['timings'][key] / timings[key] if timings[key] else float('inf')
+                style = self.style.SUCCESS if not mismatches else self.style.ERROR
+                self.stdout.write(style(f"{key:<15} {mismatches} mismatch(es), {speedup:.2f}x vs baseline"))
@@ -0,0 +1,175 @@
+# api/management/commands/benchmark_llm_rate_limit.py
+import json
+import multiprocessing
+import os
+import tempfile
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from django.core.management.base import BaseCommand
+from django.test.utils import override_settings
+
+from api.services.extraction_strategies import query_llm_for_json
+
+FAKE_RESPONSE = {"title": "Fake Title", "journal": "Fake Journal", "contribution": 100}
+
+
+class FakeGroqServer(ThreadingHTTPServer):
+    """
+    OpenAI-compatible /chat/completions endpoint with per-minute request and
+    token limits, replenished continuously like Groq's, answering 429 with
+    retry-after when a request doesn't fit.
+    """
+    daemon_threads = True
+
+    def __init__(self, address, requests_per_minute, tokens_per_minute):
+        super().__init__(address, _FakeGroqHandler)
+        self.requests_per_minute = requests_per_minute
+        self.tokens_per_minute = tokens_per_minute
+        self.available = {'requests': float(requests_per_minute), 'tokens': float(tokens_per_minute)}
+        self.updated = time.time()
+        self.lock = threading.Lock()
+        self.stats = {'accepted': 0, 'rejected': 0}
+
+    def admit(self, tokens):
+        """0 if the request fits the limits now, else the seconds until it would."""
+        with self.lock:
+            now = time.time()
+            elapsed, self.updated = now - self.updated, now
+            for name, limit in (('requests', self.requests_per_minute), ('tokens', self.tokens_per_minute)):
+                self.available[name] = min(limit, self.available[name] + elapsed * limit / 60)
+
+            wait = max(
+                (1 - self.available['requests']) * 60 / self.requests_per_minute,
+                (tokens - self.available['tokens']) * 60 / self.tokens_per_minute,
+            )
+            if wait <= 0:
+                self.available['requests'] -= 1
+                self.available['tokens'] -= tokens
+                self.stats['accepted'] += 1
+                return 0
+            self.stats['rejected'] += 1
+            return max(0.01, wait)
+
+
+class _FakeGroqHandler(BaseHTTPRequestHandler):
+    def log_message(self, format, *args):
+        pass
+
+    def _send(self, status, payload, headers=()):
+        body = json.dumps(payload).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        for name, value in headers:
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_POST(self):
+        length = int(self.headers.get('Content-Length') or 0)
+        request = json.loads(self.rfile.read(length) or b'{}')
+        if not self.path.endswith('/chat/completions'):
+            self._send(404, {'error': {'message': 'Not found'}})
+            return
+
+        content = json.dumps(FAKE_RESPONSE)
+        prompt_tokens = sum(len(m.get('content', '')) for m in request.get('messages', [])) // 4
+        completion_tokens = len(content) // 4
+        retry_after = self.server.admit(prompt_tokens + completion_tokens)
+        if retry_after:
+            self._send(
+                429,
+                {'error': {'message': 'Rate limit reached', 'type': 'requests', 'code': 'rate_limit_exceeded'}},
+                headers=[('retry-after', f"{retry_after:.2f}")],
+            )
+            return
+
+        self._send(200, {
+            'id': 'chatcmpl-fake',
+            'object': 'chat.completion',
+            'created': int(time.time()),
+            'model': request.get('model', ''),
+            'choices': [{
+                'index': 0,
+                'message': {'role': 'assistant', 'content': content},
+                'finish_reason': 'stop',
+            }],
+            'usage': {
+                'prompt_tokens': prompt_tokens,
+                'completion_tokens': completion_tokens,
+                'total_tokens': prompt_tokens + completion_tokens,
+            },
+        })
+
+
+def _timed_call(text):
+    started = time.perf_counter()
+    result = query_llm_for_json("Extract the title.", text)
+    return time.perf_counter() - started, result is not None
+
+
+class Command(BaseCommand):
+    help = (
+        "Fires a burst of LLM extraction calls at a local fake Groq server that enforces "
+        "RPM/TPM limits, and reports latency and how many calls hit a 429."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--calls', type=int, default=40)
+        parser.add_argument('--workers', type=int, default=8, help="Concurrent callers")
+        parser.add_argument('--processes', action='store_true',
+                            help="Run callers as separate processes (shared limiter state) instead of threads")
+        parser.add_argument('--rpm', type=int, default=30, help="Requests per minute, server and limiter")
+        parser.add_argument('--tpm', type=int, default=60000, help="Tokens per minute, server and limiter")
+        parser.add_argument('--text-chars', type=int, default=8000, help="Document size per call")
+        parser.add_argument('--no-limiter', action='store_true', help="Rely on 429 retries only")
+
+    def handle(self, *args, **options):
+        server = FakeGroqServer(('127.0.0.1', 0), options['rpm'], options['tpm'])
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        base_url = f"http://127.0.0.1:{server.server_address[1]}"
+
+        state_fd, state_path = tempfile.mkstemp(suffix='.sqlite3')
+        os.close(state_fd)
+        text = ("lorem ipsum dolor sit amet " * (options['text_chars'] // 27 + 1))[:options['text_chars']]
+
+        overrides = {
+            'GROQ_API_KEY': 'fake-key',
+            'GROQ_BASE_URL': base_url,
+            'GROQ_REQUESTS_PER_MINUTE': options['rpm'],
+            'GROQ_TOKENS_PER_MINUTE': options['tpm'],
+            'LLM_RATE_LIMIT_ENABLED': not options['no_limiter'],
+            'LLM_RATE_LIMIT_BACKEND': 'sqlite',
+            'LLM_RATE_LIMIT_PATH': state_path,
+            # Every call sends the same text; it must reach the server
+            'LLM_CACHE_ENABLED': False,
+        }
+        if options['processes']:
+            # Forked callers inherit the overridden settings
+            executor = ProcessPoolExecutor(max_workers=options['workers'], mp_context=multiprocessing.get_context('fork'))
+        else:
+            executor = ThreadPoolExecutor(max_workers=options['workers'])
+        try:
+            with override_settings(**overrides):
+                started = time.perf_counter()
+                with executor:
+                    results = list(executor.map(_timed_call, [text] * options['calls']))
+                elapsed = time.perf_counter() - started
+        finally:
+            server.shutdown()
+            os.remove(state_path)
+
+        latencies = sorted(latency for latency, _ in results)
+        succeeded = sum(1 for _, ok in results if ok)
+        self.stdout.write(
+            f"{options['calls']} call(s) in {elapsed:.1f}s, {succeeded} succeeded; "
+            f"server accepted {server.stats['accepted']}, answered 429 to {server.stats['rejected']}"
+        )
+        self.stdout.write(
+            f"latency p50 {latencies[len(latencies) // 2]:.2f}s, "
+            f"p95 {latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))]:.2f}s, "
+            f"max {latencies[-1]:.2f}s"
+        )
@@ -0,0 +1,81 @@
+# api/management/commands/benchmark_ocr_backends.py
+import difflib
+import time
+
+import fitz  # PyMuPDF
+import numpy as np
+from PIL import Image
+from django.core.management.base import BaseCommand, CommandError
+
+from api.services.ocr_backends import OCR_BACKENDS, close_ocr_backends, get_ocr_backend
+from api.services.text_extraction_service import OCR_DPI, preprocess_array_for_ocr, render_page_gray
+
+
+class Command(BaseCommand):
+    help = "Micro-benchmark of the OCR backends on preprocessed sample pages."
+
+    def add_arguments(self, parser):
+        parser.add_argument('files', nargs='+', help="Sample PDFs or images")
+        parser.add_argument('--pages', type=int, default=5, help="Pages per PDF (default 5)")
+        parser.add_argument('--dpi', type=int, default=OCR_DPI)
+        parser.add_argument('--repeat', type=int, default=2, help="Passes over all pages per backend")
+        parser.add_argument('--backends', nargs='+', default=list(OCR_BACKENDS), choices=list(OCR_BACKENDS))
+
+    def handle(self, *args, **options):
+        images = self._load_pages(options['files'], options['pages'], options['dpi'])
+        if not images:
+            raise CommandError("No pages to benchmark.")
+        self.stdout.write(f"{len(images)} page(s) prepared.\n")
+
+        outputs = {}
+        for name in options['backends']:
+            close_ocr_backends()
+
+            started = time.perf_counter()
+            backend = get_ocr_backend(name)
+            init_seconds = time.perf_counter() - started
+            if backend.name != name:
+                self.stdout.write(self.style.WARNING(f"{name}: unavailable, skipped"))
+                continue
+
+            timings = []
+            for _ in range(max(1, options['repeat'])):
+                texts = []
+                for img in images:
+                    started = time.perf_counter()
+                    texts.append(backend.image_to_string(img))
+                    timings.append(time.perf_counter() - started)
+            outputs[name] = texts
+
+            timings.sort()
+            self.stdout.write(
+                f"{name}: init {init_seconds * 1000:.0f} ms, "
+                f"mean {sum(timings) / len(timings) * 1000:.0f} ms/page, "
+                f"median {timings[len(timings) // 2] * 1000:.0f} ms/page"
+            )
+        close_ocr_backends()
+
+        # Text agreement against the first backend that ran
+        names = list(outputs)
+        for name in names[1:]:
+            ratios = [
+                difflib.SequenceMatcher(None, a, b).ratio()
+                for a, b in zip(outputs[names[0]], outputs[name])
+            ]
+            self.stdout.write(f"Text similarity {names[0]} vs {name}: {sum(ratios) / len(ratios):.2%}")
+
+    def _load_pages(self, paths, max_pages, dpi):
+        images = []
+        for path in paths:
+            if path.lower().endswith('.pdf'):
+                try:
+                    doc = fitz.open(path)
+                except Exception as e:
+                    raise CommandError(f"Could not open {path}: {e}")
+                with doc:
+                    for n in range(min(max_pages, len(doc))):
+                        images.append(Image.fromarray(preprocess_array_for_ocr(render_page_gray(doc[n], dpi))))
+            else:
+                with Image.open(path) as img:
+                    images.append(Image.fromarray(preprocess_array_for_ocr(np.asarray(img.convert("L")))))
+        return images
@@ -0,0 +1,94 @@
+# api/management/commands/benchmark_ocr_preprocessing.py
+import io
+import time
+
+import fitz  # PyMuPDF
+import numpy as np
+from PIL import Image
+from django.core.management.base import BaseCommand, CommandError
+
+from api.services.text_extraction_service import (
+    OCR_DPI,
+    preprocess_for_ocr,
+    preprocess_array_for_ocr,
+    render_page_gray,
+)
+
+
+class Command(BaseCommand):
+    help = "Times the PIL and NumPy OCR preprocessing paths on sample PDF pages."
+
+    def add_arguments(self, parser):
+        parser.add_argument('pdfs', nargs='+', help="Sample PDF files")
+        parser.add_argument('--pages', type=int, default=5, help="Pages per PDF (default 5)")
+        parser.add_argument('--dpi', type=int, default=OCR_DPI)
+        parser.add_argument('--repeat', type=int, default=3, help="Runs per page; the best time is kept")
+        parser.add_argument('--adaptive', action='store_true', help="Also time adaptive thresholding")
+
+    def handle(self, *args, **options):
+        dpi = options['dpi']
+        repeat = max(1, options['repeat'])
+        totals = {'pil': 0.0, 'numpy': 0.0, 'adaptive': 0.0}
+        agreement = []
+
+        for path in options['pdfs']:
+            try:
+                doc = fitz.open(path)
+            except Exception as e:
+                raise CommandError(f"Could not open {path}: {e}")
+
+            with doc:
+                for page_number in range(min(options['pages'], len(doc))):
+                    page = doc[page_number]
+
+                    # Current path: render -> PNG -> PIL -> preprocess
+                    def pil_path():
+                        pix = page.get_pixmap(dpi=dpi)
+                        img = Image.open(io.BytesIO(pix.tobytes("png")))
+                        return preprocess_for_ocr(img)
+
+                    # New path: render grayscale -> view over samples -> NumPy
+                    def numpy_path(adaptive=False):
+                        return preprocess_array_for_ocr(render_page_gray(page, dpi), adaptive=adaptive)
+
+                    pil_seconds, pil_out = self._best_of(pil_path, repeat)
+                    np_seconds, np_out = self._best_of(numpy_path, repeat)
+                    totals['pil'] += pil_seconds
+                    totals['numpy'] += np_seconds
+
+                    pil_pixels = np.asarray(pil_out.convert("L"))
+                    same = pil_pixels.shape == np_out.shape
+                    match = float((pil_pixels == np_out).mean()) if same else 0.0
+                    agreement.append(match)
+
+                    line = (f"{path} p{page_number + 1}: pil {pil_seconds * 1000:.1f} ms, "
+                            f"numpy {np_seconds * 1000:.1f} ms")
+                    if options['adaptive']:
+                        ad_seconds, _ = self._best_of(lambda: numpy_path(adaptive=True), repeat)
+                        totals['adaptive'] += ad_seconds
+                        line += f", adaptive {ad_seconds * 1000:.1f} ms"
+                    line += f", pixel agreement {match:.2%}" if same else ", shape mismatch"
+                    self.stdout.write(line)
+
+        if not agreement:
+            raise CommandError("No pages benchmarked.")
+
+        self.stdout.write("")
+        self.stdout.write(f"Pages: {len(agreement)}")
+        self.stdout.write(f"PIL total:   {totals['pil']:.3f}s")
+        self.stdout.write(f"NumPy total: {totals['numpy']:.3f}s")
+        if totals['numpy']:
+            self.stdout.write(f"Speedup:     {totals['pil'] / totals['numpy']:.2f}x")
+        if options['adaptive']:
+            self.stdout.write(f"Adaptive:    {totals['adaptive']:.3f}s")
+        self.stdout.write(f"Mean pixel agreement: {sum(agreement) / len(agreement):.2%}")
+
+    @staticmethod
+    def _best_of(fn, repeat):
+        best, result = None, None
+        for _ in range(repeat):
+            started = time.perf_counter()
+            result = fn()
+            elapsed = time.perf_counter() - started
+            best = elapsed if best is None else min(best, elapsed)
+        return best, result
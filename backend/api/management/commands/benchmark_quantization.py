@@ -0,0 +1,106 @@
+# api/management/commands/benchmark_quantization.py
+import json
+import multiprocessing
+import resource
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+
+from api.models import ExtractedTextCache
+from api.services.ml_processing_service import classify_documents, load_model_and_encoders
+
+LABEL_KEYS = ('primary_kra', 'criterion', 'sub_criterion')
+
+
+def _peak_rss_mb():
+    # ru_maxrss is in KB on Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def _run_variant(quantize, texts, batch_size):
+    """
+    Loads one variant and classifies texts. Runs in a fresh process so the
+    peak RSS readings belong to this variant alone.
+    """
+    baseline = _peak_rss_mb()
+    components = load_model_and_encoders(quantize=quantize, backend='torch')
+    if components[0] is None:
+        raise RuntimeError("Classifier failed to load.")
+    if components[5].type != 'cpu':
+        raise RuntimeError("Dynamic int8 quantization is CPU-only; run with CUDA_VISIBLE_DEVICES=''.")
+    loaded = _peak_rss_mb()
+
+    classify_documents(texts[:2], batch_size, components)  # warm-up
+    started = time.perf_counter()
+    results = classify_documents(texts, batch_size, components)
+    elapsed = time.perf_counter() - started
+    return {
+        'results': results,
+        'seconds': elapsed,
+        'baseline_mb': baseline,
+        'load_mb': loaded - baseline,
+        'inference_mb': _peak_rss_mb() - loaded,
+    }
+
+
+class Command(BaseCommand):
+    help = "Compares the fp32 and dynamic int8 classifier: label parity, latency and peak memory (RSS)."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--labelled', help=(
+            "JSONL sample, one object per line: "
+            '{"text": ..., "primary_kra": ..., "criterion": ..., "sub_criterion": ...}. '
+            "Without it, cached extractions are used and only fp32/int8 agreement is reported."
+        ))
+        parser.add_argument('--limit', type=int, default=64)
+        parser.add_argument('--batch-size', type=int, default=8)
+
+    def handle(self, *args, **options):
+        samples = self._load_samples(options['labelled'], options['limit'])
+        if not samples:
+            raise CommandError("No sample texts.")
+        texts = [s['text'] for s in samples]
+
+        # The forked children must not share this process's database connection
+        connections.close_all()
+
+        runs = {}
+        for name, quantize in (('fp32', False), ('int8', True)):
+            # One process per variant: peak RSS never goes down within a process
+            with ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context('fork')) as executor:
+                try:
+                    run = executor.submit(_run_variant, quantize, texts, options['batch_size']).result()
+                except RuntimeError as e:
+                    raise CommandError(str(e))
+            runs[name] = run['results']
+            self.stdout.write(
+                f"{name}: {run['seconds'] / len(texts) * 1000:.0f} ms/doc, "
+                f"peak RSS +{run['load_mb']:.0f} MB loading, +{run['inference_mb']:.0f} MB inference "
+                f"(process baseline {run['baseline_mb']:.0f} MB)"
+            )
+
+        self.stdout.write("")
+        for key in LABEL_KEYS:
+            agree = sum(a[key] == b[key] for a, b in zip(runs['fp32'], runs['int8'])) / len(texts)
+            line = f"{key}: fp32/int8 agreement {agree:.1%}"
+            if all(key in s for s in samples):
+                for name in ('fp32', 'int8'):
+                    accuracy = sum(str(r[key]) == str(s[key]) for r, s in zip(runs[name], samples)) / len(samples)
+                    line += f", {name} accuracy {accuracy:.1%}"
+            self.stdout.write(line)
+
+    def _load_samples(self, path, limit):
+        if not path:
+            texts = ExtractedTextCache.objects.order_by('-last_accessed').values_list('text', flat=True)[:limit]
+            return [{'text': t} for t in texts]
+
+        samples = []
+        with open(path, encoding='utf-8') as f:
+            for line in f:
+                if line.strip():
+                    samples.append(json.loads(line))
+                if len(samples) >= limit:
+                    break
+        return samples
@@ -0,0 +1,76 @@
+# api/management/commands/benchmark_tokenizer.py
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from api.models import ExtractedTextCache
+from api.services.ml_processing_service import (
+    DEFAULT_LONG_DOCUMENT_MODE,
+    DEFAULT_MAX_WINDOWS,
+    DEFAULT_WINDOW_STRIDE,
+    get_char_budget,
+    load_tokenizer,
+    texts_to_tokenize,
+)
+
+
+class Command(BaseCommand):
+    help = (
+        "Tokenization throughput over cached extracted texts: Python vs fast tokenizer, "
+        "with and without character-budget pre-truncation. Also checks the token ids match."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--limit', type=int, default=200, help="Number of cached texts (default 200)")
+        parser.add_argument('--batch-size', type=int, default=32)
+
+    def handle(self, *args, **options):
+        texts = list(
+            ExtractedTextCache.objects.order_by('-last_accessed').values_list('text', flat=True)[:options['limit']]
+        )
+        if not texts:
+            raise CommandError("No cached extractions to benchmark. Process some uploads first.")
+
+        chunked = getattr(settings, 'CLASSIFIER_LONG_DOCUMENT_MODE', DEFAULT_LONG_DOCUMENT_MODE) == 'chunk'
+        max_windows = getattr(settings, 'CLASSIFIER_MAX_WINDOWS', DEFAULT_MAX_WINDOWS)
+        stride = getattr(settings, 'CLASSIFIER_WINDOW_STRIDE', DEFAULT_WINDOW_STRIDE)
+        char_budget = get_char_budget(chunked, stride, max_windows)
+        # What the classifier hands either tokenizer
+        truncated = texts_to_tokenize(texts, chunked, stride, max_windows)
+        total_mb = sum(len(t) for t in texts) / (1024 * 1024)
+        self.stdout.write(f"{len(texts)} text(s), {total_mb:.1f} MB, char budget {char_budget}")
+
+        slow = load_tokenizer(fast=False)
+        fast = load_tokenizer(fast=True)
+        if not fast.is_fast:
+            raise CommandError("Fast tokenizer could not be built.")
+
+        ids = {}
+        for name, tokenizer, corpus, batched in (
+            ('python, full text, one by one', slow, texts, False),
+            ('python, pre-truncated, one by one', slow, truncated, False),
+            ('fast, full text, batched', fast, texts, True),
+            ('fast, pre-truncated, batched', fast, truncated, True),
+        ):
+            started = time.perf_counter()
+            if batched:
+                size = options['batch_size']
+                result = []
+                for i in range(0, len(corpus), size):
+                    result.extend(
+                        tokenizer(corpus[i:i + size], add_special_tokens=False, verbose=False)['input_ids']
+                    )
+            else:
+                result = [tokenizer(t, add_special_tokens=False, verbose=False)['input_ids'] for t in corpus]
+            elapsed = time.perf_counter() - started
+            ids[name] = result
+            self.stdout.write(f"{name:<36} {elapsed:7.2f}s  {len(corpus) / elapsed:8.1f} texts/s")
+
+        for reference, candidate in (
+            ('python, full text, one by one', 'fast, full text, batched'),
+            ('python, pre-truncated, one by one', 'fast, pre-truncated, batched'),
+        ):
+            mismatches = sum(a != b for a, b in zip(ids[reference], ids[candidate]))
+            style = self.style.SUCCESS if not mismatches else self.style.ERROR
+            self.stdout.write(style(f"Token ids {reference} vs {candidate}: {mismatches} mismatch(es)"))
@@ -0,0 +1,71 @@
+# api/management/commands/convert_classifier_weights.py
+import os
+
+import torch
+from django.core.management.base import BaseCommand, CommandError
+from transformers import BertModel
+
+from api.services.ml_processing_service import (
+    MODEL_VARIANTS,
+    TripleBERTClassifier,
+    get_bert_config,
+    get_model_file,
+    load_safetensors_mmap,
+    save_model_safetensors,
+)
+
+
+class Command(BaseCommand):
+    help = (
+        "Converts the fine-tuned .pt checkpoint to safetensors (loaded memory-mapped) and writes "
+        "the BERT config next to it, so the classifier starts offline without bert-base-uncased."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--variant', choices=list(MODEL_VARIANTS), default='teacher')
+
+    def handle(self, *args, **options):
+        files = MODEL_VARIANTS[options['variant']]
+        source = get_model_file(files['weights'])
+        target = get_model_file(files['safetensors'])
+        config_path = get_model_file(files['config'])
+        if not os.path.exists(source):
+            raise CommandError(f"{source} not found.")
+
+        config = get_bert_config(options['variant'])
+        state_dict = torch.load(source, map_location='cpu')
+
+        # Keys/shapes the current TripleBERTClassifier expects
+        head_sizes = {
+            name: state_dict[f'{name}.weight'].shape[0]
+            for name in ('kra_classifier', 'crit_classifier', 'sub_classifier')
+        }
+        with torch.device('meta'):
+            reference = TripleBERTClassifier(
+                head_sizes['kra_classifier'], head_sizes['crit_classifier'], head_sizes['sub_classifier'],
+                bert=BertModel(config),
+            )
+        expected = reference.state_dict()
+
+        missing = sorted(set(expected) - set(state_dict))
+        if missing:
+            raise CommandError(f"Checkpoint is missing {len(missing)} weight(s), e.g. {missing[:3]}")
+        for name, tensor in expected.items():
+            if tuple(state_dict[name].shape) != tuple(tensor.shape):
+                raise CommandError(f"Shape mismatch for {name}: {tuple(state_dict[name].shape)} vs {tuple(tensor.shape)}")
+
+        # e.g. position_ids saved as a buffer by older transformers versions
+        dropped = sorted(set(state_dict) - set(expected))
+        if dropped:
+            self.stdout.write(f"Dropping {len(dropped)} key(s) not used by the model: {', '.join(dropped)}")
+
+        save_model_safetensors({name: state_dict[name] for name in expected}, target)
+        if not os.path.exists(config_path):
+            config.to_json_file(config_path)
+            self.stdout.write(f"Wrote {config_path}")
+
+        converted = load_safetensors_mmap(target)
+        for name in expected:
+            if not torch.equal(converted[name], state_dict[name]):
+                raise CommandError(f"Round-trip mismatch for {name}.")
+        self.stdout.write(self.style.SUCCESS(f"Wrote {target} ({os.path.getsize(target) / 1024 / 1024:.0f} MB), verified."))
@@ -0,0 +1,171 @@
+# api/management/commands/distill_classifier.py
+import copy
+import random
+import time
+
+import torch
+import torch.nn.functional as F
+from django.core.management.base import BaseCommand, CommandError
+from transformers import BertModel
+
+from api.models import ExtractedTextCache
+from api.services.ml_processing_service import (
+    MODEL_VARIANTS,
+    TripleBERTClassifier,
+    get_model_file,
+    save_model_safetensors,
+    classify_documents,
+    load_model_and_encoders,
+)
+
+HEADS = ('primary_kra', 'criterion', 'sub_criterion')
+
+
+def _layer_map(teacher_layers, student_layers):
+    """Teacher layers copied into the student, spread evenly and always keeping the first and last."""
+    if student_layers == 1:
+        return [teacher_layers - 1]
+    return [round(i * (teacher_layers - 1) / (student_layers - 1)) for i in range(student_layers)]
+
+
+def build_student(teacher, num_layers):
+    """Student with the teacher's embeddings, pooler, heads and an evenly spaced subset of its layers."""
+    config = copy.deepcopy(teacher.bert.config)
+    layer_map = _layer_map(config.num_hidden_layers, num_layers)
+    config.num_hidden_layers = num_layers
+
+    bert = BertModel(config)
+    bert.embeddings.load_state_dict(teacher.bert.embeddings.state_dict())
+    bert.pooler.load_state_dict(teacher.bert.pooler.state_dict())
+    for student_index, teacher_index in enumerate(layer_map):
+        bert.encoder.layer[student_index].load_state_dict(teacher.bert.encoder.layer[teacher_index].state_dict())
+
+    student = TripleBERTClassifier(
+        teacher.kra_classifier.out_features,
+        teacher.crit_classifier.out_features,
+        teacher.sub_classifier.out_features,
+        bert=bert,
+    )
+    student.kra_classifier.load_state_dict(teacher.kra_classifier.state_dict())
+    student.crit_classifier.load_state_dict(teacher.crit_classifier.state_dict())
+    student.sub_classifier.load_state_dict(teacher.sub_classifier.state_dict())
+    return student, layer_map
+
+
+class Command(BaseCommand):
+    help = (
+        "Distills the 12-layer classifier into a smaller student on CPU, using stored extracted "
+        "texts and the teacher's soft labels. Load it with CLASSIFIER_MODEL = 'student'."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--layers', type=int, default=6, help="Student encoder layers (default 6)")
+        parser.add_argument('--epochs', type=int, default=3)
+        parser.add_argument('--batch-size', type=int, default=8)
+        parser.add_argument('--max-length', type=int, default=256, help="Tokens per training text")
+        parser.add_argument('--temperature', type=float, default=2.0)
+        parser.add_argument('--alpha', type=float, default=0.7, help="Weight of the soft-label loss vs teacher argmax")
+        parser.add_argument('--lr', type=float, default=5e-5)
+        parser.add_argument('--limit', type=int, default=2000)
+        parser.add_argument('--test-size', type=float, default=0.1)
+        parser.add_argument('--seed', type=int, default=42)
+
+    def handle(self, *args, **options):
+        torch.manual_seed(options['seed'])
+        random.seed(options['seed'])
+
+        texts = [t for t in ExtractedTextCache.objects.values_list('text', flat=True)[:options['limit']] if t.strip()]
+        if len(texts) < 10:
+            raise CommandError("Need at least 10 stored extracted texts to distill.")
+        random.shuffle(texts)
+        split = max(1, int(len(texts) * options['test_size']))
+        test_texts, train_texts = texts[:split], texts[split:]
+
+        components = load_model_and_encoders(quantize=False, backend='torch', variant='teacher')
+        teacher, tokenizer = components[0], components[1]
+        if teacher is None:
+            raise CommandError("Teacher model failed to load.")
+        teacher.to('cpu')
+        teacher_components = (teacher,) + tuple(components[1:5]) + (torch.device('cpu'),)
+
+        if not 1 <= options['layers'] < teacher.bert.config.num_hidden_layers:
+            raise CommandError(f"--layers must be between 1 and {teacher.bert.config.num_hidden_layers - 1}.")
+
+        encoded = tokenizer(
+            train_texts, truncation=True, max_length=options['max_length'], padding='max_length', return_tensors='pt'
+        )
+
+        self.stdout.write(f"Computing teacher soft labels for {len(train_texts)} text(s)...")
+        teacher_logits = [[], [], []]
+        with torch.inference_mode():
+            for start in range(0, len(train_texts), options['batch_size']):
+                end = start + options['batch_size']
+                outputs = teacher(encoded['input_ids'][start:end], encoded['attention_mask'][start:end])
+                for head, logits in enumerate(outputs):
+                    teacher_logits[head].append(logits)
+        teacher_logits = [torch.cat(logits) for logits in teacher_logits]
+
+        student, layer_map = build_student(teacher, options['layers'])
+        self.stdout.write(f"Student: {options['layers']} layers copied from teacher layers {layer_map}")
+
+        self._train(student, encoded, teacher_logits, options)
+
+        files = MODEL_VARIANTS['student']
+        weights_path = get_model_file(files['weights'])
+        safetensors_path = get_model_file(files['safetensors'])
+        config_path = get_model_file(files['config'])
+        torch.save(student.state_dict(), weights_path)
+        save_model_safetensors(student.state_dict(), safetensors_path)
+        student.bert.config.to_json_file(config_path)
+        self.stdout.write(self.style.SUCCESS(f"Saved {weights_path}, {safetensors_path} and {config_path}"))
+
+        student_components = (student,) + tuple(teacher_components[1:])
+        self._report(teacher_components, student_components, test_texts)
+
+    def _train(self, student, encoded, teacher_logits, options):
+        temperature = options['temperature']
+        alpha = options['alpha']
+        optimizer = torch.optim.AdamW(student.parameters(), lr=options['lr'])
+        count = encoded['input_ids'].size(0)
+
+        student.train()
+        for epoch in range(options['epochs']):
+            order = torch.randperm(count)
+            total_loss, started = 0.0, time.perf_counter()
+            for start in range(0, count, options['batch_size']):
+                idx = order[start:start + options['batch_size']]
+                outputs = student(encoded['input_ids'][idx], encoded['attention_mask'][idx])
+
+                loss = 0.0
+                for head, student_head_logits in enumerate(outputs):
+                    target = teacher_logits[head][idx]
+                    soft = F.kl_div(
+                        F.log_softmax(student_head_logits / temperature, dim=1),
+                        F.softmax(target / temperature, dim=1),
+                        reduction='batchmean',
+                    ) * temperature ** 2
+                    hard = F.cross_entropy(student_head_logits, target.argmax(dim=1))
+                    loss = loss + alpha * soft + (1 - alpha) * hard
+
+                optimizer.zero_grad()
+                loss.backward()
+                optimizer.step()
+                total_loss += loss.item() * len(idx)
+
+            self.stdout.write(
+                f"Epoch {epoch + 1}/{options['epochs']}: loss {total_loss / count:.4f} "
+                f"({time.perf_counter() - started:.0f}s)"
+            )
+        student.eval()
+
+    def _report(self, teacher_components, student_components, texts):
+        runs = {}
+        for name, components in (('teacher', teacher_components), ('student', student_components)):
+            classify_documents(texts[:1], components=components)  # warm-up
+            started = time.perf_counter()
+            runs[name] = classify_documents(texts, components=components)
+            self.stdout.write(f"{name}: {(time.perf_counter() - started) / len(texts) * 1000:.0f} ms/doc")
+
+        for key in HEADS:
+            agree = sum(t[key] == s[key] for t, s in zip(runs['teacher'], runs['student'])) / len(texts)
+            self.stdout.write(f"{key}: agreement with teacher {agree:.1%} on {len(texts)} held-out text(s)")
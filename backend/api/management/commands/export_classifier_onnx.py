@@ -0,0 +1,109 @@
+# api/management/commands/export_classifier_onnx.py
+import inspect
+import time
+
+import numpy as np
+import torch
+from django.core.management.base import BaseCommand, CommandError
+
+from api.models import ExtractedTextCache
+from api.services.ml_processing_service import (
+    ONNX_INPUT_NAMES,
+    ONNX_OUTPUT_NAMES,
+    OnnxTripleBERTClassifier,
+    classify_documents,
+    get_onnx_model_path,
+    load_model_and_encoders,
+)
+
+# Texts of different lengths so the check exercises the dynamic axes
+CHECK_TEXTS = [
+    "Board resolution approving the curriculum.",
+    "Certificate of participation in the regional research conference on instructional materials. " * 8,
+    "Research paper abstract, methodology, results and discussion. " * 60,
+]
+
+
+class Command(BaseCommand):
+    help = (
+        "Exports TripleBERTClassifier to ONNX (dynamic batch/sequence axes), then checks "
+        "onnxruntime outputs against eager torch and compares load time and latency."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--output', default=None, help="Defaults to CLASSIFIER_ONNX_PATH")
+        parser.add_argument('--opset', type=int, default=17)
+        parser.add_argument('--tolerance', type=float, default=1e-3, help="Max abs logit difference")
+        parser.add_argument('--skip-export', action='store_true', help="Only run the equivalence check")
+
+    def handle(self, *args, **options):
+        output = options['output'] or get_onnx_model_path()
+
+        started = time.perf_counter()
+        reference = load_model_and_encoders(quantize=False, backend='torch')
+        torch_load_seconds = time.perf_counter() - started
+        model, tokenizer, _, _, _, device = reference
+        if model is None:
+            raise CommandError("Classifier failed to load.")
+        if device.type != 'cpu':
+            model.to('cpu')
+            reference = (model,) + tuple(reference[1:5]) + (torch.device('cpu'),)
+
+        if not options['skip_export']:
+            self._export(model, tokenizer, output, options['opset'])
+            self.stdout.write(self.style.SUCCESS(f"Exported {output}"))
+
+        started = time.perf_counter()
+        onnx_model = OnnxTripleBERTClassifier(output)
+        onnx_load_seconds = time.perf_counter() - started
+
+        self._check_equivalence(model, onnx_model, tokenizer, options['tolerance'])
+
+        self.stdout.write(f"Load:  torch {torch_load_seconds:.2f}s (incl. encoders), onnx session {onnx_load_seconds:.2f}s")
+        texts = list(ExtractedTextCache.objects.values_list('text', flat=True)[:16]) or CHECK_TEXTS
+        onnx_components = (onnx_model,) + tuple(reference[1:])
+        for name, components in (('torch', reference), ('onnx', onnx_components)):
+            classify_documents(texts[:1], components=components)  # warm-up
+            started = time.perf_counter()
+            classify_documents(texts, components=components)
+            self.stdout.write(f"{name}: {(time.perf_counter() - started) / len(texts) * 1000:.0f} ms/doc")
+
+    def _export(self, model, tokenizer, output, opset):
+        dummy = tokenizer(CHECK_TEXTS[:2], padding=True, truncation=True, max_length=64, return_tensors="pt")
+        kwargs = {}
+        if 'dynamo' in inspect.signature(torch.onnx.export).parameters:
+            kwargs['dynamo'] = False  # TorchScript exporter; supports dynamic_axes without onnxscript
+
+        dynamic_axes = {name: {0: 'batch', 1: 'sequence'} for name in ONNX_INPUT_NAMES}
+        dynamic_axes.update({name: {0: 'batch'} for name in ONNX_OUTPUT_NAMES})
+
+        with torch.no_grad():
+            torch.onnx.export(
+                model,
+                (dummy['input_ids'], dummy['attention_mask']),
+                output,
+                input_names=ONNX_INPUT_NAMES,
+                output_names=ONNX_OUTPUT_NAMES,
+                dynamic_axes=dynamic_axes,
+                opset_version=opset,
+                do_constant_folding=True,
+                **kwargs,
+            )
+
+    def _check_equivalence(self, model, onnx_model, tokenizer, tolerance):
+        """Raw logits of both backends must match within tolerance and agree on every argmax."""
+        for batch in ([CHECK_TEXTS[0]], CHECK_TEXTS):
+            inputs = tokenizer(batch, padding=True, truncation=True, max_length=512, return_tensors="pt")
+            with torch.inference_mode():
+                expected = model(inputs['input_ids'], inputs['attention_mask'])
+            actual = onnx_model(inputs['input_ids'], inputs['attention_mask'])
+
+            for name, e, a in zip(ONNX_OUTPUT_NAMES, expected, actual):
+                e, a = e.numpy(), a.numpy()
+                diff = float(np.abs(e - a).max())
+                if diff > tolerance or not np.array_equal(e.argmax(axis=1), a.argmax(axis=1)):
+                    raise CommandError(
+                        f"ONNX output mismatch on {name} (batch {len(batch)}, max abs diff {diff:.2e})."
+                    )
+                self.stdout.write(f"{name} batch {len(batch)}: max abs diff {diff:.2e}")
+        self.stdout.write(self.style.SUCCESS("ONNX outputs match eager torch."))
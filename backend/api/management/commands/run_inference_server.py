@@ -0,0 +1,37 @@
+# api/management/commands/run_inference_server.py
+from django.core.management.base import BaseCommand, CommandError
+
+from api.services.inference_server import (
+    DEFAULT_HOST,
+    DEFAULT_MAX_BATCH_SIZE,
+    DEFAULT_MAX_WAIT_MS,
+    DEFAULT_PORT,
+    serve,
+)
+from api.services.ml_processing_service import classify_documents_local, get_model_status, warm_up_model
+
+
+class Command(BaseCommand):
+    help = "Serves the classifier to local processes over HTTP, micro-batching concurrent requests."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--host', default=DEFAULT_HOST)
+        parser.add_argument('--port', type=int, default=DEFAULT_PORT)
+        parser.add_argument('--max-batch-size', type=int, default=DEFAULT_MAX_BATCH_SIZE)
+        parser.add_argument('--max-wait-ms', type=int, default=DEFAULT_MAX_WAIT_MS)
+
+    def handle(self, *args, **options):
+        if not warm_up_model():
+            raise CommandError("Classifier failed to load.")
+
+        try:
+            serve(
+                classify_documents_local,
+                get_model_status,
+                host=options['host'],
+                port=options['port'],
+                max_batch_size=options['max_batch_size'],
+                max_wait_ms=options['max_wait_ms'],
+            )
+        except KeyboardInterrupt:
+            self.stdout.write("Stopped.")
@@ -0,0 +1,119 @@
+# api/management/commands/train_first_stage.py
+import json
+import time
+from collections import Counter
+
+import joblib
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from sklearn.feature_extraction.text import TfidfVectorizer
+from sklearn.linear_model import LogisticRegression
+from sklearn.model_selection import train_test_split
+from sklearn.pipeline import Pipeline
+
+from api.models import ExtractedTextCache
+from api.services.first_stage_classifier import (
+    DEFAULT_THRESHOLD,
+    LINEAR_MAX_CHARS,
+    get_first_stage_model_path,
+    is_known_label,
+    join_labels,
+    load_label_classes,
+)
+
+
+class Command(BaseCommand):
+    help = (
+        "Trains the TF-IDF + logistic regression first stage on labelled texts, "
+        "restricted to the BERT encoders' classes, and reports coverage/accuracy per threshold."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--labelled', help=(
+            "JSONL, one object per line: "
+            '{"text": ..., "primary_kra": ..., "criterion": ..., "sub_criterion": ...}. '
+            "Without it, cached extractions are labelled by the BERT classifier."
+        ))
+        parser.add_argument('--limit', type=int, default=5000)
+        parser.add_argument('--test-size', type=float, default=0.2)
+        parser.add_argument('--output', default=None, help="Defaults to FIRST_STAGE_MODEL_PATH")
+
+    def handle(self, *args, **options):
+        texts, labels = self._load_dataset(options['labelled'], options['limit'])
+
+        label_classes = load_label_classes()
+        kept = [(t, l) for t, l in zip(texts, labels) if is_known_label(l, label_classes)]
+        if len(kept) < len(texts):
+            self.stdout.write(f"Dropped {len(texts) - len(kept)} sample(s) with labels unknown to the encoders.")
+        texts = [t[:LINEAR_MAX_CHARS] for t, _ in kept]
+        targets = [join_labels(*l) for _, l in kept]
+
+        counts = Counter(targets)
+        if len(counts) < 2:
+            raise CommandError("Need at least two distinct labels to train.")
+        self.stdout.write(f"{len(texts)} sample(s), {len(counts)} label(s)")
+
+        stratify = targets if min(counts.values()) >= 2 else None
+        x_train, x_test, y_train, y_test = train_test_split(
+            texts, targets, test_size=options['test_size'], random_state=42, stratify=stratify
+        )
+
+        pipeline = Pipeline([
+            ('tfidf', TfidfVectorizer(
+                lowercase=True, ngram_range=(1, 2), min_df=2, max_features=50000,
+                sublinear_tf=True, dtype=float,
+            )),
+            ('clf', LogisticRegression(max_iter=2000, C=4.0)),
+        ])
+
+        started = time.perf_counter()
+        pipeline.fit(x_train, y_train)
+        self.stdout.write(f"Trained in {time.perf_counter() - started:.1f}s")
+
+        started = time.perf_counter()
+        probabilities = pipeline.predict_proba(x_test)
+        per_doc_ms = (time.perf_counter() - started) / max(1, len(x_test)) * 1000
+        predictions = pipeline.classes_[probabilities.argmax(axis=1)]
+        confidences = probabilities.max(axis=1)
+
+        self.stdout.write(f"Held-out: {len(x_test)} sample(s), {per_doc_ms:.2f} ms/doc")
+        for threshold in (0.6, 0.7, 0.8, DEFAULT_THRESHOLD, 0.95):
+            answered = confidences >= threshold
+            coverage = answered.mean() if len(answered) else 0
+            correct = sum(p == y for p, y, a in zip(predictions, y_test, answered) if a)
+            accuracy = correct / answered.sum() if answered.sum() else 0
+            self.stdout.write(f"  threshold {threshold:.2f}: answers {coverage:.1%}, accuracy {accuracy:.1%}")
+
+        # Refit on everything before saving
+        pipeline.fit(texts, targets)
+        output = options['output'] or get_first_stage_model_path()
+        joblib.dump({
+            'pipeline': pipeline,
+            'trained_at': timezone.now().isoformat(),
+            'samples': len(texts),
+        }, output)
+        self.stdout.write(self.style.SUCCESS(f"Saved {output}"))
+
+    def _load_dataset(self, path, limit):
+        if path:
+            texts, labels = [], []
+            with open(path, encoding='utf-8') as f:
+                for line in f:
+                    if not line.strip():
+                        continue
+                    row = json.loads(line)
+                    texts.append(row['text'])
+                    labels.append((row['primary_kra'], row['criterion'], row['sub_criterion']))
+                    if len(texts) >= limit:
+                        break
+            return texts, labels
+
+        from api.services.ml_processing_service import classify_documents_local
+
+        texts = [t for t in ExtractedTextCache.objects.values_list('text', flat=True)[:limit] if t.strip()]
+        if not texts:
+            raise CommandError("No cached extractions to label. Pass --labelled.")
+        self.stdout.write(f"Labelling {len(texts)} cached text(s) with BERT...")
+        results = classify_documents_local(texts)
+        labels = [(r['primary_kra'], r['criterion'], r['sub_criterion']) for r in results]
+        return texts, labels
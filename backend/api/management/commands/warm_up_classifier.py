@@ -0,0 +1,43 @@
+# api/management/commands/warm_up_classifier.py
+import os
+import resource
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+
+def _rss_mb():
+    """Current resident set size in MB (Linux), falling back to peak RSS."""
+    try:
+        with open('/proc/self/statm') as f:
+            pages = int(f.read().split()[1])
+        return pages * os.sysconf('SC_PAGE_SIZE') / (1024 * 1024)
+    except (OSError, ValueError, IndexError):
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+class Command(BaseCommand):
+    help = "Loads the BERT classifier and reports import/load time and memory."
+
+    def handle(self, *args, **options):
+        baseline = _rss_mb()
+        started = time.perf_counter()
+        from api.services import ml_processing_service
+        import_seconds = time.perf_counter() - started
+        after_import = _rss_mb()
+
+        self.stdout.write(
+            f"Import:  {import_seconds:.2f}s, RSS {baseline:.0f} -> {after_import:.0f} MB "
+            f"(model loaded: {ml_processing_service.is_model_ready()})"
+        )
+
+        started = time.perf_counter()
+        ready = ml_processing_service.warm_up_model()
+        load_seconds = time.perf_counter() - started
+        after_load = _rss_mb()
+
+        self.stdout.write(f"Load:    {load_seconds:.2f}s, RSS {after_import:.0f} -> {after_load:.0f} MB")
+
+        if not ready:
+            raise CommandError("Classifier failed to load.")
+        self.stdout.write(self.style.SUCCESS("Classifier ready."))
@@ -0,0 +1,43 @@
+# Generated by Django 5.2.7 on 2026-10-17 09:12
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0009_documentupload_extracted_json'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='documentupload',
+            name='cache_hits',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='documentupload',
+            name='cache_misses',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.CreateModel(
+            name='ExtractedTextCache',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('file_id', models.CharField(max_length=255)),
+                ('revision', models.CharField(max_length=255)),
+                ('file_name', models.CharField(blank=True, max_length=255)),
+                ('text', models.TextField(blank=True)),
+                ('page_count', models.IntegerField(default=0)),
+                ('extraction_method', models.CharField(blank=True, max_length=20)),
+                ('size_bytes', models.IntegerField(default=0)),
+                ('created_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('last_accessed', models.DateTimeField(default=django.utils.timezone.now)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['last_accessed'], name='api_extract_last_ac_2a8c12_idx')],
+                'unique_together': {('file_id', 'revision')},
+            },
+        ),
+    ]
@@ -0,0 +1,30 @@
+# Generated by Django 5.2.7 on 2026-10-17 11:40
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0010_extractedtextcache_documentupload_cache_hits_and_more'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ClassificationCache',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('text_hash', models.CharField(max_length=64)),
+                ('model_version', models.CharField(max_length=64)),
+                ('result', models.JSONField(default=dict)),
+                ('hits', models.IntegerField(default=0)),
+                ('created_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('last_accessed', models.DateTimeField(default=django.utils.timezone.now)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['last_accessed'], name='api_classif_last_ac_c97228_idx')],
+                'unique_together': {('text_hash', 'model_version')},
+            },
+        ),
+    ]
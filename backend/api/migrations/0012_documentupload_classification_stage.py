@@ -0,0 +1,18 @@
+# Generated by Django 5.2.7 on 2026-10-17 13:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0011_classificationcache'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='documentupload',
+            name='classification_stage',
+            field=models.CharField(blank=True, max_length=20, null=True),
+        ),
+    ]
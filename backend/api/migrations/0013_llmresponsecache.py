@@ -0,0 +1,35 @@
+# Generated by Django 5.2.7 on 2026-10-17 15:20
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0012_documentupload_classification_stage'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LLMResponseCache',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('llm_model', models.CharField(max_length=100)),
+                ('prompt_version', models.CharField(max_length=32)),
+                ('faculty_name', models.CharField(blank=True, max_length=255)),
+                ('text_hash', models.CharField(max_length=64)),
+                ('response', models.JSONField(default=dict)),
+                ('hits', models.IntegerField(default=0)),
+                ('created_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('last_accessed', models.DateTimeField(default=django.utils.timezone.now)),
+            ],
+            options={
+                'indexes': [
+                    models.Index(fields=['last_accessed'], name='api_llmresp_last_ac_e454b7_idx'),
+                    models.Index(fields=['created_at'], name='api_llmresp_created_04d68e_idx'),
+                ],
+                'unique_together': {('llm_model', 'prompt_version', 'faculty_name', 'text_hash')},
+            },
+        ),
+    ]
@@ -86,6 +86,13 @@ class DocumentUpload(models.Model):
     source_filename = models.CharField(max_length=255, blank=True, null=True)
     extracted_json = models.JSONField(default=list, blank=True) 
 
+    # Extracted-text cache usage for this upload's files
+    cache_hits = models.IntegerField(default=0)
+    cache_misses = models.IntegerField(default=0)
+
+    # Which classifier stage answered: 'rules', 'linear' or 'bert'
+    classification_stage = models.CharField(max_length=20, blank=True, null=True)
+
     class Meta:
         ordering = ['-created_at']
 
@@ -94,4 +101,60 @@ class DocumentUpload(models.Model):
 
     def get_extracted_items(self):
         """Helper method to safely get the extracted items list."""
-        return self.extracted_json if isinstance(self.extracted_json, list) else []
\ No newline at end of file
+        return self.extracted_json if isinstance(self.extracted_json, list) else []
+
+
+class ExtractedTextCache(models.Model):
+    """Extracted text of one Drive file revision, shared across uploads."""
+    file_id = models.CharField(max_length=255)
+    revision = models.CharField(max_length=255)
+    file_name = models.CharField(max_length=255, blank=True)
+    text = models.TextField(blank=True)
+    page_count = models.IntegerField(default=0)
+    extraction_method = models.CharField(max_length=20, blank=True)
+    size_bytes = models.IntegerField(default=0)
+    created_at = models.DateTimeField(default=timezone.now)
+    last_accessed = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        unique_together = ('file_id', 'revision')
+        indexes = [models.Index(fields=['last_accessed'])]
+
+    def __str__(self):
+        return f"{self.file_name or self.file_id} ({self.revision})"
+
+
+class ClassificationCache(models.Model):
+    """Classifier output for a normalized text under one model version."""
+    text_hash = models.CharField(max_length=64)
+    model_version = models.CharField(max_length=64)
+    result = models.JSONField(default=dict)
+    hits = models.IntegerField(default=0)
+    created_at = models.DateTimeField(default=timezone.now)
+    last_accessed = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        unique_together = ('text_hash', 'model_version')
+        indexes = [models.Index(fields=['last_accessed'])]
+
+    def __str__(self):
+        return f"{self.text_hash[:12]} ({self.model_version[:12]})"
+
+
+class LLMResponseCache(models.Model):
+    """Parsed JSON answer of one LLM model to one prompt template version, faculty name and sent text."""
+    llm_model = models.CharField(max_length=100)
+    prompt_version = models.CharField(max_length=32)
+    faculty_name = models.CharField(max_length=255, blank=True)
+    text_hash = models.CharField(max_length=64)
+    response = models.JSONField(default=dict)
+    hits = models.IntegerField(default=0)
+    created_at = models.DateTimeField(default=timezone.now)
+    last_accessed = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        unique_together = ('llm_model', 'prompt_version', 'faculty_name', 'text_hash')
+        indexes = [models.Index(fields=['last_accessed']), models.Index(fields=['created_at'])]
+
+    def __str__(self):
+        return f"{self.text_hash[:12]} ({self.llm_model}, {self.prompt_version})"
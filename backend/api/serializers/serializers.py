@@ -41,13 +41,15 @@ class DocumentUploadSerializer(serializers.ModelSerializer):
             'primary_kra', 'kra_confidence', 'criteria', 'sub_criteria', 'explanation',
             'error_message', 'page_count', 'extracted_text_preview', 'source_filename',
             'extracted_json', # Add this line to include the field in the API response
+            'cache_hits', 'cache_misses', 'classification_stage',
             'success'
         ]
         read_only_fields = [
             'user', 'status', 'created_at', 'google_sheet_link',
             'equivalent_percentage', 'total_score',
             'primary_kra', 'kra_confidence', 'criteria', 'sub_criteria', 'explanation',
-            'error_message', 'page_count', 'extracted_text_preview', 'source_filename'
+            'error_message', 'page_count', 'extracted_text_preview', 'source_filename',
+            'cache_hits', 'cache_misses', 'classification_stage'
             # 'extracted_json' is also read-only, you might want to add it here if it's never set via API input
         ]
 
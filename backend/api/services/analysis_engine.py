@@ -1,10 +1,11 @@
 # backend/api/services/analysis_engine.py
 
 import pandas as pd
-from googleapiclient.discovery import build
 from django.conf import settings
 import re
 
+from .google_clients import get_google_service
+
 # =========================================================
 # CONFIGURATION: NBC 461 RULES
 # =========================================================
@@ -30,7 +31,7 @@ RANK_HIERARCHY = [
 CAPS = {"KRA I": 100, "KRA II": 100, "KRA III": 100, "KRA IV": 100}
 
 def get_google_sheet_client():
-    return build('sheets', 'v4', developerKey=settings.GOOGLE_API_KEY)
+    return get_google_service('sheets', 'v4', developer_key=settings.GOOGLE_API_KEY)
 
 def clean_score(value):
     try:
@@ -0,0 +1,230 @@
+# api/services/classification_cache.py
+"""
+Cache of classifier results, keyed by a hash of the normalized text plus a
+fingerprint of the model that produced them.
+
+Two levels: a per-process LRU in front of the ClassificationCache table. The
+fingerprint covers the model file actually loaded (torch weights or ONNX
+export), the encoders' classes and the settings that change predictions, so
+a retrained or re-exported model never reads stale entries.
+"""
+import hashlib
+import json
+import logging
+import os
+import tempfile
+import threading
+from collections import OrderedDict
+
+from django.conf import settings
+from django.db.models import Count, F, Sum
+from django.utils import timezone
+
+from ..models import ClassificationCache
+
+logger = logging.getLogger(__name__)
+
+_lru = OrderedDict()
+_lru_lock = threading.Lock()
+_stats = {'memory_hits': 0, 'db_hits': 0, 'misses': 0}  # guarded by _lru_lock too
+
+DEFAULT_FILE_HASH_CACHE_PATH = os.path.join(tempfile.gettempdir(), 'docevalkapiyu_model_hashes.json')
+_file_hashes = {}
+_file_hashes_lock = threading.Lock()
+
+
+def _cache_enabled():
+    return getattr(settings, 'CLASSIFICATION_CACHE_ENABLED', True)
+
+
+def normalize_text(text):
+    """Case and whitespace don't reach the uncased classifier, so they don't split the cache."""
+    return " ".join(text.lower().split())
+
+
+def text_hash(text):
+    return hashlib.sha256(normalize_text(text).encode('utf-8')).hexdigest()
+
+
+def file_sha256(path, chunk_size=1024 * 1024):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _file_hash_cache_path():
+    return getattr(settings, 'CLASSIFIER_HASH_CACHE_PATH', DEFAULT_FILE_HASH_CACHE_PATH)
+
+
+def _read_file_hash_cache():
+    try:
+        with open(_file_hash_cache_path(), encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def _write_file_hash_cache(hashes):
+    """Replace the cache file atomically, so concurrent workers never read a partial one."""
+    path = _file_hash_cache_path()
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path) or '.', suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            json.dump(hashes, f)
+        os.replace(tmp_path, path)
+    except OSError:
+        os.unlink(tmp_path)
+        raise
+
+
+def cached_file_sha256(path):
+    """
+    file_sha256, computed once per version of the file. Hashes are memoized in
+    memory and in CLASSIFIER_HASH_CACHE_PATH keyed by (path, size, mtime), so a
+    ~440 MB weights file isn't re-read at every process start, while a
+    re-exported file (new size or mtime) is hashed again.
+    """
+    path = os.path.abspath(path)
+    stat = os.stat(path)
+    stamp = f"{stat.st_size}:{stat.st_mtime_ns}"
+
+    with _file_hashes_lock:
+        digest = _file_hashes.get((path, stamp))
+        if digest:
+            return digest
+
+        hashes = _read_file_hash_cache()
+        entry = hashes.get(path)
+        if entry and entry.get('stamp') == stamp:
+            digest = entry['sha256']
+        else:
+            digest = file_sha256(path)
+            hashes[path] = {'stamp': stamp, 'sha256': digest}
+            try:
+                _write_file_hash_cache(hashes)
+            except OSError as e:
+                logger.warning(f"Could not save the hash of {path}: {e}")
+
+        _file_hashes[(path, stamp)] = digest
+        return digest
+
+
+def compute_model_fingerprint(model_path, encoders, config):
+    """sha256 over the loaded model file's hash, each encoder's classes_ and the inference config."""
+    digest = hashlib.sha256()
+    digest.update(cached_file_sha256(model_path).encode())
+    for encoder in encoders:
+        digest.update(json.dumps([str(c) for c in encoder.classes_]).encode())
+    digest.update(json.dumps(config, sort_keys=True, default=str).encode())
+    return digest.hexdigest()
+
+
+def _lru_get(key):
+    with _lru_lock:
+        result = _lru.get(key)
+        if result is not None:
+            _lru.move_to_end(key)
+        return result
+
+
+def _lru_put(key, result):
+    max_entries = getattr(settings, 'CLASSIFICATION_CACHE_LRU_SIZE', 1024)
+    with _lru_lock:
+        _lru[key] = result
+        _lru.move_to_end(key)
+        while len(_lru) > max_entries:
+            _lru.popitem(last=False)
+
+
+def _count(**counts):
+    with _lru_lock:
+        for name, n in counts.items():
+            _stats[name] += n
+
+
+def get_cached_classifications(hashes, fingerprint):
+    """Returns {text_hash: result} for the hashes already classified under this fingerprint."""
+    if not _cache_enabled() or not fingerprint:
+        return {}
+
+    found = {}
+    for h in hashes:
+        result = _lru_get((h, fingerprint))
+        if result is not None:
+            found[h] = dict(result)
+    memory_hits = len(found)
+
+    remaining = [h for h in set(hashes) if h not in found]
+    if remaining:
+        rows = ClassificationCache.objects.filter(model_version=fingerprint, text_hash__in=remaining)
+        for text_hash_value, result in rows.values_list('text_hash', 'result'):
+            found[text_hash_value] = dict(result)
+            _lru_put((text_hash_value, fingerprint), result)
+
+    if found:
+        ClassificationCache.objects.filter(model_version=fingerprint, text_hash__in=list(found)).update(
+            hits=F('hits') + 1, last_accessed=timezone.now()
+        )
+    _count(
+        memory_hits=memory_hits,
+        db_hits=len(found) - memory_hits,
+        misses=len(set(hashes) - set(found)),
+    )
+    return found
+
+
+def store_classifications(results, fingerprint):
+    """results: {text_hash: result}. Only real predictions should be passed in."""
+    if not _cache_enabled() or not fingerprint or not results:
+        return
+
+    for h, result in results.items():
+        _lru_put((h, fingerprint), result)
+        try:
+            ClassificationCache.objects.update_or_create(
+                text_hash=h,
+                model_version=fingerprint,
+                defaults={'result': result, 'last_accessed': timezone.now()},
+            )
+        except Exception as e:
+            logger.warning(f"Could not cache classification {h[:12]}: {e}")
+
+    try:
+        evict_classification_cache()
+    except Exception as e:
+        logger.warning(f"Classification cache eviction failed: {e}")
+
+
+def evict_classification_cache():
+    """Keep the table under CLASSIFICATION_CACHE_MAX_ENTRIES, dropping the least recently used rows."""
+    max_entries = getattr(settings, 'CLASSIFICATION_CACHE_MAX_ENTRIES', 50000)
+    excess = ClassificationCache.objects.count() - max_entries
+    if excess <= 0:
+        return
+    stale_ids = list(ClassificationCache.objects.order_by('last_accessed').values_list('pk', flat=True)[:excess])
+    for i in range(0, len(stale_ids), 500):
+        ClassificationCache.objects.filter(pk__in=stale_ids[i:i + 500]).delete()
+
+
+def get_classification_cache_stats():
+    """
+    Hit counts for this process, plus table-wide totals. Every row was created
+    by one miss, so the persistent hit rate is hits / (hits + rows).
+    """
+    totals = ClassificationCache.objects.aggregate(entries=Count('id'), hits=Sum('hits'))
+    entries = totals['entries'] or 0
+    hits = totals['hits'] or 0
+    with _lru_lock:
+        process = dict(_stats)
+    lookups = process['memory_hits'] + process['db_hits'] + process['misses']
+    return {
+        'entries': entries,
+        'total_hits': hits,
+        'hit_rate': round(hits / (hits + entries), 3) if hits + entries else None,
+        'process': {
+            **process,
+            'hit_rate': round((process['memory_hits'] + process['db_hits']) / lookups, 3) if lookups else None,
+        },
+    }
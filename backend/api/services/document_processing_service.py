@@ -1,22 +1,22 @@
 import os
-import uuid
 import io
-import pytesseract
 import logging
 import json
-import fitz  # PyMuPDF
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from datetime import datetime
-from PIL import Image, ImageFilter, ImageOps
 from django.conf import settings
-from googleapiclient.discovery import build
-from google.oauth2 import service_account  
 from googleapiclient.http import MediaIoBaseDownload
 
-from docx import Document
-from .ml_processing_service import classify_document
+from .first_stage_classifier import classify_with_cascade
 from .google_sheets_service import send_evaluation_to_spreadsheetKRA1_Eval, normalize_values, send_research_to_sheet, send_program_contribution_to_sheet
 from .extraction_strategies import route_extraction
-from .scoring_rules import calculate_score, SCORING_RULES
+from .parsed_document import ParsedDocument
+from .google_clients import get_google_service, get_service_account_credentials
+from .extraction_cache import DRIVE_REVISION_FIELDS, get_cached_extraction, store_extraction, evict_extraction_cache
+from .ocr_backends import DEFAULT_OCR_BACKEND
+from .text_extraction_service import SUPPORTED_MIME_TYPES, PageOCREngine, extract_text_from_file
 
 logger = logging.getLogger(__name__)
 
@@ -24,16 +24,16 @@ logger = logging.getLogger(__name__)
 SCOPES = ['https://www.googleapis.com/auth/drive.readonly']
 
 def get_drive_service():
-    """Authenticates using Service Account Credentials."""
+    """Authenticates using Service Account Credentials. Returns this thread's pooled Drive client."""
     try:
         if not hasattr(settings, 'GOOGLE_SERVICE_ACCOUNT_FILE'):
             raise ValueError("GOOGLE_SERVICE_ACCOUNT_FILE not found in settings.")
             
-        creds = service_account.Credentials.from_service_account_file(
+        creds = get_service_account_credentials(
             settings.GOOGLE_SERVICE_ACCOUNT_FILE, 
             scopes=SCOPES
         )
-        return build('drive', 'v3', credentials=creds)
+        return get_google_service('drive', 'v3', credentials=creds)
     except Exception as e:
         logger.error(f"Failed to authenticate with Service Account: {e}")
         raise e
@@ -41,7 +41,8 @@ def get_drive_service():
 def extract_text_from_drive(drive_link):
     """
     Returns a list of file info dicts.
-    Format: [{'text': str, 'page_count': int, 'file_name': str, 'file_id': str}, ...]
+    Format: [{'text': str, 'page_count': int, 'file_name': str, 'file_id': str,
+              'extraction_method': str, 'cache_hit': bool}, ...]
     """
     try:
         if 'drive.google.com' not in drive_link:
@@ -63,17 +64,85 @@ def extract_text_from_drive(drive_link):
 
         if folder_id:
             print(f"Detected folder ID: {folder_id}")
-            return extract_files_from_drive_folder(folder_id)
+            file_info_list = extract_files_from_drive_folder(folder_id)
         else:
             print(f"Detected file ID: {file_id}")
             file_info = extract_text_from_drive_file(file_id)
-            return [file_info] if file_info else []
+            file_info_list = [file_info] if file_info else []
+
+        try:
+            evict_extraction_cache()
+        except Exception as cache_error:
+            logger.warning(f"Extraction cache eviction failed: {cache_error}")
+
+        return file_info_list
 
     except Exception as e:
         print(f"Error parsing Google Drive link: {e}")
         return []
 
 
+def _download_drive_file(file_id, file_name, file_size=None, service=None):
+    """
+    Download a Drive file. Returns its contents as bytes, or, when the file is
+    larger than DRIVE_DOWNLOAD_MAX_MEMORY_BYTES, the path of a temp file
+    (release it with _release_download).
+    """
+    service = service or get_drive_service()
+    max_memory = getattr(settings, 'DRIVE_DOWNLOAD_MAX_MEMORY_BYTES', 32 * 1024 * 1024)
+
+    # Using MediaIoBaseDownload is more robust than request.execute() for files
+    request = service.files().get_media(fileId=file_id)
+
+    if file_size is None or int(file_size) <= max_memory:
+        buffer = io.BytesIO()
+        _run_download(buffer, request)
+        return buffer.getvalue()
+
+    fd, temp_path = tempfile.mkstemp(
+        prefix="drive_",
+        suffix=os.path.splitext(file_name)[1],
+        dir=getattr(settings, 'DOCUMENT_TEMP_DIR', None),
+    )
+    try:
+        with os.fdopen(fd, 'wb') as fh:
+            _run_download(fh, request)
+    except BaseException:
+        _release_download(temp_path)
+        raise
+    return temp_path
+
+
+def _run_download(fh, request):
+    downloader = MediaIoBaseDownload(fh, request)
+    done = False
+    while done is False:
+        status, done = downloader.next_chunk()
+
+
+def _build_file_info(file_metadata, extracted):
+    return {
+        'text': extracted['text'],
+        'page_count': extracted['page_count'],
+        'file_name': file_metadata['name'],
+        'file_id': file_metadata['id'],
+        'extraction_method': extracted['extraction_method'],
+        'page_methods': extracted.get('page_methods', []),
+        'ocr_pages': extracted.get('ocr_pages', []),
+        'page_offsets': extracted.get('page_offsets', []),
+        'cache_hit': False,
+    }
+
+
+def _release_download(source):
+    """Delete a spilled temp file. In-memory downloads need no cleanup."""
+    if isinstance(source, str) and os.path.exists(source):
+        try:
+            os.remove(source)
+        except Exception as cleanup_error:
+            print(f"Warning: Could not remove temp file: {cleanup_error}")
+
+
 def extract_text_from_drive_file(file_id):
     """Extract text from a single file and return file info dict."""
     # Use the new helper function for auth
@@ -84,73 +153,31 @@ def extract_text_from_drive_file(file_id):
         return None
 
     try:
-        file_metadata = service.files().get(fileId=file_id, fields="name, mimeType").execute()
+        file_metadata = service.files().get(
+            fileId=file_id, fields=f"id, name, mimeType, size, {DRIVE_REVISION_FIELDS}"
+        ).execute()
         file_name = file_metadata['name']
         mime_type = file_metadata['mimeType']
 
         print(f"Processing file: {file_name} (MIME: {mime_type})")
 
-        supported_mimes = {
-            'application/pdf',
-            'application/vnd.openxmlformats-officedocument.wordprocessingml.document',
-            'application/msword',
-            'image/jpeg',
-            'image/png',
-            'image/tiff',
-            'image/gif',
-            'image/bmp',
-        }
-
-        if mime_type not in supported_mimes:
+        if mime_type not in SUPPORTED_MIME_TYPES:
             print(f"Unsupported file type: {mime_type}")
             return None
 
-        # --- UPDATED DOWNLOAD LOGIC ---
-        # Using MediaIoBaseDownload is more robust than request.execute() for files
-        request = service.files().get_media(fileId=file_id)
-        os.makedirs(settings.MEDIA_ROOT, exist_ok=True)
-        temp_path = os.path.join(settings.MEDIA_ROOT, f"{uuid.uuid4()}_{file_name}")
-
-        with io.FileIO(temp_path, 'wb') as fh:
-            downloader = MediaIoBaseDownload(fh, request)
-            done = False
-            while done is False:
-                status, done = downloader.next_chunk()
-                # Optional: print(f"Download {int(status.progress() * 100)}%.")
-        # ------------------------------
-
-        # Extract text and page count based on file type
-        text = ""
-        page_count = 0
-        
+        cached = get_cached_extraction(file_metadata)
+        if cached:
+            return cached
+
+        source = _download_drive_file(file_id, file_name, file_metadata.get('size'), service=service)
         try:
-            if mime_type == 'application/pdf':
-                text, page_count = extract_text_from_pdf_with_ocr(temp_path)
-            elif mime_type == 'application/vnd.openxmlformats-officedocument.wordprocessingml.document':
-                text = extract_text_from_word(temp_path)
-                page_count = 0
-            elif mime_type.startswith('image/'):
-                text = extract_text_from_image(temp_path)
-                page_count = 1
-            else:
-                text, page_count = "", 0
-        except Exception as extract_error:
-            print(f"Error during text extraction: {extract_error}")
-            text, page_count = "", 0
+            extracted = extract_text_from_file(source, mime_type, get_ocr_engine())
+        finally:
+            _release_download(source)
 
-        # Clean up temp file
-        if os.path.exists(temp_path):
-            try:
-                os.remove(temp_path)
-            except Exception as cleanup_error:
-                print(f"Warning: Could not remove temp file: {cleanup_error}")
-
-        return {
-            'text': text,
-            'page_count': page_count,
-            'file_name': file_name,
-            'file_id': file_id
-        }
+        file_info = _build_file_info(file_metadata, extracted)
+        store_extraction(file_metadata, file_info)
+        return file_info
 
     except Exception as e:
         print(f"Error processing file {file_id}: {e}")
@@ -180,7 +207,7 @@ def extract_files_from_drive_folder(folder_id):
 
         results = service.files().list(
             q=query,
-            fields="files(id, name, mimeType)"
+            fields=f"files(id, name, mimeType, size, {DRIVE_REVISION_FIELDS})"
         ).execute()
         files = results.get('files', [])
 
@@ -188,14 +215,20 @@ def extract_files_from_drive_folder(folder_id):
             print("No supported files found in folder.")
             return []
 
-        file_info_list = []
-        for idx, file in enumerate(files):
-            print(f"Processing {idx+1}/{len(files)}: {file['name']} ({file['mimeType']})")
-            file_info = extract_text_from_drive_file(file['id'])
-            if file_info:
-                file_info_list.append(file_info)
+        # The listing already carries revision metadata, so cache hits cost no extra call
+        file_info_list = [get_cached_extraction(f) for f in files]
+        missed = [f for f, info in zip(files, file_info_list) if info is None]
+        print(f"Extraction cache: {len(files) - len(missed)} hit(s), {len(missed)} miss(es)")
 
-        return file_info_list
+        extracted = iter(_extract_folder_files(missed))
+        for idx, info in enumerate(file_info_list):
+            if info is None:
+                info = next(extracted)
+                if info:
+                    store_extraction(files[idx], info)
+                file_info_list[idx] = info
+
+        return [info for info in file_info_list if info]
 
     except Exception as e:
         print(f"Error processing folder {folder_id}: {e}")
@@ -203,102 +236,131 @@ def extract_files_from_drive_folder(folder_id):
         return []
 
 
-def preprocess_for_ocr(img: Image.Image) -> Image.Image:
-    """Preprocess image for better OCR results."""
-    try:
-        gray = img.convert("L")
-        gray = ImageOps.autocontrast(gray)
-        gray = gray.filter(ImageFilter.MedianFilter(size=3))
-        threshold = gray.point(lambda x: 0 if x < 160 else 255, "1")
-        return threshold
-    except Exception as e:
-        print(f"Preprocessing error: {e}, using original image")
-        return img
+# =========================================================
+# FOLDER PIPELINE: threaded downloads -> extraction, OCR pages on a process pool
+# =========================================================
+
+_download_pools = {}
+_download_pool_lock = threading.Lock()
 
 
-def extract_text_from_pdf_with_ocr(file_path):
+def get_download_pool(workers):
     """
-    Extract text from PDF. Returns tuple (text, page_count).
+    Thread pool for Drive downloads, shared by every folder in this process
+    and created on first use. Its threads live as long as the process, so
+    each keeps its pooled Drive client (and keep-alive connection) from
+    get_google_service() across folders and uploads.
     """
-    try:
-        doc = fitz.open(file_path)
-        text = ""
-        
-        for page in doc:
-            text += page.get_text()
+    with _download_pool_lock:
+        pool = _download_pools.get(workers)
+        if pool is None:
+            pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="drive-download")
+            _download_pools[workers] = pool
+        return pool
 
-        page_count = doc.page_count
-        doc.close()
 
-        # If no selectable text, use OCR
-        if not text.strip():
-            print("No text found. Using OCR...")
-            text = extract_text_with_ocr(file_path)
+def _extraction_worker_count():
+    return getattr(settings, 'DOCUMENT_EXTRACTION_WORKERS', None) or min(4, os.cpu_count() or 1)
 
-        return text, page_count
 
-    except Exception as e:
-        print(f"PDF extraction error: {e}")
-        import traceback
-        traceback.print_exc()
-        return "", 0
+def get_ocr_engine():
+    """
+    OCR engine configured from settings:
+    - DOCUMENT_EXTRACTION_WORKERS: OCR processes shared by all files (CPU/RAM).
+      A daemonic process (Celery's default prefork children) cannot start them
+      and OCRs sequentially; see DocEvalKapiyu/celery.py.
+    - OCR_MAX_PAGES: pages OCR'd per document; the rest are skipped.
+    - OCR_TIME_BUDGET_SECONDS: wall-clock OCR budget per document. Pages in
+      progress when it runs out are finished; their shards stop after them.
+    - OCR_PREPROCESSING: 'numpy' (default) or 'pil'.
+    - OCR_ADAPTIVE_THRESHOLD: local-mean thresholding for unevenly lit scans.
+    - OCR_BACKEND: 'tesserocr' (persistent in-process engine) or 'pytesseract'
+      (tesseract CLI per page); defaults to ocr_backends.DEFAULT_OCR_BACKEND.
+      Unknown or uninstalled backends fall back to pytesseract.
+    """
+    return PageOCREngine(
+        workers=_extraction_worker_count(),
+        max_pages=getattr(settings, 'OCR_MAX_PAGES', None),
+        time_budget=getattr(settings, 'OCR_TIME_BUDGET_SECONDS', None),
+        preprocessing=getattr(settings, 'OCR_PREPROCESSING', 'numpy'),
+        adaptive_threshold=getattr(settings, 'OCR_ADAPTIVE_THRESHOLD', False),
+        ocr_backend=getattr(settings, 'OCR_BACKEND', DEFAULT_OCR_BACKEND),
+    )
 
 
-def extract_text_with_ocr(file_path):
-    """Extract text from PDF using OCR. Returns string."""
-    text = ""
-    
-    try:
-        doc = fitz.open(file_path)
-        
-        for page in doc:
-            pix = page.get_pixmap(dpi=200)
-            img_bytes = pix.tobytes("png")
-            img = Image.open(io.BytesIO(img_bytes))
-            
-            # Preprocess for better OCR
-            processed = preprocess_for_ocr(img)
-            page_text = pytesseract.image_to_string(processed, lang="eng")
-            text += page_text + "\n"
-        
-        doc.close()
-        
-    except Exception as e:
-        print(f"OCR error: {e}")
-        import traceback
-        traceback.print_exc()
-    
-    return text
+def _extract_folder_files(files):
+    """
+    Download files on an I/O thread pool and extract them as downloads finish.
+    OCR pages from every file share the OCR process pool. Returns file info
+    dicts aligned with `files` (None where a file failed).
+
+    Limits (settings):
+    - DRIVE_DOWNLOAD_WORKERS: concurrent Drive downloads (quota), on the
+      process-wide download pool.
+    - DOCUMENT_EXTRACTION_WORKERS: files extracted at once, and OCR processes.
+    - DRIVE_MAX_PENDING_FILES: downloaded files waiting for extraction (RAM/disk).
+    - DRIVE_DOWNLOAD_MAX_MEMORY_BYTES: larger files are spilled to a temp file.
+    """
+    if not files:
+        return []
 
+    download_workers = getattr(settings, 'DRIVE_DOWNLOAD_WORKERS', 4)
+    extraction_workers = _extraction_worker_count()
+    max_pending = getattr(settings, 'DRIVE_MAX_PENDING_FILES', None) or extraction_workers * 2
+    pending_slots = threading.BoundedSemaphore(max_pending)
+    ocr_engine = get_ocr_engine()
 
-def extract_text_from_word(file_path):
-    """Extract text from Word document. Returns string."""
-    try:
-        doc = Document(file_path)
-        return "\n".join([p.text for p in doc.paragraphs])
-    except Exception as e:
-        print(f"Error reading .docx file: {e}")
-        import traceback
-        traceback.print_exc()
-        return ""
+    file_count = len(files)
+    results = [None] * file_count
 
+    def download(idx, file):
+        pending_slots.acquire()
+        try:
+            print(f"Processing {idx+1}/{file_count}: {file['name']} ({file['mimeType']})")
+            return _download_drive_file(file['id'], file['name'], file.get('size'))
+        except Exception:
+            pending_slots.release()
+            raise
+
+    io_pool = get_download_pool(download_workers)
+
+    # Extraction must not share the download pool: downloads block on
+    # pending_slots until an extraction finishes.
+    with ThreadPoolExecutor(max_workers=extraction_workers) as extraction_pool:
+        download_futures = {io_pool.submit(download, idx, f): idx for idx, f in enumerate(files)}
+        extraction_futures = {}
+
+        for future in as_completed(download_futures):
+            idx = download_futures[future]
+            file = files[idx]
+            try:
+                source = future.result()
+            except Exception as e:
+                print(f"Error downloading file {file['id']}: {e}")
+                continue
+
+            extraction_future = extraction_pool.submit(extract_text_from_file, source, file['mimeType'], ocr_engine)
+
+            def on_extracted(_, source=source):
+                _release_download(source)
+                pending_slots.release()
+
+            extraction_future.add_done_callback(on_extracted)
+            extraction_futures[extraction_future] = idx
+
+        for future in as_completed(extraction_futures):
+            idx = extraction_futures[future]
+            file = files[idx]
+            try:
+                extracted = future.result()
+            except Exception as e:
+                print(f"Error extracting file {file['id']}: {e}")
+                continue
+
+            results[idx] = _build_file_info(file, extracted)
+
+    return results
 
-def extract_text_from_image(file_path):
-    """Extract text from image file using OCR. Returns string."""
-    try:
-        img = Image.open(file_path)
-        
-        # Preprocess for better OCR
-        processed = preprocess_for_ocr(img)
-        text = pytesseract.image_to_string(processed, lang="eng")
-        
-        return text
-        
-    except Exception as e:
-        print(f"Error processing image file {file_path}: {e}")
-        import traceback
-        traceback.print_exc()
-        return ""
 
 def map_classification_to_evidence_type(classification_result):
     pk = classification_result.get("primary_kra")
@@ -603,6 +665,9 @@ def process_document_upload(upload):
     try:
         file_info_list = extract_text_from_drive(upload.google_drive_link)
         
+        upload.cache_hits = sum(1 for f in file_info_list if f.get('cache_hit'))
+        upload.cache_misses = len(file_info_list) - upload.cache_hits
+
         if not file_info_list:
             upload.status = "failed"
             upload.error_message = "No valid files found"
@@ -613,14 +678,20 @@ def process_document_upload(upload):
         
         print(f"\n--- SCANNING {len(file_info_list)} FILES ---")
 
+        # Each file's text is parsed once and shared by priority detection,
+        # classification and extraction.
+        documents = [ParsedDocument.from_file_info(f) for f in file_info_list]
+
         priority_file = None
+        priority_document = None
         supporting_files = []
         
         final_extraction_files = [] 
 
-        for f in file_info_list:
+        for document in documents:
+            f = document.file_info
             fname = f['file_name'].lower()
-            text = f['text'].lower()
+            text = document.lower
             
             is_cert = "certifi" in fname or "this is to certify" in text
             
@@ -632,30 +703,34 @@ def process_document_upload(upload):
                 print(f"-> Found PRIORITY File: {f['file_name']}")
                 if not priority_file:
                     priority_file = f
-                final_extraction_files.append(f)
+                    priority_document = document
+                final_extraction_files.append(document)
                 
             elif is_research and not priority_file:
                 print(f"-> Found PRIORITY File (Research): {f['file_name']}")
                 priority_file = f
-                final_extraction_files.append(f)
+                priority_document = document
+                final_extraction_files.append(document)
                 
             elif is_reso:
                 print(f"-> Found SUPPORTING File: {f['file_name']}")
                 supporting_files.append(f)
-                final_extraction_files.append(f)
+                final_extraction_files.append(document)
                 
             else:
-                final_extraction_files.append(f)
+                final_extraction_files.append(document)
 
         if not priority_file and file_info_list:
-            priority_file = file_info_list[0]
+            priority_document = documents[0]
+            priority_file = priority_document.file_info
             print(f"-> No specific priority detected. Using first file as anchor: {priority_file['file_name']}")
 
         print(f"\n--- CLASSIFYING SINGLE FILE: {priority_file['file_name']} ---")
-        classification_result = classify_document(priority_file['text'])
+        classification_result = classify_with_cascade(priority_document)
+        print(f"Classified by stage: {classification_result.get('stage')}")
         
         if classification_result.get('primary_kra') == "1":
-            p_text = priority_file['text'].lower()
+            p_text = priority_document.lower
             if "degree" in p_text or "program" in p_text or "curriculum" in p_text:
                 if classification_result.get('sub_criterion') != "2.1":
                     print("-> Correction: Detected 'Program/Degree' keywords. Forcing Evidence Type to Program.")
@@ -665,24 +740,20 @@ def process_document_upload(upload):
         evidence_type = map_classification_to_evidence_type(classification_result)
         print(f"Determined Evidence Type: {evidence_type}")
 
-        combined_text = ""
-        total_pages = 0
-        file_names = []
-        
-        sorted_files = [priority_file] + [f for f in final_extraction_files if f != priority_file]
+        sorted_documents = [priority_document] + [d for d in final_extraction_files if d is not priority_document]
+        sorted_files = [d.file_info for d in sorted_documents]
+        total_pages = sum(f['page_count'] for f in sorted_files)
+        file_names = [f['file_name'] for f in sorted_files]
 
-        for f in sorted_files:
-            combined_text += f"\n\n--- FILE: {f['file_name']} ---\n"
-            combined_text += f['text']
-            total_pages += f['page_count']
-            file_names.append(f['file_name'])
+        combined_document = ParsedDocument.combine(sorted_documents)
+        combined_text = combined_document.text
 
         extracted_data = []
         upload.total_score = 0.0 
 
         if evidence_type:
             try:
-                raw_items = route_extraction(evidence_type, combined_text, faculty_name=faculty_full_name)
+                raw_items = route_extraction(evidence_type, combined_document, faculty_name=faculty_full_name)
                 
                 processor = PROCESSING_STRATEGIES.get(evidence_type, _process_fallback)
                 extracted_data = processor(combined_text, classification_result, upload, raw_items)
@@ -697,6 +768,7 @@ def process_document_upload(upload):
         upload.kra_confidence = classification_result.get("confidence")
         upload.criteria = classification_result.get("criterion")
         upload.sub_criteria = classification_result.get("sub_criterion")
+        upload.classification_stage = classification_result.get("stage")
         
         upload.explanation = f"Classified using '{priority_file['file_name']}'. Extracted data from {len(sorted_files)} files."
         upload.extracted_text_preview = combined_text[:500] + "..."
@@ -713,9 +785,22 @@ def process_document_upload(upload):
             'text_preview': combined_text[:200]
         }
         
+        # Per-file extraction details, including per-page OCR timings
+        extraction_stats = [
+            {
+                'file_name': f['file_name'],
+                'extraction_method': f.get('extraction_method'),
+                'cache_hit': f.get('cache_hit', False),
+                'page_methods': f.get('page_methods', []),
+                'ocr_pages': f.get('ocr_pages', []),
+            }
+            for f in sorted_files
+        ]
+
         upload.extracted_json = json.dumps({
             'file_count': len(sorted_files),
-            'files': [unified_result]
+            'files': [unified_result],
+            'extraction': extraction_stats
         }, indent=2)
         
         upload.save()
@@ -0,0 +1,110 @@
+# api/services/extraction_cache.py
+"""
+Persistent cache of extracted text, keyed by Drive file ID + revision.
+
+The revision comes from the Drive metadata already fetched before download
+(md5Checksum, falling back to headRevisionId, then modifiedTime), so a hit
+skips the download and OCR entirely.
+"""
+import logging
+from datetime import timedelta
+
+from django.conf import settings
+from django.db.models import Sum
+from django.utils import timezone
+
+from ..models import ExtractedTextCache
+
+logger = logging.getLogger(__name__)
+
+# Drive metadata fields needed to build the cache key
+DRIVE_REVISION_FIELDS = "md5Checksum, headRevisionId, modifiedTime"
+
+
+def _revision_key(metadata):
+    if metadata.get('md5Checksum'):
+        return f"md5:{metadata['md5Checksum']}"
+    if metadata.get('headRevisionId'):
+        return f"rev:{metadata['headRevisionId']}"
+    if metadata.get('modifiedTime'):
+        return f"mtime:{metadata['modifiedTime']}"
+    return None
+
+
+def _cache_enabled():
+    return getattr(settings, 'EXTRACTION_CACHE_ENABLED', True)
+
+
+def get_cached_extraction(metadata):
+    """
+    Look up a Drive file (metadata dict with 'id', 'name' and revision fields).
+    Returns a file info dict on hit, None on miss.
+    """
+    revision = _revision_key(metadata)
+    if not _cache_enabled() or not revision:
+        return None
+
+    entry = ExtractedTextCache.objects.filter(file_id=metadata['id'], revision=revision).first()
+    if entry is None:
+        return None
+
+    ExtractedTextCache.objects.filter(pk=entry.pk).update(last_accessed=timezone.now())
+    print(f"Cache hit: {metadata['name']} ({entry.extraction_method})")
+    return {
+        'text': entry.text,
+        'page_count': entry.page_count,
+        'file_name': metadata['name'],
+        'file_id': metadata['id'],
+        'extraction_method': entry.extraction_method,
+        'cache_hit': True,
+    }
+
+
+def store_extraction(metadata, file_info):
+    """Save a fresh extraction. Empty/failed extractions are not cached."""
+    revision = _revision_key(metadata)
+    if not _cache_enabled() or not revision or not file_info.get('text', '').strip():
+        return
+
+    text = file_info['text']
+    try:
+        ExtractedTextCache.objects.update_or_create(
+            file_id=metadata['id'],
+            revision=revision,
+            defaults={
+                'file_name': metadata.get('name', '')[:255],
+                'text': text,
+                'page_count': file_info.get('page_count') or 0,
+                'extraction_method': file_info.get('extraction_method', ''),
+                'size_bytes': len(text.encode('utf-8')),
+                'last_accessed': timezone.now(),
+            },
+        )
+    except Exception as e:
+        logger.warning(f"Could not cache extraction for {metadata['id']}: {e}")
+
+
+def evict_extraction_cache():
+    """
+    Drop entries older than EXTRACTION_CACHE_MAX_AGE_DAYS (by last access), then
+    the least recently used ones until the total text size fits EXTRACTION_CACHE_MAX_BYTES.
+    """
+    max_age_days = getattr(settings, 'EXTRACTION_CACHE_MAX_AGE_DAYS', 90)
+    max_bytes = getattr(settings, 'EXTRACTION_CACHE_MAX_BYTES', 512 * 1024 * 1024)
+
+    cutoff = timezone.now() - timedelta(days=max_age_days)
+    ExtractedTextCache.objects.filter(last_accessed__lt=cutoff).delete()
+
+    total = ExtractedTextCache.objects.aggregate(total=Sum('size_bytes'))['total'] or 0
+    if total <= max_bytes:
+        return
+
+    stale_ids = []
+    for pk, size in ExtractedTextCache.objects.order_by('last_accessed').values_list('pk', 'size_bytes').iterator():
+        if total <= max_bytes:
+            break
+        stale_ids.append(pk)
+        total -= size
+
+    for i in range(0, len(stale_ids), 500):
+        ExtractedTextCache.objects.filter(pk__in=stale_ids[i:i + 500]).delete()
@@ -0,0 +1,178 @@
+# api/services/extraction_patterns.py
+"""
+Compiled regular expressions shared by the extractors (extraction_strategies, opti).
+
+Fixed patterns are compiled once at import. Patterns that depend on input
+(faculty names, section headers, role keywords) go through the lru_cached
+builders at the bottom, so each distinct one is compiled once per process.
+Keyword lists that are only tested for "any of" are compiled as a single
+alternation.
+"""
+import re
+from functools import lru_cache
+
+# =========================================================
+# SHARED
+# =========================================================
+
+WHITESPACE_RUN = re.compile(r'\s+')
+
+# =========================================================
+# KRA 1A: EVALUATIONS
+# =========================================================
+
+INLINE_WHITESPACE = re.compile(r"[ \t\f\v]+")
+CARRIAGE_RETURN = re.compile(r"\r")
+PERCENTAGE = re.compile(r"\b\d{1,3}(?:\.\d+)?%")
+EQUIVALENT_PERCENTAGE = re.compile(
+    r"Equivalent\s*Percentage\s*(?:[:\-–—]?\s*)?(\d{1,3}(?:\.\d+)?%)",
+    re.IGNORECASE | re.DOTALL,
+)
+SEMESTER_AY = re.compile(
+    r"\b\d{1,2}(?:st|nd|rd|th)\s+semester\s+(?:A\.Y\.|A\.Y)\s*\d{4}\s*[-–—]\s*\d{4}",
+    re.IGNORECASE,
+)
+SEMESTER_AY_WORDS = re.compile(
+    r"\b(first|second|1st|2nd)\s+semester\s+(?:A\.Y\.|A\.Y)\s*\d{4}\s*[-–—]\s*\d{4}",
+    re.IGNORECASE,
+)
+
+STUDENT_EVALUATION_PATTERNS = [
+    r"\bstudents?['’]?\s*evaluation\b",
+    r"\bstudent\s+evaluation\b",
+    r"\bevaluation\s+by\s+students?\b",
+    r"\bstudents?\s+evaluation\s+on\b",
+]
+SUPERVISOR_EVALUATION_PATTERNS = [
+    r"\bsupervisors?['’]?\s*evaluation\b",
+    r"\bsupervisor\s+evaluation\b",
+    r"\bevaluation\s+by\s+supervisors?\b",
+    r"\bsupervisors?\s+evaluation\s+on\b",
+]
+
+
+def _with_ocr_fallbacks(patterns):
+    """
+    One alternation of the patterns plus their OCR-tolerant fallbacks
+    (every literal \\s+ relaxed to \\W{0,6}). A search succeeds exactly when
+    any of the original patterns or any fallback would.
+    """
+    fallbacks = [re.sub(r"\\s\+", r"\\W{0,6}", p) for p in patterns]
+    return re.compile("|".join(f"(?:{p})" for p in patterns + fallbacks), re.IGNORECASE)
+
+
+STUDENT_EVALUATION = _with_ocr_fallbacks(STUDENT_EVALUATION_PATTERNS)
+SUPERVISOR_EVALUATION = _with_ocr_fallbacks(SUPERVISOR_EVALUATION_PATTERNS)
+
+# =========================================================
+# KRA 1B: PROGRAMS
+# =========================================================
+
+SOURCE_TAG = re.compile(r"<source>.*?<\/source>", re.DOTALL | re.IGNORECASE)
+BOARD_RESOLUTION = re.compile(
+    r"(?:Board\s+)?Resolution\s+No\.?\s*([\w\d-]+)\s*(?:Series of|s\.)\s*(\d{4})", re.IGNORECASE
+)
+PROGRAM_ACADEMIC_YEAR = re.compile(r"(?:A\.?Y\.?|Academic\s+Year)[\s:]*(\d{4}\s*[-–]\s*\d{4})", re.IGNORECASE)
+
+REVISED_PROGRAM = re.compile(
+    r"(" + "|".join([
+        r"revis",        # revised, revision, revising
+        r"enhanc",       # enhanced, enhancement
+        r"amend",        # amended, amendment
+        r"enrich",       # enriched, enrichment
+        r"updat",        # updated, update
+        r"modif",        # modified, modification
+        r"curriculum\s+change",
+    ]) + r")",
+    re.IGNORECASE,
+)
+NEW_PROGRAM = re.compile(
+    r"(" + "|".join([
+        r"new",
+        r"propos",       # proposal, proposed
+        r"offer",        # offering
+        r"creat",        # creation
+        r"establish",    # establishment
+        r"institut",     # institution of
+    ]) + r")",
+    re.IGNORECASE,
+)
+LEAD_KEYWORD = re.compile(
+    r"(" + "|".join([
+        r"lead",
+        r"head",
+        r"chair",
+        r"manager",      # Project Manager
+        r"proponent",    # Lead Proponent
+        r"principal",    # Principal Author
+        r"author",
+        r"spearh",
+    ]) + r")",
+    re.IGNORECASE,
+)
+DEGREE = re.compile(
+    r"(?:1\.|2\.|3\.|•)?\s*((?:Bachelor|Master|Doctor)\s+of\s+[\w\s]+(?:Major\s+in\s+[\w\s]+)?)", re.IGNORECASE
+)
+
+# =========================================================
+# KRA 1C: ACADEMIC YEAR / PROJECT LEVEL
+# =========================================================
+
+ACADEMIC_YEAR_PATTERNS = [
+    re.compile(r"(?P<ay>(?:AY|A\.Y\.)\s*(?P<start>\d{4})\s*[-–—]\s*(?P<end>\d{4}))", re.IGNORECASE),
+    re.compile(r"(?P<ay>(?P<start>\d{4})\s*[-–—]\s*(?P<end>\d{4}))", re.IGNORECASE),
+    re.compile(r"\bAY\s*(?P<start>\d{4})\b", re.IGNORECASE),
+    re.compile(r"\b(?P<ay>(?P<start>(?:2019|2020|2021|2022|2023|2024|2025))\b)", re.IGNORECASE),
+]
+
+# Checked in this order; the first level with any matching keyword wins.
+PROJECT_LEVELS = [
+    ('SP', re.compile(r'\bspecial\s+project\b')),
+    ('CP', re.compile(r'\bcapstone\s+project\b|\bcapstone\b|\bcp\b')),
+    ('UT', re.compile(r'\bundergraduate\s+thesis\b|\bundergraduate\b|\but\b|\bbscs\b')),
+    ('MT', re.compile(r'\bmaster[\'’]?\s*thesis\b|\bmaster[\'’]?\b|\bmt\b|\bmit\b')),
+    ('DD', re.compile(r'\bdissertation\b|\bdd\b|\bdoctoral\b')),
+]
+
+# =========================================================
+# INPUT-DEPENDENT PATTERNS
+# =========================================================
+
+
+@lru_cache(maxsize=256)
+def literal(text, flags=0):
+    """Compiled re.escape(text)."""
+    return re.compile(re.escape(text), flags)
+
+
+@lru_cache(maxsize=256)
+def literal_word(text, flags=0):
+    """Compiled \\b<text>\\b with text escaped."""
+    return re.compile(rf'\b{re.escape(text)}\b', flags)
+
+
+@lru_cache(maxsize=64)
+def any_literal_word(words, flags=0):
+    """One alternation matching where any of the escaped words matches as \\b<word>\\b."""
+    return re.compile(r'\b(?:' + '|'.join(re.escape(w) for w in words) + r')\b', flags)
+
+
+@lru_cache(maxsize=64)
+def any_literal_start(words, flags=0):
+    """
+    Zero-width match at every position where any escaped word starts,
+    overlapping occurrences included (finditer yields each start once).
+    """
+    return re.compile(r'(?=' + '|'.join(re.escape(w) for w in sorted(words, key=len, reverse=True)) + r')', flags)
+
+
+@lru_cache(maxsize=64)
+def name_contribution_patterns(faculty_name):
+    """(name ... contributed, contributed ... name, lead role ... name, name ... lead role) for one faculty name."""
+    name = re.escape(faculty_name)
+    return (
+        re.compile(rf"{name}.*contributed", re.IGNORECASE),
+        re.compile(rf"contributed.*{name}", re.IGNORECASE),
+        re.compile(rf"(?:Lead|Head|Chair|Manager|Proponent).*?{name}", re.IGNORECASE),
+        re.compile(rf"{name}.*?(?:Lead|Head|Chair|Manager|Proponent)", re.IGNORECASE),
+    )
@@ -4,9 +4,14 @@ from datetime import time as datetime
 import re
 import random
 import uuid
-from .opti import _generate_name_variants, _find_section_blocks, _find_name_near_role, _extract_academic_year, _extract_project_level
+from .opti import _generate_name_variants, _extract_academic_year, _extract_project_level
+from . import extraction_patterns as patterns
+from .parsed_document import as_parsed_document
+from .llm_rate_limiter import DEFAULT_MAX_WAIT_SECONDS, RateLimitTimeout, estimate_tokens, get_llm_rate_limiter, retry_after_seconds
+from .llm_response_cache import get_cached_llm_response, store_llm_response
 import json
 import logging
+import threading
 from groq import Groq
 from django.conf import settings
 
@@ -14,81 +19,39 @@ logger = logging.getLogger(__name__)
 
 def extract_kra1a_evaluation(raw_text, debug_dump=False, faculty_name=None):
     print("INFO: Using existing logic for KRA 1A evaluation extraction.")
-    if not raw_text or not raw_text.strip():
+    document = as_parsed_document(raw_text)
+    raw_text = document.text
+    if not raw_text.strip():
         return []
 
-    norm_text = (
-        raw_text.replace("\u2019", "'")
-        .replace("\u2018", "'")
-        .replace("\u201c", '"')
-        .replace("\u201d", '"')
-        .replace("\u2013", "-")
-        .replace("\u2014", "-")
-        .replace("\u00A0", " ")
-    )
-    norm_text = re.sub(r"[ \t\f\v]+", " ", norm_text)
-    norm_text = re.sub(r"\r", "\n", norm_text)
+    norm_text = document.normalized
 
-    percentages = re.findall(r"\b\d{1,3}(?:\.\d+)?%", norm_text)
+    percentages = patterns.PERCENTAGE.findall(norm_text)
 
-    eq_match = re.search(
-        r"Equivalent\s*Percentage\s*(?:[:\-–—]?\s*)?(\d{1,3}(?:\.\d+)?%)",
-        norm_text,
-        re.IGNORECASE | re.DOTALL,
-    )
+    eq_match = patterns.EQUIVALENT_PERCENTAGE.search(norm_text)
     equivalent_percentage = (
         eq_match.group(1) if eq_match else (percentages[0] if percentages else None)
     )
 
     semester_ay = None
-    sem_match = re.search(
-        r"\b\d{1,2}(?:st|nd|rd|th)\s+semester\s+(?:A\.Y\.|A\.Y)\s*\d{4}\s*[-–—]\s*\d{4}",
-        norm_text,
-        re.IGNORECASE,
-    )
+    sem_match = patterns.SEMESTER_AY.search(norm_text)
     if sem_match:
         semester_ay = sem_match.group(0).strip()
     else:
-        sem_match2 = re.search(
-            r"\b(first|second|1st|2nd)\s+semester\s+(?:A\.Y\.|A\.Y)\s*\d{4}\s*[-–—]\s*\d{4}",
-            norm_text,
-            re.IGNORECASE,
-        )
+        sem_match2 = patterns.SEMESTER_AY_WORDS.search(norm_text)
         if sem_match2:
             semester_ay = sem_match2.group(0).strip()
 
     found = []
-    student_patterns = [
-        r"\bstudents?['’]?\s*evaluation\b",
-        r"\bstudent\s+evaluation\b",
-        r"\bevaluation\s+by\s+students?\b",
-        r"\bstudents?\s+evaluation\s+on\b",
-    ]
-    supervisor_patterns = [
-        r"\bsupervisors?['’]?\s*evaluation\b",
-        r"\bsupervisor\s+evaluation\b",
-        r"\bevaluation\s+by\s+supervisors?\b",
-        r"\bsupervisors?\s+evaluation\s+on\b",
-    ]
-
-    def smart_search(patterns, text_to_search):
-        for p in patterns:
-            if re.search(p, text_to_search, re.IGNORECASE):
-                return True
-        for p in patterns:
-            fallback = re.sub(r"\\s\+", r"\\W{0,6}", p)
-            if re.search(fallback, text_to_search, re.IGNORECASE):
-                return True
-        return False
-
-    if smart_search(student_patterns, norm_text):
+    # Each compiled pattern covers the phrasings and their OCR-tolerant fallbacks.
+    if patterns.STUDENT_EVALUATION.search(norm_text):
         found.append("Student's Evaluation")
-    if smart_search(supervisor_patterns, norm_text):
+    if patterns.SUPERVISOR_EVALUATION.search(norm_text):
         found.append("Supervisor's Evaluation")
 
-    if "student" in raw_text.lower() and "Student's Evaluation" not in found:
+    if "student" in document.lower and "Student's Evaluation" not in found:
         found.append("Student's Evaluation")
-    if "supervisor" in raw_text.lower() and "Supervisor's Evaluation" not in found:
+    if "supervisor" in document.lower and "Supervisor's Evaluation" not in found:
         found.append("Supervisor's Evaluation")
 
     evaluation_type = ", ".join(found) if found else None
@@ -121,6 +84,8 @@ def extract_kra1a_evaluation(raw_text, debug_dump=False, faculty_name=None):
 
 def extract_kra1c_adviser(text, faculty_name=None):
     print(f"EXTRACTOR: extract_kra1c_adviser called for faculty: {faculty_name}")
+    document = as_parsed_document(text)
+    text = document.text
     if not faculty_name:
         print("Warning: Faculty name not provided for adviser extraction.")
         return []
@@ -138,7 +103,7 @@ def extract_kra1c_adviser(text, faculty_name=None):
     print(f"DEBUG: Generated name variants for matching: {name_variants}")
 
 
-    sections = _find_section_blocks(text, section_headers=['adviser', 'approved by', 'committee', 'signatures'])
+    sections = document.sections(['adviser', 'approved by', 'committee', 'signatures'])
     print(f"DEBUG: Found sections: {list(sections.keys())}")
     relevant_text = sections.get('adviser', sections.get('approved by', sections.get('committee', text)))
     print(f"DEBUG: Using text of length {len(relevant_text)} for adviser search.")
@@ -149,7 +114,9 @@ def extract_kra1c_adviser(text, faculty_name=None):
         r'dissertation[-\s]?adviser', r'undergraduate[-\s]?thesis[-\s]?adviser',
         r'master[\'’]?\s*thesis[-\s]?adviser', r'd\.?i\.?t\.?\s*thesis\s*adviser'
     ]
-    found_name, context_found = _find_name_near_role(relevant_text, name_variants, adviser_role_keywords)
+    found_name, context_found = document.name_role_index_for(relevant_text).find_name_near_role(
+        name_variants, adviser_role_keywords
+    )
 
     if not found_name:
         print(f"INFO: Faculty name '{faculty_name}' not found near adviser role keywords in the relevant text section.")
@@ -201,6 +168,8 @@ def extract_kra1c_panel(text, faculty_name=None):
     with the count of instances for that combination and the total score.
     """
     print(f"EXTRACTOR: extract_kra1c_panel called for faculty: {faculty_name}")
+    document = as_parsed_document(text)
+    text = document.text
     if not faculty_name:
         print("Warning: Faculty name not provided for panel extraction.")
         return []
@@ -217,7 +186,7 @@ def extract_kra1c_panel(text, faculty_name=None):
     name_variants = _generate_name_variants(first_name, last_name)
     print(f"DEBUG: Generated name variants for matching: {name_variants}")
 
-    sections = _find_section_blocks(text, section_headers=['panel', 'committee', 'approved by', 'signatures'])
+    sections = document.sections(['panel', 'committee', 'approved by', 'signatures'])
     print(f"DEBUG: Found sections: {list(sections.keys())}")
     relevant_text = sections.get('panel', sections.get('committee', sections.get('approved by', text)))
     print(f"DEBUG: Using text of length {len(relevant_text)} for panel search.")
@@ -226,7 +195,9 @@ def extract_kra1c_panel(text, faculty_name=None):
         r'panel[-\s]?member', r'panelist', r'member', r'external[-\s]?reader',
         r'committee', r'oral[-\s]?examination', r'examiner'
     ]
-    found_name, context_found = _find_name_near_role(relevant_text, name_variants, panel_role_keywords)
+    found_name, context_found = document.name_role_index_for(relevant_text).find_name_near_role(
+        name_variants, panel_role_keywords
+    )
 
     if not found_name:
         print(f"INFO: Faculty name '{faculty_name}' not found near panel role keywords in the relevant text section.")
@@ -283,50 +254,30 @@ def extract_kra1b_program_leadAndContri(text, faculty_name=None):
     This ensures the output is a single row with a single score.
     """
     print(f"EXTRACTOR: extract_kra1b_program_leadAndContri called for {faculty_name}.")
+    text = as_parsed_document(text).text
     
     results = []
     # Remove source tags and clean up whitespace
-    clean_text = re.sub(r"<source>.*?<\/source>", "", text, flags=re.DOTALL | re.IGNORECASE)
-    clean_text = re.sub(r'\s+', ' ', clean_text).strip()
+    clean_text = patterns.SOURCE_TAG.sub("", text)
+    clean_text = patterns.WHITESPACE_RUN.sub(' ', clean_text).strip()
     
     # --- 1. Common Data Extraction (Board Reso & AY) ---
     
     # Board Resolution Pattern
-    reso_match = re.search(r"(?:Board\s+)?Resolution\s+No\.?\s*([\w\d-]+)\s*(?:Series of|s\.)\s*(\d{4})", clean_text, re.IGNORECASE)
+    reso_match = patterns.BOARD_RESOLUTION.search(clean_text)
     board_reso = f"Resolution No. {reso_match.group(1)} s. {reso_match.group(2)}" if reso_match else "Pending/Not Found"
 
     # Academic Year Pattern
     # Captures only the digits (e.g., "2019-2020") for the dropdown
-    ay_match = re.search(r"(?:A\.?Y\.?|Academic\s+Year)[\s:]*(\d{4}\s*[-–]\s*\d{4})", clean_text, re.IGNORECASE)
+    ay_match = patterns.PROGRAM_ACADEMIC_YEAR.search(clean_text)
     acad_year = ay_match.group(1).replace("–", "-") if ay_match else "2019-2020"
 
     # --- 2. Determine Program Type (New vs Revised) ---
     
-    # Keywords for "Revised"
-    revised_keywords = [
-        r"revis",        # revised, revision, revising
-        r"enhanc",       # enhanced, enhancement
-        r"amend",        # amended, amendment
-        r"enrich",       # enriched, enrichment
-        r"updat",        # updated, update
-        r"modif",        # modified, modification
-        r"curriculum\s+change"
-    ]
-    revised_pattern = r"(" + "|".join(revised_keywords) + r")"
-
-    # Keywords for "New"
-    new_keywords = [
-        r"new",
-        r"propos",       # proposal, proposed
-        r"offer",        # offering
-        r"creat",        # creation
-        r"establish",    # establishment
-        r"institut"      # institution of
-    ]
-    
-    if re.search(revised_pattern, clean_text, re.IGNORECASE):
+    # Keywords for "Revised" (revised, enhanced, amended, ...) are checked before "New"
+    if patterns.REVISED_PROGRAM.search(clean_text):
         program_type = "Revised Program"
-    elif re.search(r"(" + "|".join(new_keywords) + r")", clean_text, re.IGNORECASE):
+    elif patterns.NEW_PROGRAM.search(clean_text):
         program_type = "New Program"
     else:
         program_type = "Revised Program" 
@@ -336,37 +287,27 @@ def extract_kra1b_program_leadAndContri(text, faculty_name=None):
     role = "Contributor" # Default
     
     if faculty_name:
-        # Keywords for "Lead"
-        lead_keywords = [
-            r"lead",
-            r"head",
-            r"chair",
-            r"manager",      # Project Manager
-            r"proponent",    # Lead Proponent
-            r"principal",    # Principal Author
-            r"author",
-            r"spearh"
-        ]
-        
+        name_then_contributed, contributed_then_name, lead_then_name, name_then_lead = (
+            patterns.name_contribution_patterns(faculty_name)
+        )
+
         # Check strict proximity: Is the Faculty Name near a "Lead" keyword?
-        if re.search(rf"{re.escape(faculty_name)}.*contributed", clean_text, re.IGNORECASE) or \
-           re.search(rf"contributed.*{re.escape(faculty_name)}", clean_text, re.IGNORECASE):
+        if name_then_contributed.search(clean_text) or contributed_then_name.search(clean_text):
             role = "Contributor"
         
-        elif re.search(r"(" + "|".join(lead_keywords) + r")", clean_text, re.IGNORECASE):
-            if re.search(rf"(?:Lead|Head|Chair|Manager|Proponent).*?{re.escape(faculty_name)}", clean_text, re.IGNORECASE):
+        elif patterns.LEAD_KEYWORD.search(clean_text):
+            if lead_then_name.search(clean_text):
                 role = "Lead"
-            elif re.search(rf"{re.escape(faculty_name)}.*?(?:Lead|Head|Chair|Manager|Proponent)", clean_text, re.IGNORECASE):
+            elif name_then_lead.search(clean_text):
                 role = "Lead"
             else:
                 role = "Contributor"
     
-    degree_pattern = r"(?:1\.|2\.|3\.|•)?\s*((?:Bachelor|Master|Doctor)\s+of\s+[\w\s]+(?:Major\s+in\s+[\w\s]+)?)"
-    degree_matches = re.findall(degree_pattern, clean_text, re.IGNORECASE)
+    degree_matches = patterns.DEGREE.findall(clean_text)
 
     programs = []
     for d in degree_matches:
-        clean_name = re.sub(r'\s+', ' ', d).strip()
+        clean_name = patterns.WHITESPACE_RUN.sub(' ', d).strip()
         if len(clean_name) > 10: 
             programs.append(clean_name)
     
@@ -544,56 +485,118 @@ def _extract_research_common(text, faculty_name, is_sole=True):
     return results
 """
 
-def query_llm_for_json(prompt, text):
+# Use Llama 3.1 8B Instant (Fastest, Lowest Cost)
+LLM_MODEL = "meta-llama/llama-4-scout-17b-16e-instruct"
+LLM_MAX_TEXT_CHARS = 20000
+# Expected size of the JSON answer, reserved in the token budget until the real usage is known
+LLM_COMPLETION_TOKENS_ESTIMATE = 512
+LLM_MAX_RETRIES = 3
+
+_groq_clients = {}
+_groq_clients_lock = threading.Lock()
+
+
+def get_groq_client():
+    """Process-wide Groq client. GROQ_BASE_URL points it at another endpoint (e.g. a fake server)."""
+    key = (settings.GROQ_API_KEY, getattr(settings, 'GROQ_BASE_URL', None))
+    with _groq_clients_lock:
+        client = _groq_clients.get(key)
+        if client is None:
+            # Retries are ours, so 429s go through the shared rate limiter
+            client = Groq(api_key=key[0], base_url=key[1], max_retries=0)
+            _groq_clients[key] = client
+        return client
+
+
+def _is_rate_limit_error(error):
+    if getattr(error, 'status_code', None) == 429:
+        return True
+    error_str = str(error).lower()
+    return "429" in error_str or "rate limit" in error_str
+
+
+def query_llm_for_json(prompt, text, prompt_version=None, faculty_name=None, bypass_cache=None):
     """
     Sends text to Groq (Llama 3) with built-in Rate Limit protection.
+    Calls wait on the shared token bucket (llm_rate_limiter) only as long as
+    the request/token budget requires.
+
+    With a prompt_version, parsed responses are cached per (model, prompt_version,
+    faculty_name, sent text); a hit makes no API call. bypass_cache (default:
+    the LLM_CACHE_BYPASS setting) skips the lookup but still stores the fresh answer.
     """
+    safe_text = text[:LLM_MAX_TEXT_CHARS] 
+
+    if bypass_cache is None:
+        bypass_cache = getattr(settings, 'LLM_CACHE_BYPASS', False)
+    if prompt_version and not bypass_cache:
+        cached = get_cached_llm_response(LLM_MODEL, prompt_version, faculty_name, safe_text)
+        if cached is not None:
+            print("INFO: Using cached LLM response.")
+            return cached
+
     if not hasattr(settings, 'GROQ_API_KEY') or not settings.GROQ_API_KEY:
         logger.error("GROQ_API_KEY is missing.")
         return None
 
-    # 1. PREVENT BURSTS (Crucial for Free Tier)
-    # The free tier allows ~20 requests/min. A 3-second pause limits you to 20/min max.
-    time.sleep(3) 
-
-    client = Groq(api_key=settings.GROQ_API_KEY)
-    
-    safe_text = text[:20000] 
+    client = get_groq_client()
+    limiter = get_llm_rate_limiter() if getattr(settings, 'LLM_RATE_LIMIT_ENABLED', True) else None
+    max_wait = getattr(settings, 'LLM_RATE_LIMIT_MAX_WAIT', DEFAULT_MAX_WAIT_SECONDS)
     
     system_prompt = """
     You are a strict data extraction API. 
     Output ONLY valid JSON. 
     Do not add Markdown formatting (like ```json).
     """
+    user_content = f"{prompt}\n\nDOCUMENT TEXT:\n{safe_text}"
+    estimated_tokens = estimate_tokens(system_prompt, user_content, completion_tokens=LLM_COMPLETION_TOKENS_ESTIMATE)
+
+    # RETRY LOOP
+    for attempt in range(LLM_MAX_RETRIES):
+        if limiter is not None:
+            try:
+                waited = limiter.acquire(estimated_tokens, max_wait=max_wait)
+            except RateLimitTimeout as e:
+                logger.error(f"Groq rate limit budget exhausted: {e}")
+                return None
+            if waited:
+                print(f"INFO: Waited {waited:.1f}s for the Groq rate limit budget.")
 
-    # 2. RETRY LOOP
-    max_retries = 3
-    for attempt in range(max_retries):
         try:
             chat_completion = client.chat.completions.create(
                 messages=[
                     {"role": "system", "content": system_prompt},
-                    {"role": "user", "content": f"{prompt}\n\nDOCUMENT TEXT:\n{safe_text}"}
+                    {"role": "user", "content": user_content}
                 ],
-                # Use Llama 3.1 8B Instant (Fastest, Lowest Cost)
-                model="meta-llama/llama-4-scout-17b-16e-instruct", 
+                model=LLM_MODEL, 
                 
                 # CRITICAL: JSON Mode
                 response_format={"type": "json_object"}, 
                 temperature=0.1, 
             )
 
+            usage = getattr(chat_completion, 'usage', None)
+            if limiter is not None and getattr(usage, 'total_tokens', None):
+                limiter.record_usage(estimated_tokens, usage.total_tokens)
+
             response_content = chat_completion.choices[0].message.content
-            return json.loads(response_content)
+            data = json.loads(response_content)
+            if prompt_version:
+                store_llm_response(LLM_MODEL, prompt_version, faculty_name, safe_text, data)
+            return data
 
         except Exception as e:
-            error_str = str(e).lower()
-            
-            # If Rate Limit (429), wait and retry
-            if "429" in error_str or "rate limit" in error_str:
-                wait_time = (attempt + 1) * 10 + random.uniform(1, 3) # Wait 10s, 20s, 30s
+            # If Rate Limit (429), wait as long as the API says and retry
+            if _is_rate_limit_error(e):
+                wait_time = retry_after_seconds(e)
+                if wait_time is None:
+                    wait_time = (attempt + 1) * 10 + random.uniform(1, 3) # No hint: wait 10s, 20s, 30s
                 print(f"WARNING: Groq Rate Limit Hit. Cooling down for {wait_time:.1f}s...")
-                time.sleep(wait_time)
+                if limiter is not None:
+                    # Holds back every process, not just this call
+                    limiter.block_for(wait_time)
+                else:
+                    time.sleep(wait_time)
             else:
                 logger.error(f"Groq Error: {e}")
                 return None # Fatal error, stop trying
@@ -608,6 +611,9 @@ def extract_kra2a_co(text, faculty_name=None):
     print(f"EXTRACTOR: extract_kra2a_co called (via Groq).")
     return _extract_research_llm(text, faculty_name, expected_mode="co")
 
+# Bump whenever the research prompt below changes, so cached answers to the old one are not reused
+RESEARCH_PROMPT_VERSION = "research-v1"
+
 def _extract_research_llm(text, faculty_name, expected_mode="sole"):
     """
     Unified extraction prompt.
@@ -640,7 +646,9 @@ def _extract_research_llm(text, faculty_name, expected_mode="sole"):
     }}
     """
 
-    data = query_llm_for_json(prompt, text)
+    data = query_llm_for_json(
+        prompt, as_parsed_document(text).text, prompt_version=RESEARCH_PROMPT_VERSION, faculty_name=faculty_name
+    )
     print(f"DEBUG: Groq returned data: {data}")
     
     # Fallback if Groq fails
@@ -756,12 +764,13 @@ EXTRACTORS = {
 }
 
 def route_extraction(evidence_type, raw_text, faculty_name=None):
+    """raw_text may be a plain string or a ParsedDocument; extractors get a ParsedDocument."""
     func = EXTRACTORS.get(evidence_type)
     if not func:
         print(f"Warning: No extractor found for evidence_type '{evidence_type}'. Returning empty list.")
         return []
     try:
-        result = func(raw_text, faculty_name=faculty_name)
+        result = func(as_parsed_document(raw_text), faculty_name=faculty_name)
         if isinstance(result, list):
             return result
         else:
@@ -0,0 +1,170 @@
+# api/services/first_stage_classifier.py
+"""
+Cheap first stage in front of BERT.
+
+1. Compiled keyword rules for submissions whose type is unambiguous.
+2. A TF-IDF + logistic regression model over joint (KRA, criterion,
+   sub-criterion) labels, trained with `manage.py train_first_stage`.
+
+Either stage answers only when it's confident; everything else goes to BERT.
+Labels are restricted to the classes of the BERT label encoders, so every
+answer maps to an evidence type exactly like a BERT result would.
+"""
+import logging
+import os
+import re
+import threading
+
+import joblib
+from django.conf import settings
+
+from .ml_processing_service import classify_document
+from .parsed_document import as_parsed_document
+
+logger = logging.getLogger(__name__)
+
+STAGE_RULES = 'rules'
+STAGE_LINEAR = 'linear'
+STAGE_BERT = 'bert'
+
+DEFAULT_THRESHOLD = 0.9
+RULE_CONFIDENCE = 99.0
+LABEL_SEPARATOR = '|'
+
+# Only the head of the document is matched, so long papers that merely cite
+# an evaluation or a resolution don't trigger a rule.
+RULE_SCAN_CHARS = 3000
+
+# The linear model sees at most this much text, in training and at inference
+LINEAR_MAX_CHARS = 20000
+
+# (name, pattern, (primary_kra, criterion, sub_criterion))
+KEYWORD_RULES = [
+    (
+        'student_evaluation',
+        re.compile(r"student'?s?\s+evaluation.{0,2000}?equivalent\s+percentage", re.IGNORECASE | re.DOTALL),
+        ("1", "A", "1.1"),
+    ),
+    (
+        'supervisor_evaluation',
+        re.compile(r"supervisor'?s?\s+evaluation.{0,2000}?equivalent\s+percentage", re.IGNORECASE | re.DOTALL),
+        ("1", "A", "1.2"),
+    ),
+    (
+        'curriculum_board_resolution',
+        re.compile(
+            r"board\s+resolution.{0,1500}?\b(curriculum|degree\s+program|academic\s+program)\b",
+            re.IGNORECASE | re.DOTALL,
+        ),
+        ("1", "B", "2.1"),
+    ),
+]
+
+
+def _model_file(name):
+    return os.path.join(settings.BASE_DIR, 'api', 'ml_models', name)
+
+
+def get_first_stage_model_path():
+    return getattr(settings, 'FIRST_STAGE_MODEL_PATH', _model_file('first_stage.joblib'))
+
+
+def join_labels(kra, crit, sub):
+    return LABEL_SEPARATOR.join((str(kra), str(crit), str(sub)))
+
+
+def load_label_classes():
+    """Classes of the BERT encoders: (kra, crit, sub) sets of strings."""
+    classes = []
+    for name in ('kra_encoder.pkl', 'crit_encoder.pkl', 'sub_encoder.pkl'):
+        classes.append({str(c) for c in joblib.load(_model_file(name)).classes_})
+    return tuple(classes)
+
+
+def is_known_label(labels, label_classes):
+    return all(str(label) in classes for label, classes in zip(labels, label_classes))
+
+
+_lock = threading.Lock()
+_state = None
+
+
+def _get_state():
+    """(rules, model) with rules filtered to known labels; loaded once per process."""
+    global _state
+    if _state is None:
+        with _lock:
+            if _state is None:
+                rules, model = [], None
+                try:
+                    label_classes = load_label_classes()
+                    rules = [r for r in KEYWORD_RULES if is_known_label(r[2], label_classes)]
+                    dropped = len(KEYWORD_RULES) - len(rules)
+                    if dropped:
+                        logger.warning(f"{dropped} keyword rule(s) use labels the encoders don't know. Skipped.")
+                except Exception as e:
+                    logger.warning(f"Could not load label encoders for keyword rules: {e}")
+
+                path = get_first_stage_model_path()
+                if os.path.exists(path):
+                    try:
+                        model = joblib.load(path)
+                    except Exception as e:
+                        logger.warning(f"Could not load first-stage model {path}: {e}")
+                _state = (rules, model)
+    return _state
+
+
+def _result(labels, confidence, stage, reason):
+    kra, crit, sub = labels
+    return {
+        'primary_kra': kra,
+        'confidence': round(confidence, 1),
+        'criterion': crit,
+        'sub_criterion': sub,
+        'explanation': f"Document classified as '{kra}' with {round(confidence, 1)}% confidence ({reason}).",
+        'stage': stage,
+    }
+
+
+def classify_first_stage(text):
+    """A result dict if the rules or the linear model are confident enough, else None."""
+    rules, model = _get_state()
+
+    head = text[:RULE_SCAN_CHARS]
+    for name, pattern, labels in rules:
+        if pattern.search(head):
+            return _result(labels, RULE_CONFIDENCE, STAGE_RULES, f"keyword rule '{name}'")
+
+    if model is None:
+        return None
+
+    threshold = getattr(settings, 'FIRST_STAGE_THRESHOLD', DEFAULT_THRESHOLD)
+    try:
+        probabilities = model['pipeline'].predict_proba([text[:LINEAR_MAX_CHARS]])[0]
+    except Exception as e:
+        logger.warning(f"First-stage model failed: {e}")
+        return None
+
+    best = probabilities.argmax()
+    confidence = float(probabilities[best])
+    if confidence < threshold:
+        return None
+    labels = tuple(model['pipeline'].classes_[best].split(LABEL_SEPARATOR))
+    return _result(labels, confidence * 100, STAGE_LINEAR, "TF-IDF first stage")
+
+
+def classify_with_cascade(document):
+    """
+    First stage if confident, otherwise BERT. The result's 'stage' says which one answered.
+    Takes a ParsedDocument or a plain string.
+    """
+    text = as_parsed_document(document).text
+    if getattr(settings, 'FIRST_STAGE_ENABLED', True):
+        result = classify_first_stage(text)
+        if result is not None:
+            return result
+
+    result = classify_document(text)
+    result['stage'] = STAGE_BERT
+    return result
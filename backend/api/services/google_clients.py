@@ -0,0 +1,72 @@
+# api/services/google_clients.py
+"""
+Process-wide pool of Google API clients (Drive, Sheets).
+
+Credentials and discovery documents are loaded once per process and shared.
+Service objects wrap an httplib2 connection, which is not thread-safe, so
+each thread gets its own client and keeps its keep-alive connection. Run
+Drive calls on long-lived threads (document_processing_service.get_download_pool)
+so those clients are reused rather than rebuilt for every short-lived thread.
+Service-account tokens are refreshed automatically by AuthorizedHttp.
+"""
+import logging
+import threading
+
+import httplib2
+import google_auth_httplib2
+from google.oauth2 import service_account
+from googleapiclient.discovery import build, build_from_document
+from googleapiclient.discovery_cache import get_static_doc
+
+logger = logging.getLogger(__name__)
+
+HTTP_TIMEOUT = 60
+
+_lock = threading.Lock()
+_credentials = {}
+_discovery_docs = {}
+_local = threading.local()
+
+
+def get_service_account_credentials(key_file, scopes):
+    """Loads the service-account JSON once per (file, scopes)."""
+    key = (key_file, tuple(scopes))
+    with _lock:
+        creds = _credentials.get(key)
+        if creds is None:
+            creds = service_account.Credentials.from_service_account_file(key_file, scopes=scopes)
+            _credentials[key] = creds
+        return creds
+
+
+def _get_discovery_doc(api, version):
+    """Static discovery document bundled with google-api-python-client, read once."""
+    key = (api, version)
+    with _lock:
+        if key not in _discovery_docs:
+            _discovery_docs[key] = get_static_doc(api, version)
+        return _discovery_docs[key]
+
+
+def get_google_service(api, version, credentials=None, developer_key=None):
+    """Returns this thread's client for (api, version, credentials, developer_key)."""
+    services = getattr(_local, 'services', None)
+    if services is None:
+        services = _local.services = {}
+
+    key = (api, version, id(credentials) if credentials else None, developer_key)
+    service = services.get(key)
+    if service is None:
+        http = httplib2.Http(timeout=HTTP_TIMEOUT)
+        if credentials is not None:
+            http = google_auth_httplib2.AuthorizedHttp(credentials, http=http)
+
+        doc = _get_discovery_doc(api, version)
+        if doc:
+            service = build_from_document(doc, http=http, developerKey=developer_key)
+        else:
+            logger.warning(f"No static discovery document for {api} {version}. Fetching it.")
+            service = build(api, version, http=http, developerKey=developer_key, cache_discovery=False)
+        services[key] = service
+
+    return service
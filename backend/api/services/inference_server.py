@@ -0,0 +1,154 @@
+# api/services/inference_server.py
+"""
+Local inference server: one process owns the classifier and serves every
+web/worker process over localhost HTTP.
+
+    python manage.py run_inference_server --port 8765
+
+Concurrent requests are gathered into micro-batches (up to max_batch_size
+texts, waiting at most max_wait_ms for more) and run through
+classify_documents() by a single model thread.
+
+Endpoints:
+    POST /classify  {"texts": [...]}  ->  {"results": [...]}
+    GET  /health                      ->  model status and batching stats
+"""
+import json
+import logging
+import queue
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from django.db import close_old_connections
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_HOST = '127.0.0.1'
+DEFAULT_PORT = 8765
+DEFAULT_MAX_BATCH_SIZE = 16
+DEFAULT_MAX_WAIT_MS = 20
+
+
+class _Request:
+    def __init__(self, texts):
+        self.texts = texts
+        self.done = threading.Event()
+        self.results = None
+        self.error = None
+
+
+class MicroBatcher:
+    """Collects texts from concurrent callers and classifies them together on one thread."""
+
+    def __init__(self, classify, max_batch_size=DEFAULT_MAX_BATCH_SIZE, max_wait_ms=DEFAULT_MAX_WAIT_MS):
+        self.classify = classify
+        self.max_batch_size = max(1, max_batch_size)
+        self.max_wait = max(0, max_wait_ms) / 1000.0
+        self.stats = {'requests': 0, 'batches': 0, 'texts': 0}
+        self._queue = queue.Queue()
+        self._thread = threading.Thread(target=self._loop, name='classifier-batcher', daemon=True)
+        self._thread.start()
+
+    def submit(self, texts):
+        """Blocks until this caller's texts are classified. Returns their results in order."""
+        request = _Request(list(texts))
+        self._queue.put(request)
+        request.done.wait()
+        if request.error is not None:
+            raise request.error
+        return request.results
+
+    def _collect(self):
+        batch = [self._queue.get()]
+        size = len(batch[0].texts)
+        deadline = time.monotonic() + self.max_wait
+        while size < self.max_batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                request = self._queue.get(timeout=remaining)
+            except queue.Empty:
+                break
+            batch.append(request)
+            size += len(request.texts)
+        return batch
+
+    def _loop(self):
+        while True:
+            batch = self._collect()
+            texts = [text for request in batch for text in request.texts]
+            # The classification cache uses the database from this long-lived
+            # thread; drop connections the server closed or that outlived CONN_MAX_AGE.
+            close_old_connections()
+            try:
+                results = self.classify(texts, self.max_batch_size)
+                offset = 0
+                for request in batch:
+                    request.results = results[offset:offset + len(request.texts)]
+                    offset += len(request.texts)
+            except Exception as e:
+                logger.error(f"Batch classification failed: {e}")
+                for request in batch:
+                    request.error = e
+            finally:
+                close_old_connections()
+
+            self.stats['requests'] += len(batch)
+            self.stats['batches'] += 1
+            self.stats['texts'] += len(texts)
+            for request in batch:
+                request.done.set()
+
+
+def _make_handler(batcher, status):
+    class Handler(BaseHTTPRequestHandler):
+        def _send_json(self, code, payload):
+            body = json.dumps(payload).encode('utf-8')
+            self.send_response(code)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def do_GET(self):
+            if self.path != '/health':
+                return self._send_json(404, {'error': 'Not found'})
+            self._send_json(200, {**status(), 'batching': dict(batcher.stats)})
+
+        def do_POST(self):
+            if self.path != '/classify':
+                return self._send_json(404, {'error': 'Not found'})
+            try:
+                length = int(self.headers.get('Content-Length', 0))
+                texts = json.loads(self.rfile.read(length))['texts']
+                if not isinstance(texts, list) or not all(isinstance(t, str) for t in texts):
+                    raise ValueError("'texts' must be a list of strings")
+            except (ValueError, KeyError, TypeError) as e:
+                return self._send_json(400, {'error': str(e)})
+
+            try:
+                results = batcher.submit(texts)
+            except Exception as e:
+                return self._send_json(500, {'error': str(e)})
+            self._send_json(200, {'results': results})
+
+        def log_message(self, format, *args):
+            logger.debug(format % args)
+
+    return Handler
+
+
+def serve(classify, status, host=DEFAULT_HOST, port=DEFAULT_PORT,
+          max_batch_size=DEFAULT_MAX_BATCH_SIZE, max_wait_ms=DEFAULT_MAX_WAIT_MS):
+    """Run the server until interrupted. classify(texts, batch_size) -> results; status() -> dict."""
+    batcher = MicroBatcher(classify, max_batch_size, max_wait_ms)
+    server = ThreadingHTTPServer((host, port), _make_handler(batcher, status))
+    server.daemon_threads = True
+    print(f"Classifier server listening on http://{host}:{port} "
+          f"(max batch {max_batch_size}, max wait {max_wait_ms} ms)")
+    try:
+        server.serve_forever()
+    finally:
+        server.server_close()
@@ -0,0 +1,275 @@
+# api/services/llm_rate_limiter.py
+"""
+Token-bucket rate limiter for LLM API calls, shared by every web/worker process.
+
+Two buckets are kept per limiter: requests and tokens, each refilled
+continuously at its per-minute budget and capped at one minute's worth.
+A call takes one request plus its estimated tokens; if either bucket is
+short, the caller sleeps exactly until it would be refilled. A 429 from the
+API blocks the whole limiter (every process) until its retry-after expires.
+
+State lives in a SQLite file by default (a write lock per update, so it
+works across processes on one host). Set LLM_RATE_LIMIT_BACKEND = 'redis'
+to share it between hosts.
+"""
+import json
+import logging
+import os
+import re
+import sqlite3
+import tempfile
+import threading
+import time
+from email.utils import parsedate_to_datetime
+
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_REQUESTS_PER_MINUTE = 20
+DEFAULT_TOKENS_PER_MINUTE = 30000
+DEFAULT_MAX_WAIT_SECONDS = 120
+DEFAULT_SQLITE_PATH = os.path.join(tempfile.gettempdir(), 'docevalkapiyu_llm_rate_limit.sqlite3')
+DEFAULT_REDIS_URL = 'redis://localhost:6379/0'
+
+# Rough prompt size estimate; the token bucket is corrected with the real usage afterwards
+CHARS_PER_TOKEN = 4
+
+
+class RateLimitTimeout(Exception):
+    """The budget would not allow the call within max_wait seconds."""
+
+
+def estimate_tokens(*texts, completion_tokens=0):
+    return sum(len(t) for t in texts) // CHARS_PER_TOKEN + 1 + completion_tokens
+
+
+# =========================================================
+# STATE STORES
+# =========================================================
+
+class SQLiteBucketStore:
+    """Bucket state in a SQLite file; updates hold the database write lock."""
+
+    def __init__(self, path=DEFAULT_SQLITE_PATH):
+        self.path = path
+        self._local = threading.local()
+
+    def _connection(self):
+        connection = getattr(self._local, 'connection', None)
+        if connection is None:
+            connection = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            connection.execute(
+                "CREATE TABLE IF NOT EXISTS rate_limit_state (name TEXT PRIMARY KEY, state TEXT NOT NULL)"
+            )
+            self._local.connection = connection
+        return connection
+
+    def transact(self, name, update):
+        """Runs update(state or None) -> (new_state, result) atomically and returns result."""
+        connection = self._connection()
+        connection.execute("BEGIN IMMEDIATE")
+        try:
+            row = connection.execute("SELECT state FROM rate_limit_state WHERE name = ?", (name,)).fetchone()
+            new_state, result = update(json.loads(row[0]) if row else None)
+            connection.execute(
+                "INSERT OR REPLACE INTO rate_limit_state (name, state) VALUES (?, ?)", (name, json.dumps(new_state))
+            )
+            connection.execute("COMMIT")
+        except BaseException:
+            connection.execute("ROLLBACK")
+            raise
+        return result
+
+
+class RedisBucketStore:
+    """Bucket state in Redis; updates are WATCH/MULTI transactions, retried on conflict."""
+
+    KEY_PREFIX = 'llm_rate_limit:'
+    # Idle state is dropped after this long; a fresh bucket is full anyway
+    KEY_TTL_SECONDS = 3600
+
+    def __init__(self, url=DEFAULT_REDIS_URL):
+        import redis
+        self.client = redis.Redis.from_url(url)
+
+    def transact(self, name, update):
+        key = self.KEY_PREFIX + name
+        outcome = {}
+
+        def run(pipe):
+            raw = pipe.get(key)
+            new_state, outcome['result'] = update(json.loads(raw) if raw else None)
+            pipe.multi()
+            pipe.set(key, json.dumps(new_state), ex=self.KEY_TTL_SECONDS)
+
+        self.client.transaction(run, key)
+        return outcome['result']
+
+
+# =========================================================
+# LIMITER
+# =========================================================
+
+class TokenBucketLimiter:
+    def __init__(self, name, store, requests_per_minute, tokens_per_minute, clock=time.time, sleep=time.sleep):
+        self.name = name
+        self.store = store
+        self.requests_per_minute = float(requests_per_minute)
+        self.tokens_per_minute = float(tokens_per_minute)
+        self.clock = clock
+        self.sleep = sleep
+
+    def _refilled(self, state, now):
+        if state is None:
+            return {
+                'requests': self.requests_per_minute,
+                'tokens': self.tokens_per_minute,
+                'updated': now,
+                'blocked_until': 0.0,
+            }
+        elapsed = max(0.0, now - state['updated'])
+        return {
+            'requests': min(self.requests_per_minute, state['requests'] + elapsed * self.requests_per_minute / 60),
+            'tokens': min(self.tokens_per_minute, state['tokens'] + elapsed * self.tokens_per_minute / 60),
+            'updated': now,
+            'blocked_until': state.get('blocked_until', 0.0),
+        }
+
+    def try_acquire(self, tokens):
+        """Takes the budget for one call if it's available now. Returns 0, or the seconds to wait."""
+        # A call larger than the whole bucket waits for a full bucket rather than forever
+        cost = min(float(tokens), self.tokens_per_minute)
+
+        def update(state):
+            now = self.clock()
+            state = self._refilled(state, now)
+            wait = max(
+                0.0,
+                state['blocked_until'] - now,
+                (1 - state['requests']) * 60 / self.requests_per_minute,
+                (cost - state['tokens']) * 60 / self.tokens_per_minute,
+            )
+            if wait == 0:
+                state['requests'] -= 1
+                state['tokens'] -= cost
+            return state, wait
+
+        return self.store.transact(self.name, update)
+
+    def acquire(self, tokens, max_wait=None):
+        """Blocks until the call fits the budget. Returns the seconds waited."""
+        waited = 0.0
+        while True:
+            wait = self.try_acquire(tokens)
+            if wait == 0:
+                return waited
+            if max_wait is not None and waited + wait > max_wait:
+                raise RateLimitTimeout(f"{self.name}: needs {wait:.1f}s more, already waited {waited:.1f}s")
+            self.sleep(wait)
+            waited += wait
+
+    def record_usage(self, estimated_tokens, actual_tokens):
+        """Charges (or refunds) the difference between the estimate taken and the tokens actually used."""
+        difference = float(actual_tokens) - min(float(estimated_tokens), self.tokens_per_minute)
+
+        def update(state):
+            state = self._refilled(state, self.clock())
+            state['tokens'] = max(-self.tokens_per_minute, state['tokens'] - difference)
+            return state, None
+
+        self.store.transact(self.name, update)
+
+    def block_for(self, seconds):
+        """Holds every caller (in every process) back for the given seconds, e.g. after a 429."""
+        def update(state):
+            now = self.clock()
+            state = self._refilled(state, now)
+            state['blocked_until'] = max(state['blocked_until'], now + seconds)
+            return state, None
+
+        self.store.transact(self.name, update)
+
+
+# =========================================================
+# RETRY-AFTER
+# =========================================================
+
+_DURATION_PART = re.compile(r"(\d+(?:\.\d+)?)(ms|h|m|s)")
+_DURATION_UNITS = {'ms': 0.001, 's': 1, 'm': 60, 'h': 3600}
+
+
+def _parse_duration(value):
+    """'7.66s', '2m59.56s', '350ms' -> seconds."""
+    parts = _DURATION_PART.findall(value)
+    if not parts:
+        return None
+    return sum(float(number) * _DURATION_UNITS[unit] for number, unit in parts)
+
+
+def retry_after_seconds(error):
+    """
+    Seconds to wait, from the headers of a 429 response (an API client
+    exception with .response.headers). None if the response gives no hint.
+    """
+    headers = getattr(getattr(error, 'response', None), 'headers', None)
+    if not headers:
+        return None
+
+    value = headers.get('retry-after-ms')
+    if value:
+        try:
+            return float(value) / 1000
+        except ValueError:
+            pass
+
+    value = headers.get('retry-after')
+    if value:
+        try:
+            return max(0.0, float(value))
+        except ValueError:
+            try:
+                return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+            except (TypeError, ValueError):
+                pass
+
+    # Groq also reports when the token window resets. The request reset is the
+    # daily quota, so it's not used here.
+    value = headers.get('x-ratelimit-reset-tokens')
+    if value:
+        return _parse_duration(value)
+    return None
+
+
+# =========================================================
+# SHARED INSTANCE
+# =========================================================
+
+_lock = threading.Lock()
+_limiters = {}
+
+
+def _build_store(backend):
+    if backend == 'redis':
+        url = getattr(settings, 'LLM_RATE_LIMIT_REDIS_URL', DEFAULT_REDIS_URL)
+        try:
+            return RedisBucketStore(url)
+        except ImportError:
+            logger.warning("redis is not installed. Using the SQLite rate limit store.")
+    return SQLiteBucketStore(getattr(settings, 'LLM_RATE_LIMIT_PATH', DEFAULT_SQLITE_PATH))
+
+
+def get_llm_rate_limiter(name='groq'):
+    """This process's limiter for the configured budgets and store (rebuilt if the settings change)."""
+    backend = getattr(settings, 'LLM_RATE_LIMIT_BACKEND', 'sqlite')
+    requests_per_minute = getattr(settings, 'GROQ_REQUESTS_PER_MINUTE', DEFAULT_REQUESTS_PER_MINUTE)
+    tokens_per_minute = getattr(settings, 'GROQ_TOKENS_PER_MINUTE', DEFAULT_TOKENS_PER_MINUTE)
+    location = getattr(settings, 'LLM_RATE_LIMIT_REDIS_URL' if backend == 'redis' else 'LLM_RATE_LIMIT_PATH', None)
+
+    key = (name, backend, location, requests_per_minute, tokens_per_minute)
+    with _lock:
+        limiter = _limiters.get(key)
+        if limiter is None:
+            limiter = TokenBucketLimiter(name, _build_store(backend), requests_per_minute, tokens_per_minute)
+            _limiters[key] = limiter
+        return limiter
@@ -0,0 +1,125 @@
+# api/services/llm_response_cache.py
+"""
+Persistent cache of parsed LLM JSON responses, keyed by (model, prompt
+template version, faculty name, sha256 of the text actually sent).
+
+The same paper is often re-submitted after a failed sheet export or by each
+co-author; a hit skips the API call and the rate limiter entirely. Bump the
+prompt's version string whenever its template changes. Entries expire after
+LLM_CACHE_TTL_DAYS and the table is kept under LLM_CACHE_MAX_ENTRIES (least
+recently used first).
+"""
+import hashlib
+import logging
+import threading
+from datetime import timedelta
+
+from django.conf import settings
+from django.db.models import Count, F, Sum
+from django.utils import timezone
+
+from ..models import LLMResponseCache
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_TTL_DAYS = 30
+DEFAULT_MAX_ENTRIES = 5000
+
+_stats = {'hits': 0, 'misses': 0}
+_stats_lock = threading.Lock()
+
+
+def _count(name):
+    with _stats_lock:
+        _stats[name] += 1
+
+
+def _cache_enabled():
+    return getattr(settings, 'LLM_CACHE_ENABLED', True)
+
+
+def _cutoff():
+    return timezone.now() - timedelta(days=getattr(settings, 'LLM_CACHE_TTL_DAYS', DEFAULT_TTL_DAYS))
+
+
+def sent_text_hash(text):
+    return hashlib.sha256(text.encode('utf-8')).hexdigest()
+
+
+def _key(llm_model, prompt_version, faculty_name, text):
+    return {
+        'llm_model': llm_model,
+        'prompt_version': prompt_version,
+        'faculty_name': (faculty_name or '')[:255],
+        'text_hash': sent_text_hash(text),
+    }
+
+
+def get_cached_llm_response(llm_model, prompt_version, faculty_name, text):
+    """The cached parsed response, or None on a miss (expired entries are misses)."""
+    if not _cache_enabled():
+        return None
+
+    key = _key(llm_model, prompt_version, faculty_name, text)
+    entry = LLMResponseCache.objects.filter(created_at__gte=_cutoff(), **key).only('pk', 'response').first()
+    if entry is None:
+        _count('misses')
+        return None
+
+    LLMResponseCache.objects.filter(pk=entry.pk).update(hits=F('hits') + 1, last_accessed=timezone.now())
+    _count('hits')
+    return entry.response
+
+
+def store_llm_response(llm_model, prompt_version, faculty_name, text, response):
+    """Save a parsed response. Failed calls (None) are never cached."""
+    if not _cache_enabled() or response is None:
+        return
+
+    key = _key(llm_model, prompt_version, faculty_name, text)
+    now = timezone.now()
+    try:
+        LLMResponseCache.objects.update_or_create(
+            **key,
+            defaults={'response': response, 'created_at': now, 'last_accessed': now},
+        )
+    except Exception as e:
+        logger.warning(f"Could not cache LLM response {key['text_hash'][:12]}: {e}")
+        return
+
+    try:
+        evict_llm_cache()
+    except Exception as e:
+        logger.warning(f"LLM cache eviction failed: {e}")
+
+
+def evict_llm_cache():
+    """Drop expired entries, then the least recently used ones above LLM_CACHE_MAX_ENTRIES."""
+    LLMResponseCache.objects.filter(created_at__lt=_cutoff()).delete()
+
+    max_entries = getattr(settings, 'LLM_CACHE_MAX_ENTRIES', DEFAULT_MAX_ENTRIES)
+    excess = LLMResponseCache.objects.count() - max_entries
+    if excess <= 0:
+        return
+    stale_ids = list(LLMResponseCache.objects.order_by('last_accessed').values_list('pk', flat=True)[:excess])
+    for i in range(0, len(stale_ids), 500):
+        LLMResponseCache.objects.filter(pk__in=stale_ids[i:i + 500]).delete()
+
+
+def get_llm_cache_stats():
+    """Same shape as get_classification_cache_stats: table-wide totals plus this process's lookups."""
+    totals = LLMResponseCache.objects.aggregate(entries=Count('id'), hits=Sum('hits'))
+    entries = totals['entries'] or 0
+    hits = totals['hits'] or 0
+    with _stats_lock:
+        process = dict(_stats)
+    lookups = process['hits'] + process['misses']
+    return {
+        'entries': entries,
+        'total_hits': hits,
+        'hit_rate': round(hits / (hits + entries), 3) if hits + entries else None,
+        'process': {
+            **process,
+            'hit_rate': round(process['hits'] / lookups, 3) if lookups else None,
+        },
+    }
@@ -1,14 +1,36 @@
+import json
+import logging
+import mmap
 import os
+import struct
+import threading
+import time
+import resource
+import numpy as np
 import torch
 import torch.nn as nn
 import joblib
-from transformers import BertTokenizer, BertModel
+import requests
+from safetensors.torch import save_file
+from transformers import BertConfig, BertTokenizer, BertTokenizerFast, BertModel
 from django.conf import settings
 
+from .classification_cache import (
+    compute_model_fingerprint,
+    get_cached_classifications,
+    store_classifications,
+    text_hash,
+)
+
+logger = logging.getLogger(__name__)
+
 class TripleBERTClassifier(nn.Module):
-    def __init__(self, kra_classes, crit_classes, sub_classes):
+    def __init__(self, kra_classes, crit_classes, sub_classes, bert=None):
         super(TripleBERTClassifier, self).__init__()
-        self.bert = BertModel.from_pretrained('bert-base-uncased')
+        # bert: a prebuilt encoder (e.g. the distilled student). The default is the
+        # bert-base-uncased architecture (BertConfig() defaults), built from config
+        # only: the fine-tuned checkpoint holds every weight.
+        self.bert = bert if bert is not None else BertModel(BertConfig())
         self.kra_classifier = nn.Linear(self.bert.config.hidden_size, kra_classes)
         self.crit_classifier = nn.Linear(self.bert.config.hidden_size, crit_classes)
         self.sub_classifier = nn.Linear(self.bert.config.hidden_size, sub_classes)
@@ -22,34 +44,277 @@ class TripleBERTClassifier(nn.Module):
         return kra_logits, crit_logits, sub_logits
 
 
-def load_model_and_encoders():
-    try:
-        model_path = os.path.join(settings.BASE_DIR, 'api', 'ml_models', 'bert_hierarchical_model.pt')
-        kra_encoder_path = os.path.join(settings.BASE_DIR, 'api', 'ml_models', 'kra_encoder.pkl')
-        crit_encoder_path = os.path.join(settings.BASE_DIR, 'api', 'ml_models', 'crit_encoder.pkl')
-        sub_encoder_path = os.path.join(settings.BASE_DIR, 'api', 'ml_models', 'sub_encoder.pkl')
-        tokenizer_path = os.path.join(settings.BASE_DIR, 'api', 'ml_models', 'saved_tokenizer')
+def quantize_model(model):
+    """
+    Dynamic int8 quantization of every nn.Linear (BERT's attention/FFN layers
+    and the three heads). Weights are int8, activations are quantized per batch.
+    CPU only.
+    """
+    return torch.ao.quantization.quantize_dynamic(model, {nn.Linear}, dtype=torch.qint8)
+
+
+ONNX_INPUT_NAMES = ['input_ids', 'attention_mask']
+ONNX_OUTPUT_NAMES = ['kra_logits', 'crit_logits', 'sub_logits']
+
+
+class OnnxTripleBERTClassifier:
+    """
+    Runs an exported TripleBERTClassifier through onnxruntime's CPU provider.
+    Called like the torch model: (input_ids, attention_mask) -> three logit tensors.
+    """
+
+    def __init__(self, onnx_path, threads=None):
+        import onnxruntime as ort  # optional dependency
+
+        self.onnx_path = onnx_path
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        options.execution_mode = ort.ExecutionMode.ORT_SEQUENTIAL
+        options.intra_op_num_threads = threads or get_onnx_thread_count()
+        options.inter_op_num_threads = 1
+        self.session = ort.InferenceSession(onnx_path, options, providers=['CPUExecutionProvider'])
+
+    def __call__(self, input_ids, attention_mask):
+        outputs = self.session.run(ONNX_OUTPUT_NAMES, {
+            'input_ids': input_ids.cpu().numpy().astype(np.int64),
+            'attention_mask': attention_mask.cpu().numpy().astype(np.int64),
+        })
+        return tuple(torch.from_numpy(o) for o in outputs)
+
+
+def get_onnx_thread_count():
+    """
+    intra-op threads per onnxruntime session: CLASSIFIER_ONNX_THREADS, or the
+    CPUs split between the processes that each load the classifier, so they
+    don't oversubscribe the cores. That is one process (the inference server)
+    when CLASSIFIER_SERVER_URL is set, else the Celery worker concurrency
+    (CELERY_WORKER_CONCURRENCY, as in DocEvalKapiyu/celery.py). Set
+    CLASSIFIER_ONNX_THREADS when workers are started with --concurrency.
+    """
+    threads = getattr(settings, 'CLASSIFIER_ONNX_THREADS', None)
+    if threads:
+        return threads
+    if getattr(settings, 'CLASSIFIER_SERVER_URL', None):
+        processes = 1
+    else:
+        processes = (
+            getattr(settings, 'CELERY_WORKER_CONCURRENCY', None)
+            or int(os.environ.get('CELERY_WORKER_CONCURRENCY', 2))
+        )
+    return max(1, (os.cpu_count() or 1) // max(1, processes))
+
+
+def get_model_file(name):
+    return os.path.join(settings.BASE_DIR, 'api', 'ml_models', name)
+
+
+def get_onnx_model_path():
+    return getattr(settings, 'CLASSIFIER_ONNX_PATH', get_model_file('bert_hierarchical_model.onnx'))
+
+
+def load_tokenizer(fast=None):
+    """
+    The saved WordPiece tokenizer. fast=True (CLASSIFIER_FAST_TOKENIZER, default)
+    builds the Rust tokenizer from the same vocab.txt/config, falling back to
+    the pure-Python one if that fails.
+    """
+    tokenizer_path = get_model_file('saved_tokenizer')
+    if fast is None:
+        fast = getattr(settings, 'CLASSIFIER_FAST_TOKENIZER', True)
+    if fast:
+        try:
+            return BertTokenizerFast.from_pretrained(tokenizer_path, local_files_only=True)
+        except Exception as e:
+            print(f"Fast tokenizer unavailable ({e}). Using the Python tokenizer.")
+    return BertTokenizer.from_pretrained(tokenizer_path, local_files_only=True)
+
+
+def _load_encoders_and_tokenizer():
+    kra_encoder_path = get_model_file('kra_encoder.pkl')
+    crit_encoder_path = get_model_file('crit_encoder.pkl')
+    sub_encoder_path = get_model_file('sub_encoder.pkl')
+    tokenizer_path = get_model_file('saved_tokenizer')
+
+    if not all(os.path.exists(p) for p in [kra_encoder_path, crit_encoder_path, sub_encoder_path, tokenizer_path]):
+        raise FileNotFoundError("One or more encoder/tokenizer files are missing.")
+
+    kra_encoder = joblib.load(kra_encoder_path)
+    crit_encoder = joblib.load(crit_encoder_path)
+    sub_encoder = joblib.load(sub_encoder_path)
+    tokenizer = load_tokenizer()
+    return tokenizer, kra_encoder, crit_encoder, sub_encoder
+
+
+# Model variants: the fine-tuned 12-layer teacher, or the distilled student
+# produced by `manage.py distill_classifier`. Weights are read from the
+# .safetensors file when present (memory-mapped, see load_safetensors_mmap),
+# otherwise from the .pt checkpoint. A missing teacher config means the
+# bert-base-uncased architecture.
+MODEL_VARIANTS = {
+    'teacher': {
+        'weights': 'bert_hierarchical_model.pt',
+        'safetensors': 'bert_hierarchical_model.safetensors',
+        'config': 'bert_hierarchical_config.json',
+    },
+    'student': {
+        'weights': 'bert_student_model.pt',
+        'safetensors': 'bert_student_model.safetensors',
+        'config': 'bert_student_config.json',
+    },
+}
+
+SAFETENSORS_DTYPES = {
+    'F64': torch.float64, 'F32': torch.float32, 'F16': torch.float16, 'BF16': torch.bfloat16,
+    'I64': torch.int64, 'I32': torch.int32, 'I16': torch.int16, 'I8': torch.int8,
+    'U8': torch.uint8, 'BOOL': torch.bool,
+}
+
+
+def get_model_variant(variant=None):
+    return variant or getattr(settings, 'CLASSIFIER_MODEL', 'teacher')
+
+
+def get_weights_path(variant=None):
+    """The weights file that will be loaded: .safetensors if converted, else the .pt checkpoint."""
+    files = MODEL_VARIANTS[get_model_variant(variant)]
+    safetensors_path = get_model_file(files['safetensors'])
+    if os.path.exists(safetensors_path):
+        return safetensors_path
+    return get_model_file(files['weights'])
+
 
-        if not all(os.path.exists(p) for p in [model_path, kra_encoder_path, crit_encoder_path, sub_encoder_path, tokenizer_path]):
-            raise FileNotFoundError("One or more model/encoder/tokenizer files are missing.")
+def get_bert_config(variant=None):
+    config_path = get_model_file(MODEL_VARIANTS[get_model_variant(variant)]['config'])
+    if os.path.exists(config_path):
+        return BertConfig.from_json_file(config_path)
+    if get_model_variant(variant) == 'teacher':
+        return BertConfig()
+    raise FileNotFoundError(f"Model config not found: {config_path}")
 
-        kra_encoder = joblib.load(kra_encoder_path)
-        crit_encoder = joblib.load(crit_encoder_path)
-        sub_encoder = joblib.load(sub_encoder_path)
-        tokenizer = BertTokenizer.from_pretrained(tokenizer_path)
 
-        kra_classes = len(kra_encoder.classes_)
-        crit_classes = len(crit_encoder.classes_)
-        sub_classes = len(sub_encoder.classes_)
+def load_safetensors_mmap(path):
+    """
+    State dict whose tensors are views of a private, copy-on-write mmap of the
+    file. Nothing is copied into process memory, so every process loading the
+    same file shares its page-cache pages.
+    """
+    with open(path, 'rb') as f:
+        header_size = struct.unpack('<Q', f.read(8))[0]
+        header = json.loads(f.read(header_size))
+        buffer = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_COPY)
 
-        model = TripleBERTClassifier(kra_classes, crit_classes, sub_classes)
+    header.pop('__metadata__', None)
+    data_start = 8 + header_size
+    state_dict = {}
+    for name, info in header.items():
+        dtype = SAFETENSORS_DTYPES[info['dtype']]
+        begin, end = info['data_offsets']
+        shape = info['shape']
+        if end == begin:
+            state_dict[name] = torch.empty(shape, dtype=dtype)
+            continue
+        count = (end - begin) // torch.empty((), dtype=dtype).element_size()
+        state_dict[name] = torch.frombuffer(buffer, dtype=dtype, count=count, offset=data_start + begin).view(shape)
+    return state_dict
 
-        device = torch.device('cuda' if torch.cuda.is_available() else 'cpu')
-        model.load_state_dict(torch.load(model_path, map_location=device))
-        model.to(device)
-        model.eval()
 
-        print("Model, encoders, and tokenizer loaded successfully.")
+def save_model_safetensors(state_dict, path):
+    save_file({k: v.detach().cpu().contiguous() for k, v in state_dict.items()}, path, metadata={'format': 'pt'})
+
+
+def load_checkpoint(variant=None):
+    """Fine-tuned weights for variant: memory-mapped safetensors, or the .pt checkpoint."""
+    path = get_weights_path(variant)
+    if not os.path.exists(path):
+        raise FileNotFoundError(f"Model weights not found: {path}")
+    if path.endswith('.safetensors'):
+        return load_safetensors_mmap(path)
+    return torch.load(path, map_location='cpu')
+
+
+def _materialize_buffers(model, config):
+    """
+    Non-persistent buffers aren't in checkpoints, so after building on the meta
+    device they are recreated here (BertEmbeddings' position/token type ids).
+    """
+    for module_name, module in model.named_modules():
+        for name, buffer in list(module.named_buffers(recurse=False)):
+            if not buffer.is_meta:
+                continue
+            if name == 'position_ids':
+                value = torch.arange(config.max_position_embeddings).expand((1, -1))
+            elif name == 'token_type_ids':
+                value = torch.zeros((1, config.max_position_embeddings), dtype=torch.long)
+            else:
+                raise RuntimeError(f"Buffer {module_name}.{name} was not initialised by the checkpoint.")
+            module.register_buffer(name, value, persistent=False)
+
+
+def build_classifier(kra_classes, crit_classes, sub_classes, state_dict, config):
+    """
+    TripleBERTClassifier built from config alone (on the meta device, so no
+    random init) and given the checkpoint tensors as-is (assign=True), so
+    memory-mapped weights stay memory-mapped. No network access.
+    """
+    with torch.device('meta'):
+        model = TripleBERTClassifier(kra_classes, crit_classes, sub_classes, bert=BertModel(config))
+    model.load_state_dict(state_dict, assign=True)
+    _materialize_buffers(model, config)
+    return model
+
+
+def _load_torch_model(kra_encoder, crit_encoder, sub_encoder, quantize, variant=None):
+    kra_classes = len(kra_encoder.classes_)
+    crit_classes = len(crit_encoder.classes_)
+    sub_classes = len(sub_encoder.classes_)
+
+    model = build_classifier(kra_classes, crit_classes, sub_classes, load_checkpoint(variant), get_bert_config(variant))
+
+    device = torch.device('cuda' if torch.cuda.is_available() else 'cpu')
+    model.to(device)
+    model.eval()
+
+    if quantize:
+        if device.type == 'cpu':
+            model = quantize_model(model)
+            print("Classifier quantized to int8.")
+        else:
+            print("CLASSIFIER_QUANTIZE ignored: int8 dynamic quantization is CPU-only.")
+    return model, device
+
+
+def _load_onnx_model():
+    onnx_path = get_onnx_model_path()
+    if not os.path.exists(onnx_path):
+        raise FileNotFoundError(f"{onnx_path} not found. Run `manage.py export_classifier_onnx`.")
+    return OnnxTripleBERTClassifier(onnx_path, get_onnx_thread_count()), torch.device('cpu')
+
+
+def load_model_and_encoders(quantize=None, backend=None, variant=None):
+    """
+    variant  -- 'teacher' or 'student' (see MODEL_VARIANTS). Defaults to the CLASSIFIER_MODEL setting.
+    quantize -- use the int8 model on CPU. Defaults to the CLASSIFIER_QUANTIZE setting.
+    backend  -- 'torch' (eager PyTorch, the reference) or 'onnx' (onnxruntime, CPU).
+                Defaults to the CLASSIFIER_BACKEND setting. 'onnx' falls back to
+                torch if the exported model or onnxruntime is missing.
+    """
+    if quantize is None:
+        quantize = getattr(settings, 'CLASSIFIER_QUANTIZE', False)
+    if backend is None:
+        backend = getattr(settings, 'CLASSIFIER_BACKEND', 'torch')
+    try:
+        tokenizer, kra_encoder, crit_encoder, sub_encoder = _load_encoders_and_tokenizer()
+
+        model = None
+        if backend == 'onnx':
+            try:
+                model, device = _load_onnx_model()
+            except Exception as e:
+                print(f"ONNX backend unavailable ({e}). Falling back to torch.")
+        if model is None:
+            model, device = _load_torch_model(kra_encoder, crit_encoder, sub_encoder, quantize, variant)
+
+        print(f"Model ({'onnx' if isinstance(model, OnnxTripleBERTClassifier) else 'torch'}), encoders, and tokenizer loaded successfully.")
         return model, tokenizer, kra_encoder, crit_encoder, sub_encoder, device
 
     except Exception as e:
@@ -57,52 +322,395 @@ def load_model_and_encoders():
         return None, None, None, None, None, None
 
 
-MODEL, TOKENIZER, KRA_ENCODER, CRIT_ENCODER, SUB_ENCODER, DEVICE = load_model_and_encoders()
+# =========================================================
+# LAZY MODEL LOADING
+# =========================================================
+# The model is loaded on first use (or by warm_up_model()), not at import,
+# so migrate/shell/web processes that never classify don't pay for it.
 
+_model_lock = threading.Lock()
+_model_components = None
+_model_load_seconds = None
+_model_fingerprint = None
 
-def classify_document(text):
+
+def _peak_rss_mb():
+    # ru_maxrss is in KB on Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def get_model_components():
+    """
+    Returns (model, tokenizer, kra_encoder, crit_encoder, sub_encoder, device),
+    loading them once per process. Thread-safe; a failed load is not retried.
+    """
+    global _model_components, _model_load_seconds, _model_fingerprint
+    if _model_components is None:
+        with _model_lock:
+            if _model_components is None:
+                started = time.perf_counter()
+                components = load_model_and_encoders()
+                _model_load_seconds = time.perf_counter() - started
+                print(f"Classifier load took {_model_load_seconds:.1f}s (peak RSS {_peak_rss_mb():.0f} MB)")
+                if components[0] is not None:
+                    _model_fingerprint = _fingerprint(components)
+                _model_components = components
+    return _model_components
+
+
+def _fingerprint(components):
+    """Model version for the classification cache, taken from what was actually loaded."""
+    model, _, kra_encoder, crit_encoder, sub_encoder, _ = components
+    onnx = isinstance(model, OnnxTripleBERTClassifier)
+    config = {
+        'variant': get_model_variant(),
+        'backend': 'onnx' if onnx else 'torch',
+        'quantize': getattr(settings, 'CLASSIFIER_QUANTIZE', False),
+        'long_document_mode': getattr(settings, 'CLASSIFIER_LONG_DOCUMENT_MODE', DEFAULT_LONG_DOCUMENT_MODE),
+        'window_stride': getattr(settings, 'CLASSIFIER_WINDOW_STRIDE', DEFAULT_WINDOW_STRIDE),
+        'max_windows': getattr(settings, 'CLASSIFIER_MAX_WINDOWS', DEFAULT_MAX_WINDOWS),
+        'aggregation': getattr(settings, 'CLASSIFIER_AGGREGATION', DEFAULT_AGGREGATION),
+    }
+    try:
+        return compute_model_fingerprint(
+            model.onnx_path if onnx else get_weights_path(), (kra_encoder, crit_encoder, sub_encoder), config
+        )
+    except Exception as e:
+        logger.warning(f"Could not fingerprint the classifier ({e}). Classification cache disabled.")
+        return None
+
+
+def get_model_fingerprint():
+    return _model_fingerprint
+
+
+def is_model_ready():
+    """True once the model has been loaded successfully. Never triggers a load."""
+    components = _model_components
+    return components is not None and all(c is not None for c in components[:5])
+
+
+def model_survives_fork():
+    """
+    True if a model loaded in this process stays usable in forked children.
+    Torch CPU weights do (and are shared copy-on-write); onnxruntime sessions
+    and CUDA contexts don't.
+    """
+    return getattr(settings, 'CLASSIFIER_BACKEND', 'torch') != 'onnx' and not torch.cuda.is_available()
+
+
+def warm_up_model():
+    """Load the model now (worker start-up, management command). Returns is_model_ready()."""
+    get_model_components()
+    return is_model_ready()
+
+
+def get_model_status():
+    return {
+        'loaded': _model_components is not None,
+        'ready': is_model_ready(),
+        'fingerprint': _model_fingerprint,
+        'load_seconds': round(_model_load_seconds, 2) if _model_load_seconds is not None else None,
+    }
+
+
+# =========================================================
+# INFERENCE
+# =========================================================
+
+MAX_LENGTH = 512
+DEFAULT_BATCH_SIZE = 8          # windows per forward pass
+
+# Long documents: 'chunk' classifies overlapping 512-token windows and aggregates
+# their logits; 'truncate' only looks at the first window.
+DEFAULT_LONG_DOCUMENT_MODE = 'chunk'
+DEFAULT_WINDOW_STRIDE = 128     # tokens shared by consecutive windows
+DEFAULT_MAX_WINDOWS = 8         # per document; keeps CPU latency bounded
+DEFAULT_AGGREGATION = 'mean'    # 'mean' or 'max' over window logits
+
+# WordPiece tokens never span fewer than one character and English text averages
+# ~4-5 per token, so this many characters per needed token is a safe upper bound.
+CHARS_PER_TOKEN_BUDGET = 10
+
+UNKNOWN_RESULT = {"primary_kra": "Unknown", "confidence": 0, "criterion": "N/A", "sub_criterion": "N/A"}
+ERROR_RESULT = {"primary_kra": "Error", "confidence": 0, "criterion": "N/A", "sub_criterion": "N/A"}
+
+
+def _build_result(kra_label, crit_label, sub_label, kra_confidence):
+    return {
+        'primary_kra': kra_label,
+        'confidence': round(kra_confidence, 1),
+        'criterion': crit_label,
+        'sub_criterion': sub_label,
+        'explanation': f"Document classified as '{kra_label}' with {round(kra_confidence, 1)}% confidence."
+    }
+
+
+def _window_starts(token_count, window_tokens, stride, max_windows):
+    """Start offsets of overlapping windows covering token_count tokens, evenly thinned to max_windows."""
+    if token_count <= window_tokens:
+        return [0]
+    step = max(1, window_tokens - stride)
+    starts = list(range(0, token_count - window_tokens, step)) + [token_count - window_tokens]
+    if len(starts) > max_windows:
+        picks = np.unique(np.linspace(0, len(starts) - 1, max_windows).round().astype(int))
+        starts = [starts[i] for i in picks]
+    return starts
+
+
+def _split_windows(tokenizer, token_ids, chunked, stride, max_windows):
+    """Model inputs ([CLS] ... [SEP]) for one document's windows."""
+    window_tokens = MAX_LENGTH - tokenizer.num_special_tokens_to_add()
+    if chunked:
+        starts = _window_starts(len(token_ids), window_tokens, stride, max_windows)
+    else:
+        starts = [0]
+    return [tokenizer.build_inputs_with_special_tokens(token_ids[s:s + window_tokens]) for s in starts]
+
+
+def get_char_budget(chunked=True, stride=DEFAULT_WINDOW_STRIDE, max_windows=DEFAULT_MAX_WINDOWS):
+    """
+    Characters worth tokenizing: enough for max_windows unthinned windows
+    (or one window when truncating).
+    """
+    tokens = MAX_LENGTH
+    if chunked:
+        tokens += (max_windows - 1) * max(1, MAX_LENGTH - 2 - stride)
+    return tokens * CHARS_PER_TOKEN_BUDGET
+
+
+def pre_truncate_text(text, char_budget, pieces=1):
+    """
+    Cut text to char_budget before tokenizing. Whitespace runs are collapsed
+    first (BERT's basic tokenizer only splits on them, so the tokens are
+    unchanged) and cuts fall on word boundaries. pieces > 1 keeps that many
+    evenly spaced slices of the whole text instead of its head.
+    """
+    if len(text) <= char_budget:
+        return text
+    collapsed = " ".join(text.split())
+    if len(collapsed) <= char_budget:
+        return collapsed
+    if pieces <= 1:
+        return collapsed[:char_budget].rsplit(" ", 1)[0]
+
+    piece_chars = char_budget // pieces
+    step = (len(collapsed) - piece_chars) / (pieces - 1)
+    slices = []
+    for k in range(pieces):
+        start = round(k * step)
+        piece = collapsed[start:start + piece_chars]
+        if start and collapsed[start - 1] != " ":
+            piece = piece.partition(" ")[2]
+        if start + piece_chars < len(collapsed) and collapsed[start + piece_chars] != " ":
+            piece = piece.rpartition(" ")[0]
+        if piece:
+            slices.append(piece)
+    return " ".join(slices)
+
+
+def texts_to_tokenize(texts, chunked, stride, max_windows):
+    """
+    What to hand the tokenizer, the same for the fast and Python ones: in
+    chunk mode max_windows evenly spaced slices within the character budget,
+    so windows still span the whole document; truncate mode only needs the head.
+    """
+    char_budget = get_char_budget(chunked, stride, max_windows)
+    pieces = max_windows if chunked else 1
+    return [pre_truncate_text(text, char_budget, pieces) for text in texts]
+
+
+def _aggregate(logits, counts, aggregation):
+    """Collapse per-window logits to per-document logits."""
+    per_document = []
+    for window_logits in torch.split(logits, counts):
+        if aggregation == 'max':
+            per_document.append(window_logits.max(dim=0).values)
+        else:
+            per_document.append(window_logits.mean(dim=0))
+    return torch.stack(per_document)
+
+
+# =========================================================
+# INFERENCE SERVER CLIENT
+# =========================================================
+# With CLASSIFIER_SERVER_URL set (e.g. "http://127.0.0.1:8765"), classification
+# is sent to `manage.py run_inference_server`, which holds the only copy of the
+# model. If the server can't be reached, it is skipped for
+# CLASSIFIER_SERVER_RETRY_SECONDS and the model is loaded in-process instead.
+
+_server_down_until = 0.0
+
+
+def _classify_remote(texts):
+    """Results from the inference server, or None to fall back to in-process inference."""
+    global _server_down_until
+    server_url = getattr(settings, 'CLASSIFIER_SERVER_URL', None)
+    if not server_url or time.monotonic() < _server_down_until:
+        return None
+
+    try:
+        response = requests.post(
+            f"{server_url.rstrip('/')}/classify",
+            json={'texts': texts},
+            timeout=getattr(settings, 'CLASSIFIER_SERVER_TIMEOUT', 300),
+        )
+        response.raise_for_status()
+        results = response.json()['results']
+        if len(results) != len(texts):
+            raise ValueError(f"expected {len(texts)} results, got {len(results)}")
+        return results
+    except Exception as e:
+        _server_down_until = time.monotonic() + getattr(settings, 'CLASSIFIER_SERVER_RETRY_SECONDS', 30)
+        print(f"Inference server unavailable ({e}). Classifying in-process.")
+        return None
+
+
+def classify_documents(texts, batch_size=None, components=None):
+    """
+    Classify many texts. Returns one result dict per text, in input order.
+
+    Goes through the inference server when CLASSIFIER_SERVER_URL is set,
+    otherwise (or if it's down) runs classify_documents_local().
+    """
+    texts = list(texts)
+    if not texts:
+        return []
+    if components is None:
+        results = _classify_remote(texts)
+        if results is not None:
+            return results
+    return classify_documents_local(texts, batch_size, components)
+
+
+def classify_documents_local(texts, batch_size=None, components=None):
+    """
+    Classify many texts with the model in this process.
+
+    Results are cached by normalized text and model fingerprint (see
+    classification_cache); duplicates within the call are classified once.
+    Passing components bypasses the cache.
+    """
+    texts = list(texts)
+    if not texts:
+        return []
+    if components is not None:
+        return _run_classifier(texts, batch_size, components)
+
+    components = get_model_components()
+    fingerprint = _model_fingerprint
+    hashes = [text_hash(text) for text in texts]
+    try:
+        results = get_cached_classifications(hashes, fingerprint)
+    except Exception as e:
+        print(f"Classification cache lookup failed: {e}")
+        results = {}
+
+    pending = {}
+    for h, text in zip(hashes, texts):
+        if h not in results:
+            pending.setdefault(h, text)
+
+    if pending:
+        fresh = dict(zip(pending, _run_classifier(list(pending.values()), batch_size, components)))
+        store_classifications(
+            {h: r for h, r in fresh.items() if r['primary_kra'] not in ("Unknown", "Error")}, fingerprint
+        )
+        results.update(fresh)
+
+    return [dict(results[h]) for h in hashes]
+
+
+def _run_classifier(texts, batch_size, components):
+    """
+    Runs the model (no cache).
+
+    Texts longer than one 512-token window are split into overlapping windows
+    (CLASSIFIER_LONG_DOCUMENT_MODE = 'chunk'). batch_size bounds the windows in
+    one forward pass: all windows are sorted by length and each pass is padded
+    only to its own longest window, so short documents don't pay for long ones.
+    A document's windows may span several passes; their logits are aggregated
+    (CLASSIFIER_AGGREGATION) once every pass has run.
+    """
+    batch_size = max(1, batch_size or getattr(settings, 'CLASSIFIER_BATCH_SIZE', DEFAULT_BATCH_SIZE))
+    chunked = getattr(settings, 'CLASSIFIER_LONG_DOCUMENT_MODE', DEFAULT_LONG_DOCUMENT_MODE) == 'chunk'
+    stride = getattr(settings, 'CLASSIFIER_WINDOW_STRIDE', DEFAULT_WINDOW_STRIDE)
+    max_windows = max(1, getattr(settings, 'CLASSIFIER_MAX_WINDOWS', DEFAULT_MAX_WINDOWS))
+    aggregation = getattr(settings, 'CLASSIFIER_AGGREGATION', DEFAULT_AGGREGATION)
+
+    MODEL, TOKENIZER, KRA_ENCODER, CRIT_ENCODER, SUB_ENCODER, DEVICE = components
     if not MODEL or not TOKENIZER or not KRA_ENCODER or not CRIT_ENCODER or not SUB_ENCODER:
         print("Model components not available.")
-        return {"primary_kra": "Unknown", "confidence": 0, "criterion": "N/A", "sub_criterion": "N/A"}
+        return [dict(UNKNOWN_RESULT) for _ in texts]
 
     try:
-        inputs = TOKENIZER(
-            text,
-            return_tensors="pt",
-            truncation=True,
-            padding=True,
-            max_length=512
-        )
-        input_ids = inputs["input_ids"].to(DEVICE)
-        attention_mask = inputs["attention_mask"].to(DEVICE)
+        token_ids = TOKENIZER(
+            texts_to_tokenize(texts, chunked, stride, max_windows), add_special_tokens=False, verbose=False
+        )["input_ids"]
+        windows = [_split_windows(TOKENIZER, ids, chunked, stride, max_windows) for ids in token_ids]
+    except Exception as e:
+        print(f"Error during document classification: {e}")
+        return [dict(ERROR_RESULT) for _ in texts]
 
-        with torch.no_grad():
-            kra_logits, crit_logits, sub_logits = MODEL(input_ids, attention_mask)
+    # (document index, window) for every window, shortest first
+    flat_windows = sorted(
+        ((i, window) for i, document_windows in enumerate(windows) for window in document_windows),
+        key=lambda item: len(item[1]),
+    )
 
-            kra_pred_idx = torch.argmax(kra_logits, dim=1).item()
-            crit_pred_idx = torch.argmax(crit_logits, dim=1).item()
-            sub_pred_idx = torch.argmax(sub_logits, dim=1).item()
+    # Per document: its windows' (kra, crit, sub) logit rows, in whatever pass they ran
+    window_logits = [[] for _ in texts]
+    failed = set()
+    for start in range(0, len(flat_windows), batch_size):
+        batch_items = flat_windows[start:start + batch_size]
+        try:
+            batch_windows = [window for _, window in batch_items]
+            batch = TOKENIZER.pad(
+                {
+                    "input_ids": batch_windows,
+                    "attention_mask": [[1] * len(w) for w in batch_windows],
+                },
+                padding="longest",
+                return_tensors="pt",
+            )
 
-            kra_probs = torch.softmax(kra_logits, dim=1)
-            crit_probs = torch.softmax(crit_logits, dim=1)
-            sub_probs = torch.softmax(sub_logits, dim=1)
+            with torch.inference_mode():
+                outputs = [o.cpu() for o in MODEL(batch["input_ids"].to(DEVICE), batch["attention_mask"].to(DEVICE))]
+            for j, (i, _) in enumerate(batch_items):
+                window_logits[i].append(tuple(o[j] for o in outputs))
 
-            kra_confidence = float(kra_probs[0][kra_pred_idx].item()) * 100
-            crit_confidence = float(crit_probs[0][crit_pred_idx].item()) * 100
-            sub_confidence = float(sub_probs[0][sub_pred_idx].item()) * 100
+        except Exception as e:
+            print(f"Error during document classification: {e}")
+            failed.update(i for i, _ in batch_items)
 
-        kra_label = KRA_ENCODER.inverse_transform([kra_pred_idx])[0]
-        crit_label = CRIT_ENCODER.inverse_transform([crit_pred_idx])[0]
-        sub_label = SUB_ENCODER.inverse_transform([sub_pred_idx])[0]
+    results = [dict(ERROR_RESULT) for _ in texts]
+    done = [i for i in range(len(texts)) if i not in failed]
+    if not done:
+        return results
 
-        return {
-            'primary_kra': kra_label,
-            'confidence': round(kra_confidence, 1),
-            'criterion': crit_label,
-            'sub_criterion': sub_label,
-            'explanation': f"Document classified as '{kra_label}' with {round(kra_confidence, 1)}% confidence."
-        }
+    try:
+        counts = [len(window_logits[i]) for i in done]
+        kra_logits, crit_logits, sub_logits = (
+            _aggregate(torch.stack([rows[head] for i in done for rows in window_logits[i]]), counts, aggregation)
+            for head in range(3)
+        )
+        kra_confidence, kra_pred = torch.softmax(kra_logits, dim=1).max(dim=1)
+        crit_pred = torch.argmax(crit_logits, dim=1)
+        sub_pred = torch.argmax(sub_logits, dim=1)
 
+        # Decode every document at once by indexing the encoders' class arrays
+        kra_labels = KRA_ENCODER.classes_[kra_pred.numpy()].tolist()
+        crit_labels = CRIT_ENCODER.classes_[crit_pred.numpy()].tolist()
+        sub_labels = SUB_ENCODER.classes_[sub_pred.numpy()].tolist()
+        confidences = (kra_confidence.numpy() * 100).tolist()
     except Exception as e:
         print(f"Error during document classification: {e}")
-        return {"primary_kra": "Error", "confidence": 0, "criterion": "N/A", "sub_criterion": "N/A"}
\ No newline at end of file
+        return results
+
+    for j, i in enumerate(done):
+        results[i] = _build_result(kra_labels[j], crit_labels[j], sub_labels[j], confidences[j])
+    return results
+
+
+def classify_document(text):
+    return classify_documents([text])[0]
@@ -0,0 +1,107 @@
+# api/services/ocr_backends.py
+"""
+OCR backends: turn a preprocessed PIL image into text.
+
+- 'tesserocr':   libtesseract through the C API. The engine (and its language
+                 data) is loaded once per thread and reused for every page.
+- 'pytesseract': runs the tesseract CLI once per image. Slower, but only needs
+                 the binary; used as the fallback when tesserocr is missing.
+
+Kept free of Django so backends can be built inside OCR worker processes.
+"""
+import logging
+import threading
+
+import pytesseract
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_OCR_BACKEND = 'tesserocr'
+FALLBACK_OCR_BACKEND = 'pytesseract'
+OCR_LANG = 'eng'
+
+
+class PytesseractBackend:
+    """Subprocess per image (tesseract CLI)."""
+    name = 'pytesseract'
+
+    def __init__(self, lang=OCR_LANG):
+        self.lang = lang
+
+    def image_to_string(self, img):
+        return pytesseract.image_to_string(img, lang=self.lang)
+
+    def close(self):
+        pass
+
+
+class TesserocrBackend:
+    """Persistent in-process engine. PyTessBaseAPI is not thread-safe, so one per thread."""
+    name = 'tesserocr'
+
+    def __init__(self, lang=OCR_LANG):
+        import tesserocr  # optional dependency
+        self.lang = lang
+        self._api = tesserocr.PyTessBaseAPI(lang=lang)
+
+    def image_to_string(self, img):
+        # Tesseract handles 8-bit grayscale directly; 1-bit images are widened once here
+        if img.mode not in ("L", "RGB"):
+            img = img.convert("L")
+        self._api.SetImage(img)
+        try:
+            return self._api.GetUTF8Text()
+        finally:
+            self._api.Clear()
+
+    def close(self):
+        self._api.End()
+
+
+OCR_BACKENDS = {
+    'tesserocr': TesserocrBackend,
+    'pytesseract': PytesseractBackend,
+}
+
+_local = threading.local()
+
+
+def get_ocr_backend(name=DEFAULT_OCR_BACKEND, lang=OCR_LANG):
+    """
+    This thread's backend instance for `name`, created on first use.
+    Falls back to pytesseract (once, with a warning) if the backend can't be loaded.
+    """
+    backends = getattr(_local, 'backends', None)
+    if backends is None:
+        backends = _local.backends = {}
+
+    key = (name, lang)
+    backend = backends.get(key)
+    if backend is None:
+        backend_class = OCR_BACKENDS.get(name)
+        if backend_class is None:
+            logger.warning(f"Unknown OCR backend '{name}'. Using {FALLBACK_OCR_BACKEND}.")
+            backend_class = OCR_BACKENDS[FALLBACK_OCR_BACKEND]
+        try:
+            backend = backend_class(lang=lang)
+        except Exception as e:
+            logger.warning(f"OCR backend '{name}' unavailable ({e}). Using {FALLBACK_OCR_BACKEND}.")
+            backend = OCR_BACKENDS[FALLBACK_OCR_BACKEND](lang=lang)
+        backends[key] = backend
+
+    return backend
+
+
+def warm_ocr_backend(name=DEFAULT_OCR_BACKEND, lang=OCR_LANG):
+    """Pool initializer: load the engine before the first page arrives."""
+    get_ocr_backend(name, lang)
+
+
+def close_ocr_backends():
+    """Release this thread's engines."""
+    for backend in getattr(_local, 'backends', {}).values():
+        try:
+            backend.close()
+        except Exception:
+            pass
+    _local.backends = {}
@@ -1,4 +1,7 @@
 import re
+from bisect import bisect_left
+
+from . import extraction_patterns as patterns
 
 def _generate_name_variants(first_name, last_name):
     variants = set()
@@ -34,6 +37,12 @@ def _find_section_blocks(text, section_headers=['adviser', 'panel', 'approved by
     current_section = 'intro'
     sections[current_section] = []
 
+    # One combined search rules out most lines; headers are only checked
+    # one by one (in priority order) on lines that contain at least one.
+    headers = tuple(section_headers)
+    any_header = patterns.any_literal_word(headers, re.IGNORECASE)
+    header_patterns = [(header, patterns.literal_word(header, re.IGNORECASE)) for header in headers]
+
     for line in lines:
         line_stripped = line.strip()
         if not line_stripped:
@@ -41,12 +50,13 @@ def _find_section_blocks(text, section_headers=['adviser', 'panel', 'approved by
             continue
 
         found_header = False
-        for header in section_headers:
-            if re.search(rf'\b{re.escape(header)}\b', line_stripped, re.IGNORECASE):
-                current_section = header
-                sections[current_section] = [line]
-                found_header = True
-                break
+        if any_header.search(line_stripped):
+            for header, header_pattern in header_patterns:
+                if header_pattern.search(line_stripped):
+                    current_section = header
+                    sections[current_section] = [line]
+                    found_header = True
+                    break
 
         if not found_header:
             sections[current_section].append(line)
@@ -55,15 +65,8 @@ def _find_section_blocks(text, section_headers=['adviser', 'panel', 'approved by
     return final_sections
 
 def _extract_academic_year(text):
-    ay_patterns = [
-        r"(?P<ay>(?:AY|A\.Y\.)\s*(?P<start>\d{4})\s*[-–—]\s*(?P<end>\d{4}))",
-        r"(?P<ay>(?P<start>\d{4})\s*[-–—]\s*(?P<end>\d{4}))",
-        r"\bAY\s*(?P<start>\d{4})\b",
-        r"\b(?P<ay>(?P<start>(?:2019|2020|2021|2022|2023|2024|2025))\b)",
-    ]
-
-    for pattern in ay_patterns:
-        match = re.search(pattern, text, re.IGNORECASE)
+    for pattern in patterns.ACADEMIC_YEAR_PATTERNS:
+        match = pattern.search(text)
         if match:
             start_year = match.group("start")
             end_year = match.group("end") if match.lastindex >= 3 else None
@@ -87,35 +90,83 @@ def _extract_academic_year(text):
     return None
 
 def _extract_project_level(text):
-    level_keywords = {
-        'SP': [r'\bspecial\s+project\b'],
-        'CP': [r'\bcapstone\s+project\b', r'\bcapstone\b', r'\bcp\b'],
-        'UT': [r'\bundergraduate\s+thesis\b', r'\bundergraduate\b', r'\but\b', r'\bbscs\b'],
-        'MT': [r'\bmaster[\'’]?\s*thesis\b', r'\bmaster[\'’]?\b', r'\bmt\b', r'\bmit\b'],
-        'DD': [r'\bdissertation\b', r'\bdd\b', r'\bdoctoral\b'],
-    }
-
     text_lower = text.lower()
-    for level, keywords in level_keywords.items():
-        for keyword_pattern in keywords:
-            if re.search(keyword_pattern, text_lower):
-                return level
+    for level, level_pattern in patterns.PROJECT_LEVELS:
+        if level_pattern.search(text_lower):
+            return level
 
     return None
 
+class NameRoleIndex:
+    """
+    Name and role-keyword positions in one text, for "is this name within
+    200 characters of a role keyword" checks.
+
+    Every variant is located in a single pass (one lookahead alternation)
+    and role keywords in another; windows are then checked with a bisect
+    over the role positions instead of re-searching each one. A window that
+    has a candidate is confirmed with the same word-boundary search on the
+    snippet as before, so results match _find_name_near_role exactly.
+    """
+
+    WINDOW = 200
+
+    def __init__(self, text, text_lower=None):
+        self.text = text
+        self.text_lower = text.lower() if text_lower is None else text_lower
+        self._name_positions = {}
+        self._role_positions = {}
+
+    def name_positions(self, variant_lower, variants_lower):
+        """Non-overlapping start positions of variant_lower (as re.finditer would give them)."""
+        key = tuple(variants_lower)
+        if key not in self._name_positions:
+            self._name_positions[key] = [
+                m.start() for m in patterns.any_literal_start(key).finditer(self.text_lower)
+            ]
+
+        positions = []
+        next_free = 0
+        for start in self._name_positions[key]:
+            if start >= next_free and self.text_lower.startswith(variant_lower, start):
+                positions.append(start)
+                next_free = start + max(len(variant_lower), 1)
+        return positions
+
+    def role_positions(self, role_keywords):
+        """Start positions of every occurrence of any keyword, boundaries not yet checked."""
+        key = tuple(role_keywords)
+        if key not in self._role_positions:
+            self._role_positions[key] = [
+                m.start() for m in patterns.any_literal_start(key).finditer(self.text_lower)
+            ]
+        return self._role_positions[key]
+
+    def find_name_near_role(self, faculty_name_variants, role_keywords):
+        """(variant, original-case snippet) for the first variant found near a role, else (None, None)."""
+        if not role_keywords:
+            return None, None
+
+        role_pattern = patterns.any_literal_word(tuple(role_keywords))
+        role_starts = self.role_positions(role_keywords)
+        shortest_role = min(len(k) for k in role_keywords)
+        variants_lower = [v.lower() for v in faculty_name_variants]
+        text_length = len(self.text_lower)
+
+        for variant, variant_lower in zip(faculty_name_variants, variants_lower):
+            for start in self.name_positions(variant_lower, variants_lower):
+                start_window = max(0, start - self.WINDOW)
+                end_window = min(text_length, start + len(variant_lower) + self.WINDOW)
+
+                first = bisect_left(role_starts, start_window)
+                if first == len(role_starts) or role_starts[first] > end_window - shortest_role:
+                    continue
+
+                if role_pattern.search(self.text_lower[start_window:end_window]):
+                    return variant, self.text[start_window:end_window]
+
+        return None, None
+
+
 def _find_name_near_role(text, faculty_name_variants, role_keywords):
-    text_lower = text.lower()
-    for variant in faculty_name_variants:
-        variant_lower = variant.lower()
-        name_matches = list(re.finditer(re.escape(variant_lower), text_lower))
-        for match in name_matches:
-            start_window = max(0, match.start() - 200)
-            end_window = min(len(text_lower), match.end() + 200)
-            context_snippet = text_lower[start_window:end_window]
-            original_context_snippet = text[start_window:end_window]
-
-            for role_keyword in role_keywords:
-                if re.search(rf'\b{re.escape(role_keyword)}\b', context_snippet):
-                    return variant, original_context_snippet
-
-    return None, None
\ No newline at end of file
+    return NameRoleIndex(text).find_name_near_role(faculty_name_variants, role_keywords)
@@ -0,0 +1,132 @@
+# api/services/parsed_document.py
+"""
+One extracted document (or a group of files joined for extraction), with
+the derived views the pipeline needs computed at most once: lowercased text,
+the typographic normalization used by KRA 1A, line and page offsets, and
+section blocks. Priority detection, the classifier and the extractors all
+take this object instead of re-deriving these from the raw string.
+"""
+from bisect import bisect_right
+from functools import cached_property
+
+from . import extraction_patterns as patterns
+from .opti import NameRoleIndex, _find_section_blocks
+
+# Curly quotes, en/em dashes and non-breaking spaces, as OCR and Word produce them
+TYPOGRAPHIC_TRANSLATION = str.maketrans({
+    "\u2019": "'",
+    "\u2018": "'",
+    "\u201c": '"',
+    "\u201d": '"',
+    "\u2013": "-",
+    "\u2014": "-",
+    "\u00A0": " ",
+})
+
+
+def file_separator(file_name):
+    """Header placed before each file's text when files are combined."""
+    return f"\n\n--- FILE: {file_name} ---\n"
+
+
+class ParsedDocument:
+    def __init__(self, text, file_name='', page_offsets=None, file_info=None):
+        self.text = text or ""
+        self.file_name = file_name
+        # Start offset of each page in self.text; a single page if unknown
+        self.page_offsets = list(page_offsets) if page_offsets else [0]
+        self.file_info = file_info
+        self._sections = {}
+        self._section_indexes = {}
+
+    @classmethod
+    def from_file_info(cls, file_info):
+        """Wrap a file info dict from the extraction pipeline."""
+        return cls(
+            file_info['text'],
+            file_name=file_info.get('file_name', ''),
+            page_offsets=file_info.get('page_offsets'),
+            file_info=file_info,
+        )
+
+    @classmethod
+    def combine(cls, documents):
+        """Join documents under a file_separator header each, keeping page offsets."""
+        parts = []
+        page_offsets = []
+        offset = 0
+        for document in documents:
+            separator = file_separator(document.file_name)
+            parts.append(separator)
+            offset += len(separator)
+            page_offsets.extend(offset + start for start in document.page_offsets)
+            parts.append(document.text)
+            offset += len(document.text)
+        return cls("".join(parts), file_name=", ".join(d.file_name for d in documents), page_offsets=page_offsets)
+
+    def __str__(self):
+        return self.text
+
+    def __len__(self):
+        return len(self.text)
+
+    @cached_property
+    def lower(self):
+        return self.text.lower()
+
+    @cached_property
+    def normalized(self):
+        """Typographic characters mapped to ASCII, runs of spaces/tabs collapsed, CR turned into LF."""
+        normalized = self.text.translate(TYPOGRAPHIC_TRANSLATION)
+        normalized = patterns.INLINE_WHITESPACE.sub(" ", normalized)
+        return patterns.CARRIAGE_RETURN.sub("\n", normalized)
+
+    @cached_property
+    def line_offsets(self):
+        """Start offset of each line in self.text."""
+        offsets = [0]
+        find = self.text.find
+        position = find("\n")
+        while position != -1:
+            offsets.append(position + 1)
+            position = find("\n", position + 1)
+        return offsets
+
+    def line_number(self, offset):
+        """1-based line containing offset."""
+        return bisect_right(self.line_offsets, offset)
+
+    def page_number(self, offset):
+        """1-based page containing offset."""
+        return max(1, bisect_right(self.page_offsets, offset))
+
+    def sections(self, section_headers):
+        """_find_section_blocks over this text, computed once per header list."""
+        key = tuple(section_headers)
+        if key not in self._sections:
+            self._sections[key] = _find_section_blocks(self.text, section_headers=list(key))
+        return self._sections[key]
+
+    @cached_property
+    def name_role_index(self):
+        return NameRoleIndex(self.text, text_lower=self.lower)
+
+    def name_role_index_for(self, text):
+        """
+        The index for this document if text is its full text, else one for that
+        section, kept with the document so the adviser and panel extractors
+        share it and it is freed along with the document.
+        """
+        if text is self.text:
+            return self.name_role_index
+        index = self._section_indexes.get(text)
+        if index is None:
+            index = self._section_indexes[text] = NameRoleIndex(text)
+        return index
+
+
+def as_parsed_document(document):
+    """Accept either a ParsedDocument or a plain string."""
+    if isinstance(document, ParsedDocument):
+        return document
+    return ParsedDocument(document)
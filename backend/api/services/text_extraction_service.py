@@ -0,0 +1,573 @@
+# api/services/text_extraction_service.py
+"""
+CPU-side text extraction (PDF text layer, OCR, DOCX, images).
+
+Kept free of Django and ML imports so these functions can run inside
+worker processes without loading settings or the classifier.
+
+Every extractor takes a `source`: the file contents as bytes (parsed in
+memory) or a path to a file on disk (large downloads spilled to a temp file).
+"""
+import io
+import logging
+import math
+import multiprocessing
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, TimeoutError as FutureTimeoutError, wait
+from concurrent.futures.process import BrokenProcessPool
+
+import numpy as np
+import fitz  # PyMuPDF
+from PIL import Image, ImageFilter, ImageOps
+
+from docx import Document
+
+from .ocr_backends import DEFAULT_OCR_BACKEND, get_ocr_backend, warm_ocr_backend
+
+logger = logging.getLogger(__name__)
+
+PDF_MIME_TYPE = 'application/pdf'
+DOCX_MIME_TYPE = 'application/vnd.openxmlformats-officedocument.wordprocessingml.document'
+
+SUPPORTED_MIME_TYPES = {
+    PDF_MIME_TYPE,
+    DOCX_MIME_TYPE,
+    'application/msword',
+    'image/jpeg',
+    'image/png',
+    'image/tiff',
+    'image/gif',
+    'image/bmp',
+}
+
+OCR_DPI = 200
+
+# Preprocessing ('numpy' works on the raw pixmap buffer, 'pil' is the original path)
+OCR_PREPROCESSING = 'numpy'
+OCR_THRESHOLD = 160
+ADAPTIVE_BLOCK_SIZE = 31
+ADAPTIVE_OFFSET = 10
+
+# A page's text layer is trusted only if it has enough characters and
+# looks like real text (broken font encodings yield replacement/private-use
+# glyphs or mostly punctuation).
+MIN_TEXT_LAYER_CHARS = 25
+MAX_GARBAGE_RATIO = 0.1
+MIN_ALNUM_RATIO = 0.6
+
+
+def _is_in_memory(source):
+    return isinstance(source, (bytes, bytearray, memoryview))
+
+
+def _open_pdf(source):
+    if _is_in_memory(source):
+        return fitz.open(stream=source, filetype="pdf")
+    return fitz.open(source)
+
+
+def _as_file(source):
+    """File-like object for bytes, or the path itself (python-docx and PIL accept both)."""
+    return io.BytesIO(source) if _is_in_memory(source) else source
+
+
+def extract_text_from_file(source, mime_type, ocr_engine=None):
+    """
+    Extract text based on file type.
+    Returns dict: {'text': str, 'page_count': int, 'extraction_method': str,
+                   'page_methods': [per-page 'text_layer'/'ocr'], 'ocr_pages': [per-page OCR stats]}
+    """
+    ocr_engine = ocr_engine or PageOCREngine()
+    result = {'text': "", 'page_count': 0, 'extraction_method': "unsupported", 'page_methods': [], 'ocr_pages': []}
+    try:
+        if mime_type == PDF_MIME_TYPE:
+            result.update(extract_text_from_pdf_with_ocr(source, ocr_engine))
+        elif mime_type == DOCX_MIME_TYPE:
+            result.update(text=extract_text_from_word(source), page_count=0, extraction_method="docx")
+        elif mime_type.startswith('image/'):
+            text, page_stats = ocr_engine.ocr_image(source)
+            result.update(text=text, page_count=1, extraction_method="ocr", page_methods=["ocr"], ocr_pages=page_stats)
+    except Exception as extract_error:
+        print(f"Error during text extraction: {extract_error}")
+        result.update(text="", page_count=0, extraction_method="failed", page_methods=[], ocr_pages=[])
+
+    return result
+
+
+def preprocess_for_ocr(img: Image.Image) -> Image.Image:
+    """Preprocess image for better OCR results."""
+    try:
+        gray = img.convert("L")
+        gray = ImageOps.autocontrast(gray)
+        gray = gray.filter(ImageFilter.MedianFilter(size=3))
+        threshold = gray.point(lambda x: 0 if x < 160 else 255, "1")
+        return threshold
+    except Exception as e:
+        print(f"Preprocessing error: {e}, using original image")
+        return img
+
+
+def pixmap_to_gray_array(pix):
+    """2-D uint8 view over a grayscale fitz.Pixmap's samples (no PNG encode/decode). Valid only while pix is alive."""
+    buffer = pix.samples_mv if hasattr(pix, 'samples_mv') else pix.samples
+    return np.frombuffer(buffer, dtype=np.uint8).reshape(pix.height, pix.stride)[:, :pix.width]
+
+
+def render_page_gray(page, dpi=OCR_DPI):
+    """Render a PDF page straight to an 8-bit grayscale array (copied out of the pixmap, which is freed on return)."""
+    pix = page.get_pixmap(dpi=dpi, colorspace=fitz.csGRAY, alpha=False)
+    return pixmap_to_gray_array(pix).copy()
+
+
+def _median3x3(gray):
+    """
+    3x3 median with edge replication (same as PIL's MedianFilter(3)), written
+    back into `gray`. Each column triple is sorted once; the median is then
+    med3(max of the lows, med3 of the middles, min of the highs) over each
+    row triple, all uint8 min/max into a few scratch buffers.
+    """
+    padded = np.pad(gray, 1, mode='edge')
+    top, center, bottom = padded[:-2], padded[1:-1], padded[2:]
+
+    # Vertical sort: lo <= mid <= hi at every (row, padded column)
+    lo = np.minimum(top, center)
+    hi = np.maximum(top, center)
+    mid = np.minimum(hi, bottom)
+    np.maximum(mid, lo, out=mid)
+    np.minimum(lo, bottom, out=lo)
+    np.maximum(hi, bottom, out=hi)
+
+    # Horizontal: max of lows, min of highs, median of middles
+    left, right = slice(None, -2), slice(2, None)
+    lows = np.maximum(lo[:, left], lo[:, 1:-1])
+    np.maximum(lows, lo[:, right], out=lows)
+    highs = np.minimum(hi[:, left], hi[:, 1:-1])
+    np.minimum(highs, hi[:, right], out=highs)
+
+    middles = np.minimum(mid[:, left], mid[:, 1:-1], out=hi[:, left])
+    scratch = np.maximum(mid[:, left], mid[:, 1:-1], out=lo[:, left])
+    np.minimum(scratch, mid[:, right], out=scratch)
+    np.maximum(middles, scratch, out=middles)
+
+    # med3(lows, middles, highs) into gray
+    np.maximum(lows, middles, out=gray)
+    np.minimum(gray, highs, out=gray)
+    np.minimum(lows, middles, out=lows)
+    np.maximum(gray, lows, out=gray)
+    return gray
+
+
+def _local_mean(gray, block_size):
+    """Mean over a block_size x block_size window, via an integral image."""
+    r = block_size // 2
+    padded = np.pad(gray, r, mode='edge')
+    integral = np.zeros((padded.shape[0] + 1, padded.shape[1] + 1), dtype=np.int64)
+    np.cumsum(padded, axis=0, dtype=np.int64, out=integral[1:, 1:])
+    np.cumsum(integral[1:, 1:], axis=1, out=integral[1:, 1:])
+    k = block_size
+    window_sum = integral[k:, k:] - integral[:-k, k:] - integral[k:, :-k] + integral[:-k, :-k]
+    return window_sum / float(k * k)
+
+
+def preprocess_array_for_ocr(gray, adaptive=False, threshold=OCR_THRESHOLD,
+                             block_size=ADAPTIVE_BLOCK_SIZE, offset=ADAPTIVE_OFFSET):
+    """
+    NumPy version of preprocess_for_ocr on a 2-D uint8 grayscale array:
+    autocontrast -> 3x3 median -> threshold (global, or adaptive local-mean).
+    Returns a uint8 array of 0/255.
+    """
+    # Autocontrast through a 256-entry LUT into the working copy (the input is
+    # never modified). The median filter writes back into it using a few
+    # uint8 scratch buffers, and the threshold overwrites it in place.
+    lo, hi = int(gray.min()), int(gray.max())
+    if hi > lo:
+        lut = np.clip((np.arange(256, dtype=np.float32) - lo) * (255.0 / (hi - lo)), 0, 255).astype(np.uint8)
+        gray = lut[gray]
+    else:
+        gray = gray.copy()
+
+    _median3x3(gray)
+
+    if adaptive:
+        mask = gray < (_local_mean(gray, block_size) - offset)
+    else:
+        mask = np.less(gray, threshold)
+
+    gray.fill(255)
+    gray[mask] = 0
+    return gray
+
+
+def _ocr_ready_image(gray, adaptive=False):
+    try:
+        return Image.fromarray(preprocess_array_for_ocr(gray, adaptive=adaptive))
+    except Exception as e:
+        print(f"Preprocessing error: {e}, using original image")
+        return Image.fromarray(gray)
+
+
+def has_usable_text_layer(page_text):
+    """True if a page's embedded text is long enough and not font garbage."""
+    chars = [c for c in page_text if not c.isspace()]
+    if len(chars) < MIN_TEXT_LAYER_CHARS:
+        return False
+
+    garbage = sum(1 for c in chars if c == '\ufffd' or '\ue000' <= c <= '\uf8ff' or ord(c) < 32)
+    if garbage / len(chars) > MAX_GARBAGE_RATIO:
+        return False
+
+    alnum = sum(1 for c in chars if c.isalnum())
+    return alnum / len(chars) >= MIN_ALNUM_RATIO
+
+
+def extract_text_from_pdf_with_ocr(source, ocr_engine=None):
+    """
+    Extract text from PDF, deciding per page: pages with a usable text layer
+    use page.get_text(), the rest are OCR'd.
+    Returns dict: {'text', 'page_count', 'extraction_method' ('text_layer', 'ocr' or 'hybrid'),
+                   'page_methods', 'ocr_pages', 'page_offsets' (start of each page in 'text')}
+    """
+    try:
+        doc = _open_pdf(source)
+        page_texts = [page.get_text() for page in doc]
+        page_count = doc.page_count
+        doc.close()
+
+        ocr_needed = [n for n, page_text in enumerate(page_texts) if not has_usable_text_layer(page_text)]
+        page_methods = ["text_layer"] * page_count
+        page_stats = []
+
+        if ocr_needed:
+            print(f"OCR needed for {len(ocr_needed)}/{page_count} page(s).")
+            ocr_texts, page_stats = (ocr_engine or PageOCREngine()).ocr_pages(source, ocr_needed)
+            # Pages whose OCR failed or ran out of budget keep their (weak) text layer
+            for n, ocr_text in ocr_texts.items():
+                page_methods[n] = "ocr"
+                page_texts[n] = ocr_text + "\n"
+
+        # From what each page actually used, so a document whose OCR failed
+        # isn't reported as OCR'd
+        ocr_count = page_methods.count("ocr")
+        if ocr_count == 0:
+            method = "text_layer"
+        elif ocr_count == page_count:
+            method = "ocr"
+        else:
+            method = "hybrid"
+
+        page_offsets = []
+        offset = 0
+        for page_text in page_texts:
+            page_offsets.append(offset)
+            offset += len(page_text)
+
+        return {
+            'text': "".join(page_texts),
+            'page_count': page_count,
+            'extraction_method': method,
+            'page_methods': page_methods,
+            'ocr_pages': page_stats,
+            'page_offsets': page_offsets,
+        }
+
+    except Exception as e:
+        print(f"PDF extraction error: {e}")
+        import traceback
+        traceback.print_exc()
+        return {'text': "", 'page_count': 0, 'extraction_method': "failed", 'page_methods': [], 'ocr_pages': []}
+
+
+def extract_text_with_ocr(source, ocr_engine=None):
+    """Extract text from PDF using OCR. Returns string."""
+    try:
+        doc = _open_pdf(source)
+        page_count = doc.page_count
+        doc.close()
+        text, _ = (ocr_engine or PageOCREngine()).ocr_pdf(source, range(page_count))
+        return text
+    except Exception as e:
+        print(f"OCR error: {e}")
+        import traceback
+        traceback.print_exc()
+        return ""
+
+
+def extract_text_from_word(source):
+    """Extract text from Word document. Returns string."""
+    try:
+        doc = Document(_as_file(source))
+        return "\n".join([p.text for p in doc.paragraphs])
+    except Exception as e:
+        print(f"Error reading .docx file: {e}")
+        import traceback
+        traceback.print_exc()
+        return ""
+
+
+def extract_text_from_image(source, preprocessing=OCR_PREPROCESSING, adaptive=False, backend=DEFAULT_OCR_BACKEND):
+    """Extract text from image file using OCR. Returns string."""
+    try:
+        img = Image.open(_as_file(source))
+
+        # Preprocess for better OCR
+        if preprocessing == 'numpy':
+            processed = _ocr_ready_image(np.asarray(img.convert("L")), adaptive)
+        else:
+            processed = preprocess_for_ocr(img)
+        text = get_ocr_backend(backend).image_to_string(processed)
+
+        return text
+
+    except Exception as e:
+        print(f"Error processing image file: {e}")
+        import traceback
+        traceback.print_exc()
+        return ""
+
+
+# =========================================================
+# PAGE-SHARDED OCR ENGINE
+# =========================================================
+
+_ocr_pools = {}
+_ocr_pool_lock = threading.Lock()
+_daemon_warning_logged = False
+
+
+def can_start_ocr_pool():
+    """
+    False in a daemonic process (e.g. a Celery prefork child), which is not
+    allowed to have children. Logs a warning the first time.
+    """
+    global _daemon_warning_logged
+    if not multiprocessing.current_process().daemon:
+        return True
+    if not _daemon_warning_logged:
+        _daemon_warning_logged = True
+        logger.warning(
+            "Running in a daemonic process, which cannot start the OCR process pool: "
+            "scanned pages are OCR'd sequentially in this process. Run the Celery worker "
+            "with a non-prefork pool (--pool threads) to OCR pages in parallel."
+        )
+    return False
+
+
+def get_ocr_pool(workers, backend=DEFAULT_OCR_BACKEND):
+    """
+    Process pool for the given size and OCR backend, shared by all OCR in
+    this process and created on first use. Each worker loads its OCR backend
+    once at start-up. None if this process cannot have children.
+    """
+    if not can_start_ocr_pool():
+        return None
+    key = (workers, backend)
+    with _ocr_pool_lock:
+        pool = _ocr_pools.get(key)
+        if pool is None:
+            pool = ProcessPoolExecutor(
+                max_workers=workers, initializer=warm_ocr_backend, initargs=(backend,)
+            )
+            _ocr_pools[key] = pool
+        return pool
+
+
+def reset_ocr_pool(pool=None):
+    """Drop a broken/unusable pool (all pools if none is given); the next get_ocr_pool() builds a fresh one."""
+    with _ocr_pool_lock:
+        for key, existing in list(_ocr_pools.items()):
+            if pool is None or existing is pool:
+                existing.shutdown(wait=False, cancel_futures=True)
+                del _ocr_pools[key]
+
+
+def _ocr_pdf_pages(source, page_numbers, dpi=OCR_DPI, preprocessing=OCR_PREPROCESSING, adaptive=False,
+                   backend=DEFAULT_OCR_BACKEND, deadline=None):
+    """
+    Pool task: OCR the given PDF pages. Returns [(page_number, text, seconds), ...].
+    Stops before the next page once time.time() passes deadline, so a shard
+    that outlives the document's budget frees its worker.
+    """
+    results = []
+    ocr = get_ocr_backend(backend)
+    doc = _open_pdf(source)
+    try:
+        for page_number in page_numbers:
+            if deadline and time.time() > deadline:
+                break
+            started = time.perf_counter()
+
+            # Preprocess for better OCR
+            if preprocessing == 'numpy':
+                processed = _ocr_ready_image(render_page_gray(doc[page_number], dpi), adaptive)
+            else:
+                pix = doc[page_number].get_pixmap(dpi=dpi)
+                img = Image.open(io.BytesIO(pix.tobytes("png")))
+                processed = preprocess_for_ocr(img)
+            page_text = ocr.image_to_string(processed)
+            results.append((page_number, page_text, time.perf_counter() - started))
+    finally:
+        doc.close()
+    return results
+
+
+def _ocr_image(source, preprocessing=OCR_PREPROCESSING, adaptive=False, backend=DEFAULT_OCR_BACKEND):
+    """Pool task: OCR an image file. Returns (text, seconds)."""
+    started = time.perf_counter()
+    text = extract_text_from_image(source, preprocessing, adaptive, backend)
+    return text, time.perf_counter() - started
+
+
+class PageOCREngine:
+    """
+    Spreads the pages of a scanned PDF over the OCR process pool and
+    reassembles the text in page order.
+
+    workers            -- pool size; 1 runs OCR in the calling process
+    max_pages          -- per-document page budget; later pages are skipped
+    time_budget        -- per-document seconds; pages not done by then are dropped
+                          (a page already being OCR'd is finished, then its shard stops)
+    preprocessing      -- 'numpy' (default) or 'pil'
+    adaptive_threshold -- local-mean instead of global thresholding (numpy only)
+    ocr_backend        -- key in ocr_backends.OCR_BACKENDS
+    """
+
+    def __init__(self, workers=1, max_pages=None, time_budget=None, dpi=OCR_DPI,
+                 preprocessing=OCR_PREPROCESSING, adaptive_threshold=False, ocr_backend=DEFAULT_OCR_BACKEND):
+        self.workers = max(1, workers or 1)
+        self.max_pages = max_pages
+        self.time_budget = time_budget
+        self.dpi = dpi
+        self.preprocessing = preprocessing
+        self.adaptive_threshold = adaptive_threshold
+        self.ocr_backend = ocr_backend
+
+    def _page_options(self):
+        return self.dpi, self.preprocessing, self.adaptive_threshold, self.ocr_backend
+
+    def _image_options(self):
+        return self.preprocessing, self.adaptive_threshold, self.ocr_backend
+
+    def _pool(self):
+        if self.workers <= 1:
+            return None
+        return get_ocr_pool(self.workers, self.ocr_backend)
+
+    def _submit(self, pool, fn, *args, **kwargs):
+        """Submit to the pool, or return None if it can't take work (caller runs in-process)."""
+        try:
+            return pool.submit(fn, *args, **kwargs)
+        except Exception as e:
+            # e.g. BrokenProcessPool
+            print(f"OCR process pool unavailable ({e}). Running OCR in-process.")
+            reset_ocr_pool(pool)
+            return None
+
+    def ocr_pdf(self, source, page_numbers):
+        """OCR the given pages. Returns (text, page_stats) with page texts joined in page order."""
+        pages = list(page_numbers)
+        page_texts, page_stats = self.ocr_pages(source, pages)
+        text = "".join(page_texts[n] + "\n" for n in pages if n in page_texts)
+        return text, page_stats
+
+    def ocr_pages(self, source, page_numbers):
+        """
+        OCR the given pages. Returns ({page_number: text}, page_stats) where page_stats is a list of
+        {'page': 1-based number, 'status': 'ok'|'skipped'|'timeout'|'failed', 'seconds': float}.
+        """
+        started = time.perf_counter()
+        # Wall-clock time, so pool workers can check it too
+        deadline = time.time() + self.time_budget if self.time_budget else None
+
+        pages = list(page_numbers)
+        skipped = []
+        if self.max_pages is not None and len(pages) > self.max_pages:
+            pages, skipped = pages[:self.max_pages], pages[self.max_pages:]
+            print(f"OCR page budget reached: skipping {len(skipped)} page(s).")
+
+        done_pages = None
+        pool = self._pool() if len(pages) > 1 else None
+        if pool is not None:
+            done_pages = self._run_sharded(pool, source, pages, deadline)
+        if done_pages is None:
+            done_pages = self._run_inline(source, pages, deadline)
+
+        page_texts = {n: done[0] for n, done in done_pages.items() if done[0] is not None}
+
+        page_stats = []
+        for n in pages:
+            _, status, seconds = done_pages.get(n, (None, "timeout", None))
+            page_stats.append({'page': n + 1, 'status': status, 'seconds': round(seconds, 3) if seconds else None})
+        page_stats.extend({'page': n + 1, 'status': "skipped", 'seconds': None} for n in skipped)
+
+        ok_count = sum(1 for p in page_stats if p['status'] == "ok")
+        print(f"OCR finished {ok_count}/{len(page_stats)} page(s) in {time.perf_counter() - started:.1f}s")
+        return page_texts, page_stats
+
+    def _run_inline(self, source, pages, deadline):
+        done_pages = {}
+        for n in pages:
+            if deadline and time.time() > deadline:
+                print("OCR time budget exhausted.")
+                break
+            try:
+                for page_number, page_text, seconds in _ocr_pdf_pages(source, [n], *self._page_options()):
+                    done_pages[page_number] = (page_text, "ok", seconds)
+            except Exception as e:
+                print(f"OCR error on page {n + 1}: {e}")
+                done_pages[n] = (None, "failed", None)
+        return done_pages
+
+    def _run_sharded(self, pool, source, pages, deadline):
+        """Returns {page: (text, status, seconds)}, or None if the pool could not take work."""
+        # Two shards per worker balances load without pickling the PDF once per page
+        shard_size = max(1, math.ceil(len(pages) / (self.workers * 2)))
+        futures = {}
+        for i in range(0, len(pages), shard_size):
+            shard = pages[i:i + shard_size]
+            future = self._submit(pool, _ocr_pdf_pages, source, shard, *self._page_options(), deadline=deadline)
+            if future is None:
+                for f in futures:
+                    f.cancel()
+                return None
+            futures[future] = shard
+
+        timeout = max(0, deadline - time.time()) if deadline else None
+        finished, unfinished = wait(futures, timeout=timeout)
+        if unfinished:
+            print(f"OCR time budget exhausted with {len(unfinished)} shard(s) unfinished.")
+            for future in unfinished:
+                future.cancel()
+
+        done_pages = {}
+        for future in finished:
+            try:
+                for page_number, page_text, seconds in future.result():
+                    done_pages[page_number] = (page_text, "ok", seconds)
+            except Exception as e:
+                print(f"OCR shard failed: {e}")
+                if isinstance(e, BrokenProcessPool):
+                    reset_ocr_pool(pool)
+                for n in futures[future]:
+                    done_pages[n] = (None, "failed", None)
+        return done_pages
+
+    def ocr_image(self, source):
+        """OCR a single image file. Returns (text, page_stats)."""
+        pool = self._pool()
+        future = self._submit(pool, _ocr_image, source, *self._image_options()) if pool is not None else None
+        try:
+            if future is not None:
+                text, seconds = future.result(timeout=self.time_budget)
+            else:
+                text, seconds = _ocr_image(source, *self._image_options())
+            return text, [{'page': 1, 'status': "ok", 'seconds': round(seconds, 3)}]
+        except FutureTimeoutError:
+            future.cancel()
+            print("OCR time budget exhausted for image.")
+            return "", [{'page': 1, 'status': "timeout", 'seconds': None}]
+        except Exception as e:
+            print(f"Image OCR failed: {e}")
+            if isinstance(e, BrokenProcessPool):
+                reset_ocr_pool(pool)
+            return "", [{'page': 1, 'status': "failed", 'seconds': None}]
@@ -0,0 +1,99 @@
+# api/tasks.py
+import logging
+
+from celery import shared_task
+from celery.signals import worker_init, worker_process_init
+from django.conf import settings
+
+from .models import DocumentUpload
+
+logger = logging.getLogger(__name__)
+
+
+def _warm_up_enabled():
+    # With CLASSIFIER_SERVER_URL the inference server holds the model; it's
+    # only loaded here as a fallback.
+    return getattr(settings, 'CLASSIFIER_WARM_UP', True) and not getattr(settings, 'CLASSIFIER_SERVER_URL', None)
+
+
+def _warm_up():
+    from .services.ml_processing_service import warm_up_model
+    if not warm_up_model():
+        logger.warning("Classifier warm-up failed; uploads will be classified as 'Unknown'.")
+
+
+def _is_prefork(worker):
+    pool = getattr(worker, 'pool_cls', None)
+    name = pool if isinstance(pool, str) else getattr(pool, '__module__', '')
+    return name in ('prefork', 'processes') or name.endswith('.prefork')
+
+
+@worker_init.connect
+def warm_up_classifier(sender=None, **kwargs):
+    """
+    Load the classifier in the worker's main process at start-up, before the
+    pool starts. Prefork children are forked afterwards and share the weights
+    copy-on-write, so they report alive at once and hold no copy of their own.
+    """
+    if not _warm_up_enabled():
+        return
+    if _is_prefork(sender):
+        from .services.ml_processing_service import model_survives_fork
+        if not model_survives_fork():
+            # Each child loads its own (warm_up_classifier_in_child)
+            return
+    _warm_up()
+
+
+@worker_process_init.connect
+def warm_up_classifier_in_child(**kwargs):
+    """
+    Prefork child: loads the classifier only if it wasn't inherited from the
+    parent (ONNX or CUDA backends). That load must finish within
+    worker_proc_alive_timeout, see DocEvalKapiyu/celery.py.
+    """
+    if not _warm_up_enabled():
+        return
+    from .services.ml_processing_service import get_model_status
+    if not get_model_status()['loaded']:
+        _warm_up()
+
+
+@shared_task(acks_late=True, ignore_result=True)
+def process_document_upload_task(upload_id):
+    """
+    Worker entry point for a queued upload.
+    Moves the upload to 'processing' and runs the full extraction pipeline,
+    which leaves it 'completed' or 'failed'.
+    """
+    # Claim the upload. Completed uploads are skipped so a redelivered
+    # message (acks_late) does not re-run the pipeline.
+    claimed = (
+        DocumentUpload.objects
+        .filter(pk=upload_id)
+        .exclude(status='completed')
+        .update(status='processing')
+    )
+    if not claimed:
+        logger.info(f"Upload {upload_id} missing or already completed. Skipping.")
+        return False
+
+    upload = DocumentUpload.objects.select_related('user').get(pk=upload_id)
+
+    # Imported here so the web process does not load the ML/OCR stack
+    # just to enqueue a job.
+    from .services.document_processing_service import process_document_upload
+    return process_document_upload(upload)
+
+
+def enqueue_document_upload(upload):
+    """Queue an upload for background processing. Marks it failed if the broker is unreachable."""
+    try:
+        process_document_upload_task.delay(upload.id)
+        return True
+    except Exception as e:
+        logger.error(f"Could not queue upload {upload.id}: {e}")
+        upload.status = 'failed'
+        upload.error_message = "Could not queue upload for processing. Please try again."
+        upload.save(update_fields=['status', 'error_message'])
+        return False
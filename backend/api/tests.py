@@ -1,3 +1,1386 @@
-from django.test import TestCase
+import gc
+import importlib.util
+import os
+import re
+import shutil
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future
+from datetime import timedelta
+from unittest import mock, skipUnless
 
-# Create your tests here.
+import fitz
+import numpy as np
+import torch
+from PIL import Image, ImageFilter
+from sklearn.feature_extraction.text import TfidfVectorizer
+from sklearn.linear_model import LogisticRegression
+from sklearn.pipeline import Pipeline
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.utils import timezone
+from rest_framework.test import APIRequestFactory, force_authenticate
+from transformers import BertConfig, BertModel, BertTokenizer, BertTokenizerFast
+
+from . import tasks
+from .models import DocumentUpload, ExtractedTextCache, LLMResponseCache, User
+from .services import (
+    classification_cache,
+    extraction_cache,
+    extraction_strategies,
+    first_stage_classifier,
+    inference_server,
+    llm_response_cache,
+    ocr_backends,
+    text_extraction_service,
+)
+from .services.llm_rate_limiter import (
+    RateLimitTimeout,
+    SQLiteBucketStore,
+    TokenBucketLimiter,
+    retry_after_seconds,
+)
+from .services.opti import NameRoleIndex, _find_name_near_role, _generate_name_variants
+from .services.parsed_document import ParsedDocument
+from .services import ml_processing_service as ml
+
+TEST_WORDS = ['evaluation', 'faculty', 'research', 'journal', 'extension', 'panel', 'adviser', 'thesis']
+
+
+def _write_vocab(directory):
+    path = os.path.join(directory, 'vocab.txt')
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write('\n'.join(['[PAD]', '[UNK]', '[CLS]', '[SEP]', '[MASK]'] + TEST_WORDS))
+    return path
+
+
+class _Encoder:
+    def __init__(self, count):
+        self.classes_ = np.array([f"label {i}" for i in range(count)])
+
+
+class _SumModel:
+    """Logits from each window's token ids, independent of padding. Records the rows per call."""
+
+    def __init__(self):
+        self.batch_rows = []
+
+    def __call__(self, input_ids, attention_mask):
+        self.batch_rows.append(input_ids.shape[0])
+        ids = (input_ids * attention_mask).float()
+        features = torch.stack([ids.sum(dim=1), (ids % 7).sum(dim=1), attention_mask.sum(dim=1).float()], dim=1)
+        return features[:, :3] / 100, features[:, 1:] / 100, features / 100
+
+
+# =========================================================
+# UPLOAD QUEUE
+# =========================================================
+
+class UploadQueueTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('faculty', password='x', first_name='Juan', last_name='Dela Cruz')
+
+    def _upload(self, **fields):
+        return DocumentUpload.objects.create(
+            user=self.user, google_drive_link='https://drive.google.com/drive/folders/abc', **fields
+        )
+
+    def test_worker_moves_upload_through_processing_to_completed(self):
+        upload = self._upload()
+        seen = []
+
+        def pipeline(upload):
+            seen.append(DocumentUpload.objects.get(pk=upload.pk).status)
+            upload.status = 'completed'
+            upload.save()
+            return True
+
+        with mock.patch('api.services.document_processing_service.process_document_upload', pipeline):
+            # apply() runs the task in-process, as CELERY_TASK_ALWAYS_EAGER would
+            self.assertTrue(tasks.process_document_upload_task.apply(args=(upload.id,)).get())
+        self.assertEqual(seen, ['processing'])
+        upload.refresh_from_db()
+        self.assertEqual(upload.status, 'completed')
+
+    def test_pipeline_failure_marks_upload_failed(self):
+        upload = self._upload()
+        with mock.patch('api.services.document_processing_service.extract_text_from_drive', return_value=[]):
+            self.assertFalse(tasks.process_document_upload_task(upload.id))
+        upload.refresh_from_db()
+        self.assertEqual(upload.status, 'failed')
+        self.assertEqual(upload.error_message, "No valid files found")
+
+    def test_redelivered_message_for_a_completed_upload_is_skipped(self):
+        upload = self._upload(status='completed')
+        with mock.patch('api.services.document_processing_service.process_document_upload') as pipeline:
+            self.assertFalse(tasks.process_document_upload_task(upload.id))
+            self.assertFalse(tasks.process_document_upload_task(upload.id + 1000))
+        pipeline.assert_not_called()
+        upload.refresh_from_db()
+        self.assertEqual(upload.status, 'completed')
+
+    def test_redelivered_message_for_an_unfinished_upload_runs_again(self):
+        upload = self._upload(status='processing')
+        with mock.patch('api.services.document_processing_service.process_document_upload',
+                        return_value=True) as pipeline:
+            tasks.process_document_upload_task(upload.id)
+        pipeline.assert_called_once()
+
+    def test_broker_failure_marks_upload_failed(self):
+        upload = self._upload()
+        with mock.patch.object(tasks.process_document_upload_task, 'delay', side_effect=ConnectionError("refused")):
+            with self.assertLogs(tasks.logger, 'ERROR'):
+                self.assertFalse(tasks.enqueue_document_upload(upload))
+        upload.refresh_from_db()
+        self.assertEqual(upload.status, 'failed')
+        self.assertTrue(upload.error_message)
+
+    def test_view_responds_before_the_upload_is_queued_or_processed(self):
+        from .views import DocumentUploadView
+
+        request = APIRequestFactory().post(
+            '/api/uploads/', {'google_drive_link': 'https://drive.google.com/drive/folders/abc'}, format='json'
+        )
+        force_authenticate(request, user=self.user)
+        with mock.patch.object(tasks.process_document_upload_task, 'delay') as delay:
+            with self.captureOnCommitCallbacks() as callbacks:
+                response = DocumentUploadView.as_view()(request)
+                self.assertEqual(response.status_code, 201)
+                self.assertEqual(response.data['status'], 'pending')
+                delay.assert_not_called()
+            self.assertEqual(len(callbacks), 1)
+            callbacks[0]()
+        delay.assert_called_once_with(response.data['id'])
+        self.assertEqual(DocumentUpload.objects.get(pk=response.data['id']).status, 'pending')
+
+
+class WorkerWarmUpTests(SimpleTestCase):
+    def _start_worker(self, pool, survives_fork=True):
+        """Fires worker_init, then worker_process_init for one child. Returns the warm_up_model mock."""
+        worker = mock.Mock(pool_cls=pool)
+        with mock.patch.object(ml, 'warm_up_model', return_value=True) as warm_up, \
+                mock.patch.object(ml, 'model_survives_fork', return_value=survives_fork), \
+                mock.patch.object(ml, 'get_model_status', side_effect=lambda: {'loaded': warm_up.called}):
+            tasks.warm_up_classifier(sender=worker)
+            if pool == 'prefork':
+                tasks.warm_up_classifier_in_child()
+        return warm_up
+
+    def test_prefork_children_inherit_the_model_loaded_in_the_parent(self):
+        self.assertEqual(self._start_worker('prefork').call_count, 1)
+
+    def test_prefork_children_load_models_that_do_not_survive_fork(self):
+        warm_up = mock.Mock(return_value=True)
+        with mock.patch.object(ml, 'warm_up_model', warm_up), \
+                mock.patch.object(ml, 'model_survives_fork', return_value=False), \
+                mock.patch.object(ml, 'get_model_status', return_value={'loaded': False}):
+            tasks.warm_up_classifier(sender=mock.Mock(pool_cls='prefork'))
+            warm_up.assert_not_called()
+            tasks.warm_up_classifier_in_child()
+        warm_up.assert_called_once_with()
+
+    def test_thread_pool_loads_in_the_worker_process(self):
+        self.assertEqual(self._start_worker('threads', survives_fork=False).call_count, 1)
+
+    @override_settings(CLASSIFIER_SERVER_URL='http://localhost:8765')
+    def test_no_warm_up_when_an_inference_server_holds_the_model(self):
+        self.assertEqual(self._start_worker('prefork').call_count, 0)
+
+    def test_children_get_time_to_load_their_own_model(self):
+        from DocEvalKapiyu.celery import app
+
+        self.assertGreaterEqual(app.conf.worker_proc_alive_timeout, 60)
+
+
+# =========================================================
+# DRIVE DOWNLOADS
+# =========================================================
+
+class DownloadPoolTests(SimpleTestCase):
+    def test_download_pool_is_shared_across_calls(self):
+        from .services import document_processing_service as dps
+
+        self.assertIs(dps.get_download_pool(3), dps.get_download_pool(3))
+
+    @override_settings(DRIVE_DOWNLOAD_WORKERS=2, DOCUMENT_EXTRACTION_WORKERS=1)
+    def test_folders_download_on_the_same_threads(self):
+        # Drive clients are per thread, so reusing threads reuses clients.
+        from .services import document_processing_service as dps
+
+        threads = set()
+
+        def download(file_id, file_name, file_size=None):
+            threads.add(threading.get_ident())
+            return b'data'
+
+        extracted = {'text': 'text', 'page_count': 1, 'extraction_method': 'text'}
+        files = [{'id': str(i), 'name': f'{i}.pdf', 'mimeType': 'application/pdf'} for i in range(6)]
+        with mock.patch.object(dps, '_download_drive_file', side_effect=download), \
+                mock.patch.object(dps, 'extract_text_from_file', return_value=extracted), \
+                mock.patch.object(dps, 'get_ocr_engine'):
+            for _ in range(3):
+                results = dps._extract_folder_files(files)
+                self.assertEqual([r['file_id'] for r in results], [f['id'] for f in files])
+
+        self.assertLessEqual(len(threads), 2)
+
+
+# =========================================================
+# EXTRACTION CACHE
+# =========================================================
+
+class ExtractionCacheTests(TestCase):
+    def _metadata(self, file_id='f1', **revision):
+        return {'id': file_id, 'name': f'{file_id}.pdf', 'mimeType': 'application/pdf', **revision}
+
+    def _info(self, text='Extracted text', method='text'):
+        return {'text': text, 'page_count': 2, 'extraction_method': method}
+
+    def _age(self, file_id, days):
+        ExtractedTextCache.objects.filter(file_id=file_id).update(
+            last_accessed=timezone.now() - timedelta(days=days)
+        )
+
+    def test_revision_key_prefers_md5_then_head_revision_then_modified_time(self):
+        key = extraction_cache._revision_key
+        full = {'md5Checksum': 'abc', 'headRevisionId': 'r7', 'modifiedTime': '2024-01-01T00:00:00Z'}
+        self.assertEqual(key(full), 'md5:abc')
+        self.assertEqual(key({**full, 'md5Checksum': None}), 'rev:r7')
+        self.assertEqual(key({'modifiedTime': '2024-01-01T00:00:00Z'}), 'mtime:2024-01-01T00:00:00Z')
+        self.assertIsNone(key({}))
+
+    def test_stored_extraction_is_a_hit_for_the_same_revision(self):
+        metadata = self._metadata(md5Checksum='abc')
+        self.assertIsNone(extraction_cache.get_cached_extraction(metadata))
+        extraction_cache.store_extraction(metadata, self._info(method='hybrid'))
+
+        hit = extraction_cache.get_cached_extraction(metadata)
+        self.assertEqual(hit['text'], 'Extracted text')
+        self.assertEqual(hit['page_count'], 2)
+        self.assertEqual(hit['extraction_method'], 'hybrid')
+        self.assertEqual(hit['file_id'], 'f1')
+        self.assertTrue(hit['cache_hit'])
+
+    def test_changed_revision_is_a_miss(self):
+        extraction_cache.store_extraction(self._metadata(md5Checksum='abc'), self._info())
+        self.assertIsNone(extraction_cache.get_cached_extraction(self._metadata(md5Checksum='def')))
+
+        extraction_cache.store_extraction(self._metadata('f2', modifiedTime='2024-01-01T00:00:00Z'), self._info())
+        self.assertIsNone(extraction_cache.get_cached_extraction(self._metadata('f2', modifiedTime='2024-02-01T00:00:00Z')))
+
+    def test_files_without_revision_or_text_are_not_cached(self):
+        extraction_cache.store_extraction(self._metadata(), self._info())
+        extraction_cache.store_extraction(self._metadata('f2', md5Checksum='abc'), self._info(text='  \n'))
+        self.assertFalse(ExtractedTextCache.objects.exists())
+
+    @override_settings(EXTRACTION_CACHE_ENABLED=False)
+    def test_disabled_cache_never_hits(self):
+        metadata = self._metadata(md5Checksum='abc')
+        extraction_cache.store_extraction(metadata, self._info())
+        self.assertIsNone(extraction_cache.get_cached_extraction(metadata))
+
+    @override_settings(EXTRACTION_CACHE_MAX_AGE_DAYS=30)
+    def test_eviction_drops_entries_not_accessed_within_max_age(self):
+        for file_id in ('old', 'new'):
+            extraction_cache.store_extraction(self._metadata(file_id, md5Checksum=file_id), self._info())
+        self._age('old', 31)
+        self._age('new', 29)
+
+        extraction_cache.evict_extraction_cache()
+        self.assertEqual(list(ExtractedTextCache.objects.values_list('file_id', flat=True)), ['new'])
+
+    @override_settings(EXTRACTION_CACHE_MAX_BYTES=25)
+    def test_eviction_drops_least_recently_used_until_under_max_bytes(self):
+        for days, file_id in enumerate(('c', 'b', 'a')):
+            extraction_cache.store_extraction(self._metadata(file_id, md5Checksum=file_id), self._info('x' * 10))
+            self._age(file_id, days)
+        # A hit refreshes last_accessed, so 'a' outlives 'b'
+        extraction_cache.get_cached_extraction(self._metadata('a', md5Checksum='a'))
+
+        extraction_cache.evict_extraction_cache()
+        self.assertEqual(sorted(ExtractedTextCache.objects.values_list('file_id', flat=True)), ['a', 'c'])
+
+    def test_folder_extracts_only_the_files_that_missed(self):
+        from .services import document_processing_service as dps
+
+        cached = self._metadata('cached', md5Checksum='abc')
+        changed = self._metadata('changed', md5Checksum='new')
+        extraction_cache.store_extraction(cached, self._info('Cached text'))
+        extraction_cache.store_extraction({**changed, 'md5Checksum': 'old'}, self._info('Stale text'))
+
+        service = mock.Mock()
+        service.files.return_value.list.return_value.execute.return_value = {'files': [cached, changed]}
+        fresh = dps._build_file_info(changed, self._info('Fresh text'))
+        with mock.patch.object(dps, 'get_drive_service', return_value=service), \
+                mock.patch.object(dps, '_extract_folder_files', return_value=[fresh]) as extract:
+            results = dps.extract_files_from_drive_folder('folder')
+
+        extract.assert_called_once_with([changed])
+        self.assertEqual([(r['text'], r['cache_hit']) for r in results], [('Cached text', True), ('Fresh text', False)])
+        self.assertEqual(extraction_cache.get_cached_extraction(changed)['text'], 'Fresh text')
+
+    def test_upload_records_cache_hits_and_misses(self):
+        from .services import document_processing_service as dps
+
+        user = User.objects.create_user('faculty', password='x')
+        upload = DocumentUpload.objects.create(user=user, google_drive_link='https://drive.google.com/drive/folders/abc')
+        files = [
+            {'text': 'first', 'page_count': 1, 'file_name': 'a.pdf', 'file_id': 'a', 'extraction_method': 'text', 'cache_hit': True},
+            {'text': 'second', 'page_count': 1, 'file_name': 'b.pdf', 'file_id': 'b', 'extraction_method': 'text', 'cache_hit': False},
+            {'text': 'third', 'page_count': 1, 'file_name': 'c.pdf', 'file_id': 'c', 'extraction_method': 'ocr', 'cache_hit': False},
+        ]
+        unmapped = {'primary_kra': None, 'confidence': 10.0, 'criterion': None, 'sub_criterion': None, 'stage': 'bert'}
+        with mock.patch.object(dps, 'extract_text_from_drive', return_value=files), \
+                mock.patch.object(dps, 'classify_with_cascade', return_value=unmapped):
+            dps.process_document_upload(upload)
+
+        upload.refresh_from_db()
+        self.assertEqual((upload.cache_hits, upload.cache_misses), (1, 2))
+
+
+# =========================================================
+# OCR
+# =========================================================
+
+def _pdf_bytes(page_texts):
+    """A PDF with one page per entry; None leaves the page blank (a 'scan')."""
+    doc = fitz.open()
+    for text in page_texts:
+        page = doc.new_page()
+        if text:
+            page.insert_text((72, 72), text)
+    data = doc.tobytes()
+    doc.close()
+    return data
+
+
+class OCRPreprocessingTests(SimpleTestCase):
+    def _page(self):
+        """A rendered text page, unevenly lit and noisy like a scan."""
+        gray = text_extraction_service.render_page_gray(
+            fitz.open(stream=_pdf_bytes(["Certificate of Appreciation 2023-2024"]), filetype="pdf")[0], dpi=72
+        )
+        rng = np.random.default_rng(0)
+        lighting = np.linspace(-40, 20, gray.shape[1])[None, :]
+        noisy = gray * 0.7 + 30 + lighting + rng.normal(0, 12, gray.shape)
+        return np.clip(noisy, 0, 255).astype(np.uint8)
+
+    def test_median_matches_pil(self):
+        rng = np.random.default_rng(1)
+        for shape in [(1, 1), (2, 3), (7, 5), (64, 49)]:
+            gray = rng.integers(0, 256, shape, dtype=np.uint8)
+            expected = np.asarray(Image.fromarray(gray).filter(ImageFilter.MedianFilter(size=3)))
+            np.testing.assert_array_equal(text_extraction_service._median3x3(gray.copy()), expected)
+
+    def test_numpy_preprocessing_matches_pil(self):
+        page = self._page()
+        expected = np.asarray(text_extraction_service.preprocess_for_ocr(Image.fromarray(page)).convert("L"))
+        np.testing.assert_array_equal(text_extraction_service.preprocess_array_for_ocr(page), expected)
+
+    def test_preprocessing_leaves_the_input_untouched(self):
+        page = self._page()
+        original = page.copy()
+        text_extraction_service.preprocess_array_for_ocr(page, adaptive=True)
+        np.testing.assert_array_equal(page, original)
+
+    def test_rendered_page_outlives_its_pixmap(self):
+        doc = fitz.open(stream=_pdf_bytes([None]), filetype="pdf")
+        gray = text_extraction_service.render_page_gray(doc[0])
+        gc.collect()
+        self.assertEqual(gray.shape, (2339, 1653))  # A4 at 200 dpi
+        self.assertEqual(int(text_extraction_service.preprocess_array_for_ocr(gray).min()), 255)
+
+
+class _SyncPool:
+    """Runs each submitted shard immediately; records the shards. hang=True leaves futures pending."""
+
+    def __init__(self, hang=False, fail_pages=()):
+        self.hang = hang
+        self.fail_pages = set(fail_pages)
+        self.shards = []
+
+    def submit(self, fn, source, shard, *args, **kwargs):
+        self.shards.append(list(shard))
+        future = Future()
+        if self.hang:
+            return future
+        if self.fail_pages & set(shard):
+            future.set_exception(RuntimeError("worker crashed"))
+        else:
+            future.set_result([(n, f"page {n}", 0.01) for n in shard])
+        return future
+
+
+class _SleepyBackend:
+    def __init__(self, seconds):
+        self.seconds = seconds
+        self.calls = 0
+
+    def image_to_string(self, img):
+        self.calls += 1
+        time.sleep(self.seconds)
+        return "text"
+
+
+class PageOCREngineTests(SimpleTestCase):
+    def _engine(self, pool, **kwargs):
+        engine = text_extraction_service.PageOCREngine(workers=2, **kwargs)
+        engine._pool = lambda: pool
+        return engine
+
+    def test_pages_are_sharded_over_the_pool_and_reassembled_in_order(self):
+        pool = _SyncPool()
+        texts, stats = self._engine(pool).ocr_pages(b'pdf', range(10))
+
+        # Two shards per worker
+        self.assertEqual(pool.shards, [[0, 1, 2], [3, 4, 5], [6, 7, 8], [9]])
+        self.assertEqual(texts, {n: f"page {n}" for n in range(10)})
+        self.assertEqual([p['page'] for p in stats], list(range(1, 11)))
+        self.assertTrue(all(p['status'] == 'ok' for p in stats))
+
+    def test_page_budget_skips_the_remaining_pages(self):
+        pool = _SyncPool()
+        texts, stats = self._engine(pool, max_pages=3).ocr_pages(b'pdf', range(5))
+
+        self.assertEqual(sorted(texts), [0, 1, 2])
+        self.assertEqual([p['status'] for p in stats], ['ok'] * 3 + ['skipped'] * 2)
+
+    def test_failed_shard_marks_only_its_pages_failed(self):
+        pool = _SyncPool(fail_pages=[4])
+        texts, stats = self._engine(pool).ocr_pages(b'pdf', range(8))
+
+        self.assertEqual(sorted(texts), [0, 1, 2, 3, 6, 7])
+        self.assertEqual([p['page'] for p in stats if p['status'] == 'failed'], [5, 6])
+
+    def test_shards_unfinished_at_the_deadline_time_out(self):
+        pool = _SyncPool(hang=True)
+        started = time.monotonic()
+        texts, stats = self._engine(pool, time_budget=0.05).ocr_pages(b'pdf', range(4))
+
+        self.assertLess(time.monotonic() - started, 5)
+        self.assertEqual(texts, {})
+        self.assertEqual([p['status'] for p in stats], ['timeout'] * 4)
+
+    def test_shard_stops_after_the_page_in_progress_at_the_deadline(self):
+        backend = _SleepyBackend(0.3)
+        pdf = _pdf_bytes([None, None, None])
+        with mock.patch.object(text_extraction_service, 'get_ocr_backend', return_value=backend):
+            results = text_extraction_service._ocr_pdf_pages(pdf, [0, 1, 2], dpi=20, deadline=time.time() + 0.2)
+
+        self.assertEqual([page for page, _, _ in results], [0])
+        self.assertEqual(backend.calls, 1)
+
+    def test_single_worker_runs_inline(self):
+        engine = text_extraction_service.PageOCREngine(workers=1)
+        with mock.patch.object(text_extraction_service, 'get_ocr_backend', return_value=_SleepyBackend(0)):
+            texts, stats = engine.ocr_pages(_pdf_bytes([None, None]), [0, 1])
+
+        self.assertEqual(texts, {0: 'text', 1: 'text'})
+        self.assertEqual([p['status'] for p in stats], ['ok', 'ok'])
+
+
+class _StubOCREngine:
+    """Returns text for the pages in `texts`; every other requested page failed."""
+
+    def __init__(self, texts=None):
+        self.texts = texts or {}
+        self.requested = []
+
+    def ocr_pages(self, source, page_numbers):
+        self.requested.append(list(page_numbers))
+        stats = [{'page': n + 1, 'status': 'ok' if n in self.texts else 'failed', 'seconds': None} for n in page_numbers]
+        return {n: self.texts[n] for n in page_numbers if n in self.texts}, stats
+
+
+class HybridPDFExtractionTests(SimpleTestCase):
+    TEXT_PAGE = "This certifies that the faculty member served as thesis adviser."
+
+    def test_text_layer_detection(self):
+        usable = text_extraction_service.has_usable_text_layer
+        self.assertTrue(usable(self.TEXT_PAGE))
+        self.assertFalse(usable("  p. 3 \n"))
+        self.assertFalse(usable("\ufffd" * 10 + "a" * 30))
+        self.assertFalse(usable("\ue000\ue001" * 20))
+        self.assertFalse(usable("-- .. ,, ;; :: -- .. ,, ;; :: -- .. a1"))
+
+    def test_only_pages_without_a_usable_text_layer_are_ocrd(self):
+        engine = _StubOCREngine({1: "scanned page"})
+        result = text_extraction_service.extract_text_from_pdf_with_ocr(
+            _pdf_bytes([self.TEXT_PAGE, None, self.TEXT_PAGE]), engine
+        )
+
+        self.assertEqual(engine.requested, [[1]])
+        self.assertEqual(result['page_methods'], ['text_layer', 'ocr', 'text_layer'])
+        self.assertEqual(result['extraction_method'], 'hybrid')
+        self.assertEqual(result['page_offsets'][2] - result['page_offsets'][1], len("scanned page\n"))
+        self.assertIn("scanned page", result['text'])
+
+    def test_text_layer_document_never_calls_ocr(self):
+        engine = _StubOCREngine()
+        result = text_extraction_service.extract_text_from_pdf_with_ocr(_pdf_bytes([self.TEXT_PAGE] * 2), engine)
+
+        self.assertEqual(engine.requested, [])
+        self.assertEqual(result['extraction_method'], 'text_layer')
+
+    def test_fully_scanned_document_is_ocr(self):
+        engine = _StubOCREngine({0: "one", 1: "two"})
+        result = text_extraction_service.extract_text_from_pdf_with_ocr(_pdf_bytes([None, None]), engine)
+
+        self.assertEqual(result['extraction_method'], 'ocr')
+        self.assertEqual(result['text'], "one\ntwo\n")
+
+    def test_method_reflects_pages_whose_ocr_failed(self):
+        scanned = text_extraction_service.extract_text_from_pdf_with_ocr(_pdf_bytes([None, None]), _StubOCREngine({1: "two"}))
+        self.assertEqual(scanned['page_methods'], ['text_layer', 'ocr'])
+        self.assertEqual(scanned['extraction_method'], 'hybrid')
+
+        failed = text_extraction_service.extract_text_from_pdf_with_ocr(
+            _pdf_bytes([self.TEXT_PAGE, None]), _StubOCREngine()
+        )
+        self.assertEqual(failed['page_methods'], ['text_layer', 'text_layer'])
+        self.assertEqual(failed['extraction_method'], 'text_layer')
+        self.assertEqual([p['status'] for p in failed['ocr_pages']], ['failed'])
+
+
+class OCRBackendSelectionTests(SimpleTestCase):
+    def setUp(self):
+        ocr_backends.close_ocr_backends()
+        self.addCleanup(ocr_backends.close_ocr_backends)
+
+    def test_unknown_backend_falls_back_to_pytesseract(self):
+        with self.assertLogs(ocr_backends.logger, 'WARNING'):
+            backend = ocr_backends.get_ocr_backend('no-such-engine')
+        self.assertIsInstance(backend, ocr_backends.PytesseractBackend)
+
+    def test_uninstalled_backend_falls_back_to_pytesseract(self):
+        with mock.patch.dict('sys.modules', {'tesserocr': None}), self.assertLogs(ocr_backends.logger, 'WARNING'):
+            backend = ocr_backends.get_ocr_backend('tesserocr')
+        self.assertIsInstance(backend, ocr_backends.PytesseractBackend)
+        # Resolved once per thread
+        self.assertIs(ocr_backends.get_ocr_backend('tesserocr'), backend)
+
+    def test_engine_uses_the_shared_default_unless_configured(self):
+        from .services.document_processing_service import get_ocr_engine
+
+        self.assertEqual(ocr_backends.DEFAULT_OCR_BACKEND, 'tesserocr')
+        self.assertEqual(get_ocr_engine().ocr_backend, ocr_backends.DEFAULT_OCR_BACKEND)
+        with override_settings(OCR_BACKEND='pytesseract'):
+            self.assertEqual(get_ocr_engine().ocr_backend, 'pytesseract')
+
+
+# =========================================================
+# EXTRACTORS
+# =========================================================
+# Expected outputs were recorded from the extractors before their regexes
+# were precompiled (extraction_patterns) and must not change.
+
+EVALUATION_TEXT = (
+    "Republic of the Philippines\n"
+    "STUDENT\u2019S EVALUATION OF TEACHING EFFECTIVENESS\n"
+    "1st Semester, A.Y. 2022 \u2013 2023\n"
+    "Faculty: Juan Dela Cruz\n"
+    "Equivalent Percentage: 91.25%\n\n"
+    "SUPERVISOR\u2019S  EVALUATION\n"
+    "2nd semester A.Y. 2022-2023\n"
+    "Equivalent   Percentage : 88.5 %\n"
+)
+PROGRAM_TEXT = (
+    "BOARD RESOLUTION No. 12-A, s. 2021\n"
+    "Approving the revised Bachelor of Science in Computer Science\n"
+    "Major in Data Science, effective A.Y. 2021-2022.\n"
+    "Program Lead: Juan Dela Cruz\n"
+    "Contributors: Maria Santos, Pedro Reyes\n"
+)
+ADVISER_TEXT = (
+    "CAPSTONE PROJECT APPROVAL SHEET\n"
+    "This undergraduate thesis entitled \"Smart Farming\" prepared by the students\n"
+    "has been examined and is recommended for acceptance.\n\n"
+    "Capstone Project Adviser: JUAN DELA CRUZ, A.Y. 2023-2024\n\n"
+    "Panel Members:\nMARIA SANTOS\nPEDRO REYES, Panel Chair\n"
+)
+PANEL_TEXT = (
+    "ORAL DEFENSE\nMaster's Thesis, AY 2023 - 2024\nPanel of Examiners:\n"
+    "Dr. Maria Santos, Chairperson\nDr. Juan Dela Cruz, Member\n"
+    "Date: March 3, 2024, AY 2023 - 2024\n"
+)
+
+
+class ExtractorOutputTests(SimpleTestCase):
+    def _quiet(self, extractor, *args, **kwargs):
+        with mock.patch('builtins.print'):
+            return extractor(*args, **kwargs)
+
+    def test_kra1a_evaluation(self):
+        self.assertEqual(
+            self._quiet(extraction_strategies.extract_kra1a_evaluation, EVALUATION_TEXT, faculty_name="Juan Dela Cruz"),
+            [{
+                'evidence_type': 'kra1a_evaluation',
+                'equivalent_percentage': '91.25%',
+                'semester_ay': '2nd semester A.Y. 2022-2023',
+                'evaluation_type': "Student's Evaluation, Supervisor's Evaluation",
+                'percentages': ['91.25%'],
+                'raw_text_preview': EVALUATION_TEXT,
+                'total_score': 91.25,
+            }],
+        )
+
+    def test_kra1b_program(self):
+        expected = {
+            'program_name': 'BACHELOR OF SCIENCE IN COMPUTER SCIENCE MAJOR IN DATA SCIENCE',
+            'program_type': 'Revised Program',
+            'board_resolution': 'Pending/Not Found',
+            'academic_year': '2021-2022',
+        }
+        extract = extraction_strategies.extract_kra1b_program_leadAndContri
+        self.assertEqual(self._quiet(extract, PROGRAM_TEXT, "Juan Dela Cruz"), [{**expected, 'role': 'Lead'}])
+        self.assertEqual(self._quiet(extract, PROGRAM_TEXT, None), [{**expected, 'role': 'Contributor'}])
+
+    def test_kra1c_adviser(self):
+        items = self._quiet(extraction_strategies.extract_kra1c_adviser, ADVISER_TEXT, "Juan Dela Cruz")
+        self.assertEqual(len(items), 1)
+        # Which variant matches first depends on set order (hash seed)
+        self.assertIn(items[0].pop('matched_name'), {'juan dela cruz', 'cruz'})
+        self.assertEqual(items[0], {
+            'type': 'adviser',
+            'academic_year': '2022-2023',
+            'level': 'CP',
+            'count': 1,
+            'total_score': 3,
+            'title': 'Adviser Service (CP) 2022-2023',
+            'contribution_percent': 100,
+            'context_found_in': ADVISER_TEXT[ADVISER_TEXT.index("Capstone Project Adviser"):],
+        })
+
+    def test_kra1c_without_a_match(self):
+        self.assertEqual(self._quiet(extraction_strategies.extract_kra1c_adviser, ADVISER_TEXT, None), [])
+        self.assertEqual(self._quiet(extraction_strategies.extract_kra1c_adviser, PANEL_TEXT, "Juan Dela Cruz"), [])
+        self.assertEqual(self._quiet(extraction_strategies.extract_kra1c_panel, PANEL_TEXT, "Juan Dela Cruz"), [])
+
+
+def _reference_find_name_near_role(text, faculty_name_variants, role_keywords):
+    """_find_name_near_role as it was before NameRoleIndex: a regex scan per variant and role."""
+    text_lower = text.lower()
+    for variant in faculty_name_variants:
+        variant_lower = variant.lower()
+        for match in re.finditer(re.escape(variant_lower), text_lower):
+            start_window = max(0, match.start() - 200)
+            end_window = min(len(text_lower), match.end() + 200)
+            context_snippet = text_lower[start_window:end_window]
+            for role_keyword in role_keywords:
+                if re.search(rf'\b{re.escape(role_keyword)}\b', context_snippet):
+                    return variant, text[start_window:end_window]
+    return None, None
+
+
+class NameRoleIndexTests(SimpleTestCase):
+    VARIANTS = [
+        ['Juan Dela Cruz', 'cruz, juan', 'J. Cruz', 'cruz'],
+        ['maria santos', 'santos, m.', 'santos'],
+        ['Pedro Reyes', 'reyes'],
+        ['Ana Lim', 'lim'],
+    ]
+    ROLES = [
+        ['adviser', 'advisor', 'co-adviser', 'thesis adviser'],
+        # The extractors' keywords look like regexes but are matched literally
+        [r'co[-\s]?adviser', r'major[-\s]?adviser', 'adviser'],
+        ['panel', 'member', 'chairperson', 'examiner'],
+        ['lead', 'head', 'chair'],
+    ]
+
+    def _texts(self):
+        filler = "The committee reviewed the manuscript and recommended its acceptance. " * 4
+        return [
+            "",
+            "Adviser: Juan Dela Cruz",
+            "JUAN DELA CRUZ\nThesis Adviser",
+            filler + "Juan Dela Cruz" + filler + "Adviser",
+            "Cruz, Juan (co-adviser); Maria Santos, Panel Member; Pedro Reyes, Chairperson",
+            "cruzado advisers santosa members",
+            "Panel: " + filler + "Santos, M. " + filler + "examiner " + "lim" * 3,
+            "Ana Lim, head\n" + filler * 3 + "Pedro Reyes\n" + filler + "lead",
+            ("reyes " + filler) * 5 + "lead reyes",
+            "Members: Juan Dela Cruzz, Maria Santosa, J. Cruz (adviser)",
+        ]
+
+    def test_matches_the_reference_implementation(self):
+        for text in self._texts():
+            index = NameRoleIndex(text)
+            for variants in self.VARIANTS:
+                for roles in self.ROLES:
+                    with self.subTest(text=text[:40], variants=variants, roles=roles):
+                        expected = _reference_find_name_near_role(text, variants, roles)
+                        self.assertEqual(index.find_name_near_role(variants, roles), expected)
+                        self.assertEqual(_find_name_near_role(text, variants, roles), expected)
+
+    def test_matches_the_reference_with_generated_variants(self):
+        variants = _generate_name_variants("Juan Dela", "Cruz")
+        roles = [r'adviser', r'panel', r'member']
+        for text in self._texts():
+            with self.subTest(text=text[:40]):
+                self.assertEqual(
+                    NameRoleIndex(text).find_name_near_role(variants, roles),
+                    _reference_find_name_near_role(text, variants, roles),
+                )
+
+    def test_parsed_document_reuses_section_indexes(self):
+        document = ParsedDocument("Adviser: Juan Dela Cruz\nPanel: Maria Santos")
+        section = document.text[:23]
+        self.assertIs(document.name_role_index_for(section), document.name_role_index_for(section))
+        self.assertIs(document.name_role_index_for(document.text), document.name_role_index)
+
+
+# =========================================================
+# CLASSIFIER WINDOWS
+# =========================================================
+
+class WindowStartsTests(SimpleTestCase):
+    def test_short_document_is_one_window(self):
+        self.assertEqual(ml._window_starts(100, 510, 128, 8), [0])
+        self.assertEqual(ml._window_starts(510, 510, 128, 8), [0])
+
+    def test_windows_overlap_by_stride_and_end_at_the_last_token(self):
+        starts = ml._window_starts(1000, 510, 128, 8)
+        self.assertEqual(starts, [0, 382, 490])
+        self.assertEqual(starts[-1] + 510, 1000)
+
+    def test_thinned_to_max_windows_keeping_first_and_last(self):
+        starts = ml._window_starts(20000, 510, 128, 8)
+        self.assertEqual(len(starts), 8)
+        self.assertEqual(starts[0], 0)
+        self.assertEqual(starts[-1], 20000 - 510)
+        self.assertEqual(starts, sorted(starts))
+
+
+class RunClassifierBatchingTests(SimpleTestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.directory = tempfile.mkdtemp()
+        cls.tokenizer = BertTokenizerFast(_write_vocab(cls.directory))
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(cls.directory)
+        super().tearDownClass()
+
+    def _components(self, model):
+        return model, self.tokenizer, _Encoder(3), _Encoder(2), _Encoder(3), torch.device('cpu')
+
+    def _texts(self):
+        return [
+            ' '.join(TEST_WORDS[(i * j) % len(TEST_WORDS)] for j in range(length))
+            for i, length in enumerate([3, 2000, 40, 700, 5000, 1])
+        ]
+
+    def test_batch_size_bounds_windows_per_forward_pass(self):
+        model = _SumModel()
+        ml._run_classifier(self._texts(), 3, self._components(model))
+        self.assertLessEqual(max(model.batch_rows), 3)
+        # The long documents have several windows each, so there are more passes than documents / 3
+        self.assertGreater(len(model.batch_rows), 2)
+
+    def test_results_do_not_depend_on_batch_size(self):
+        texts = self._texts()
+        one_pass = ml._run_classifier(texts, 1000, self._components(_SumModel()))
+        for batch_size in (1, 2, 5):
+            with self.subTest(batch_size=batch_size):
+                self.assertEqual(ml._run_classifier(texts, batch_size, self._components(_SumModel())), one_pass)
+
+
+# =========================================================
+# TOKENIZATION
+# =========================================================
+
+class TokenizerTests(SimpleTestCase):
+    TEXTS = [
+        "Faculty evaluation: research JOURNAL, extension; panel adviser thesis.",
+        "Thesis\tadviser\n\n  panel\u00a0member (2023-2024) caf\u00e9 na\u00efve",
+        "\u5b66\u672f research\u2014journal \u201cfaculty\u201d evaluationextension",
+        "",
+    ]
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.directory = tempfile.mkdtemp()
+        vocab = _write_vocab(cls.directory)
+        cls.slow = BertTokenizer(vocab)
+        cls.fast = BertTokenizerFast(vocab)
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(cls.directory)
+        super().tearDownClass()
+
+    def test_fast_and_python_tokenizers_give_the_same_ids(self):
+        fast_ids = self.fast(self.TEXTS, add_special_tokens=False)['input_ids']
+        for text, ids in zip(self.TEXTS, fast_ids):
+            with self.subTest(text=text):
+                self.assertEqual(self.slow(text, add_special_tokens=False)['input_ids'], ids)
+
+    def test_saved_tokenizer_fast_and_python_ids_match(self):
+        if not os.path.exists(os.path.join(ml.get_model_file('saved_tokenizer'), 'vocab.txt')):
+            self.skipTest("saved_tokenizer/vocab.txt is not checked out")
+        slow, fast = ml.load_tokenizer(fast=False), ml.load_tokenizer(fast=True)
+        self.assertTrue(fast.is_fast)
+        for text in self.TEXTS:
+            with self.subTest(text=text):
+                self.assertEqual(
+                    slow(text, add_special_tokens=False)['input_ids'],
+                    fast(text, add_special_tokens=False)['input_ids'],
+                )
+
+    def test_char_budget(self):
+        self.assertEqual(ml.get_char_budget(chunked=False), 512 * ml.CHARS_PER_TOKEN_BUDGET)
+        self.assertEqual(
+            ml.get_char_budget(chunked=True, stride=128, max_windows=8),
+            (512 + 7 * 382) * ml.CHARS_PER_TOKEN_BUDGET,
+        )
+        self.assertEqual(ml.get_char_budget(chunked=True, max_windows=1), ml.get_char_budget(chunked=False))
+
+    def test_pre_truncate_keeps_short_text(self):
+        self.assertEqual(ml.pre_truncate_text("a  b", 100), "a  b")
+        self.assertEqual(ml.pre_truncate_text("a    b", 4), "a b")
+
+    def test_pre_truncate_head(self):
+        text = ' '.join(f"w{i}" for i in range(1000))
+        truncated = ml.pre_truncate_text(text, 100)
+        self.assertLessEqual(len(truncated), 100)
+        self.assertTrue(text.startswith(truncated + " "))
+
+    def test_pre_truncate_slices_cover_the_whole_text_on_word_boundaries(self):
+        words = [f"w{i}" for i in range(5000)]
+        truncated = ml.pre_truncate_text(' '.join(words), 800, pieces=8)
+        kept = truncated.split(" ")
+        self.assertLessEqual(len(truncated), 800)
+        self.assertTrue(set(kept) <= set(words))
+        self.assertEqual(kept[0], "w0")
+        self.assertEqual(kept[-1], "w4999")
+        positions = [int(w[1:]) for w in kept]
+        self.assertEqual(positions, sorted(positions))
+        self.assertGreater(positions[len(positions) // 2], 1000)
+
+    def _long_text(self):
+        words = TEST_WORDS + ['Research', 'caf\u00e9', '2023-2024', '\u5b66\u672f', 'unseenword']
+        separators = [' ', '  ', '\n', '\t', ' \n\n ']
+        return ''.join(words[(i * 7) % len(words)] + separators[i % len(separators)] for i in range(60000))
+
+    def test_long_documents_are_sliced_within_the_budget(self):
+        text = self._long_text()
+        to_tokenize = ml.texts_to_tokenize([text], chunked=True, stride=128, max_windows=8)[0]
+        self.assertLessEqual(len(to_tokenize), ml.get_char_budget(True, 128, 8))
+        words = text.split()
+        self.assertEqual(to_tokenize.split()[0], words[0])
+        self.assertEqual(to_tokenize.split()[-1], words[-1])
+
+    def test_fast_and_python_tokenizers_give_the_same_windows_on_a_long_text(self):
+        text = self._long_text()
+        to_tokenize = ml.texts_to_tokenize([text], chunked=True, stride=128, max_windows=8)
+        slow_ids = self.slow(to_tokenize, add_special_tokens=False, verbose=False)['input_ids'][0]
+        fast_ids = self.fast(to_tokenize, add_special_tokens=False, verbose=False)['input_ids'][0]
+        self.assertEqual(slow_ids, fast_ids)
+
+        slow_windows = ml._split_windows(self.slow, slow_ids, True, 128, 8)
+        fast_windows = ml._split_windows(self.fast, fast_ids, True, 128, 8)
+        self.assertEqual(len(fast_windows), 8)
+        self.assertEqual(slow_windows, fast_windows)
+        # Windows still reach the end of the document
+        self.assertEqual(fast_windows[-1][1:-1], fast_ids[-510:])
+
+    def test_truncate_mode_only_tokenizes_the_head(self):
+        text = ' '.join(TEST_WORDS * 5000)
+        head = ml.texts_to_tokenize([text], chunked=False, stride=128, max_windows=8)[0]
+        self.assertLessEqual(len(head), ml.get_char_budget(chunked=False))
+        self.assertTrue(text.startswith(head))
+
+
+# =========================================================
+# FIRST-STAGE CASCADE
+# =========================================================
+
+RESEARCH_SAMPLE = "abstract introduction methodology results journal article peer reviewed research findings"
+ADVISER_SAMPLE = "thesis adviser certification student defense advising panel graduate thesis"
+
+
+def _fit_first_stage():
+    """A tiny TF-IDF + logistic regression model shaped like train_first_stage's output."""
+    texts = [RESEARCH_SAMPLE, ADVISER_SAMPLE] * 10
+    labels = [first_stage_classifier.join_labels("2", "A", "1.1"), first_stage_classifier.join_labels("1", "C", "1.1")] * 10
+    pipeline = Pipeline([('tfidf', TfidfVectorizer()), ('clf', LogisticRegression(C=100.0))])
+    pipeline.fit(texts, labels)
+    return {'pipeline': pipeline}
+
+
+@override_settings(FIRST_STAGE_THRESHOLD=0.8)
+class FirstStageCascadeTests(TestCase):
+    BERT_RESULT = {'primary_kra': '2', 'confidence': 71.0, 'criterion': 'A', 'sub_criterion': '2.1', 'explanation': 'bert'}
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.model = _fit_first_stage()
+
+    def setUp(self):
+        state = mock.patch.object(first_stage_classifier, '_state', (list(first_stage_classifier.KEYWORD_RULES), self.model))
+        state.start()
+        self.addCleanup(state.stop)
+        bert = mock.patch.object(first_stage_classifier, 'classify_document', side_effect=lambda text: dict(self.BERT_RESULT))
+        self.bert = bert.start()
+        self.addCleanup(bert.stop)
+
+    def test_confident_linear_model_answers_without_bert(self):
+        result = first_stage_classifier.classify_with_cascade(RESEARCH_SAMPLE)
+
+        self.assertEqual(result['stage'], first_stage_classifier.STAGE_LINEAR)
+        self.assertEqual((result['primary_kra'], result['criterion'], result['sub_criterion']), ("2", "A", "1.1"))
+        self.assertGreaterEqual(result['confidence'], 80)
+        self.bert.assert_not_called()
+
+    def test_unsure_linear_model_defers_to_bert(self):
+        result = first_stage_classifier.classify_with_cascade("quarterly budget memorandum for the motor pool")
+
+        self.assertEqual(result['stage'], first_stage_classifier.STAGE_BERT)
+        self.assertEqual(result['sub_criterion'], '2.1')
+        self.bert.assert_called_once()
+
+    def test_keyword_rule_answers_first(self):
+        result = first_stage_classifier.classify_with_cascade(
+            "Student's Evaluation of Teachers ... Equivalent Percentage: 92.5"
+        )
+
+        self.assertEqual(result['stage'], first_stage_classifier.STAGE_RULES)
+        self.assertEqual((result['primary_kra'], result['criterion'], result['sub_criterion']), ("1", "A", "1.1"))
+        self.bert.assert_not_called()
+
+    @override_settings(FIRST_STAGE_ENABLED=False)
+    def test_disabled_first_stage_always_uses_bert(self):
+        self.assertEqual(first_stage_classifier.classify_with_cascade(RESEARCH_SAMPLE)['stage'], first_stage_classifier.STAGE_BERT)
+
+    def test_upload_records_the_stage_that_classified_it(self):
+        from .services import document_processing_service as dps
+
+        user = User.objects.create_user('faculty', password='x')
+        for text, stage in ((RESEARCH_SAMPLE, 'linear'), ("quarterly budget memorandum for the motor pool", 'bert')):
+            with self.subTest(stage=stage):
+                upload = DocumentUpload.objects.create(user=user, google_drive_link='https://drive.google.com/drive/folders/abc')
+                files = [{'text': text, 'page_count': 1, 'file_name': 'a.pdf', 'file_id': 'a', 'extraction_method': 'text'}]
+                with mock.patch.object(dps, 'extract_text_from_drive', return_value=files), \
+                        mock.patch.object(dps, 'route_extraction', return_value=[]):
+                    dps.process_document_upload(upload)
+
+                upload.refresh_from_db()
+                self.assertEqual(upload.status, 'completed')
+                self.assertEqual(upload.classification_stage, stage)
+
+
+# =========================================================
+# ONNX BACKEND
+# =========================================================
+
+class OnnxThreadCountTests(SimpleTestCase):
+    @override_settings(CLASSIFIER_ONNX_THREADS=3)
+    def test_explicit_setting_wins(self):
+        self.assertEqual(ml.get_onnx_thread_count(), 3)
+
+    @override_settings(CLASSIFIER_ONNX_THREADS=None, CLASSIFIER_SERVER_URL=None, CELERY_WORKER_CONCURRENCY=4)
+    def test_cpus_are_split_between_worker_processes(self):
+        with mock.patch('os.cpu_count', return_value=16):
+            self.assertEqual(ml.get_onnx_thread_count(), 4)
+        with mock.patch('os.cpu_count', return_value=2):
+            self.assertEqual(ml.get_onnx_thread_count(), 1)
+
+    @override_settings(CLASSIFIER_ONNX_THREADS=None, CLASSIFIER_SERVER_URL='http://127.0.0.1:8765',
+                       CELERY_WORKER_CONCURRENCY=4)
+    def test_inference_server_gets_every_cpu(self):
+        with mock.patch('os.cpu_count', return_value=16):
+            self.assertEqual(ml.get_onnx_thread_count(), 16)
+
+
+@skipUnless(
+    importlib.util.find_spec('onnx') and importlib.util.find_spec('onnxruntime'),
+    "exporting needs onnx and onnxruntime",
+)
+class OnnxEquivalenceTests(SimpleTestCase):
+    def test_onnx_logits_match_torch(self):
+        from .management.commands.export_classifier_onnx import CHECK_TEXTS, Command
+
+        torch.manual_seed(0)
+        config = BertConfig(vocab_size=len(TEST_WORDS) + 5, hidden_size=32, num_hidden_layers=2,
+                            num_attention_heads=2, intermediate_size=64)
+        model = ml.TripleBERTClassifier(3, 2, 3, bert=BertModel(config)).eval()
+
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        tokenizer = BertTokenizerFast(_write_vocab(directory))
+        onnx_path = os.path.join(directory, 'model.onnx')
+        Command()._export(model, tokenizer, onnx_path, 17)
+        onnx_model = ml.OnnxTripleBERTClassifier(onnx_path, threads=1)
+
+        inputs = tokenizer(CHECK_TEXTS + [' '.join(TEST_WORDS * 40)], padding=True, truncation=True, max_length=512,
+                           return_tensors='pt')
+        with torch.inference_mode():
+            expected = model(inputs['input_ids'], inputs['attention_mask'])
+        actual = onnx_model(inputs['input_ids'], inputs['attention_mask'])
+        for e, a in zip(expected, actual):
+            np.testing.assert_allclose(a.numpy(), e.numpy(), atol=1e-4)
+
+
+# =========================================================
+# CLASSIFICATION CACHE
+# =========================================================
+
+class ClassificationCacheKeyTests(SimpleTestCase):
+    def test_case_and_whitespace_share_a_key(self):
+        self.assertEqual(
+            classification_cache.text_hash("Research  Journal\n\tArticle"),
+            classification_cache.text_hash("research journal article "),
+        )
+
+    def test_different_text_gets_a_different_key(self):
+        self.assertNotEqual(
+            classification_cache.text_hash("research journal"),
+            classification_cache.text_hash("research journals"),
+        )
+
+
+class ClassificationCacheStatsTests(TestCase):
+    def setUp(self):
+        for patcher in (
+            mock.patch.object(classification_cache, '_lru', OrderedDict()),
+            mock.patch.dict(classification_cache._stats, {'memory_hits': 0, 'db_hits': 0, 'misses': 0}),
+        ):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def test_lookups_count_memory_hits_db_hits_and_misses(self):
+        stored, unknown = classification_cache.text_hash("stored"), classification_cache.text_hash("unknown")
+        classification_cache.store_classifications({stored: {'primary_kra': '1'}}, 'v1')
+        classification_cache._lru.clear()
+
+        self.assertEqual(list(classification_cache.get_cached_classifications([stored, unknown], 'v1')), [stored])
+        classification_cache.get_cached_classifications([stored], 'v1')
+
+        process = classification_cache.get_classification_cache_stats()['process']
+        self.assertEqual(process, {'memory_hits': 1, 'db_hits': 1, 'misses': 1, 'hit_rate': 0.667})
+
+    def test_concurrent_counts_are_not_lost(self):
+        def count():
+            for _ in range(5000):
+                classification_cache._count(memory_hits=1, misses=2)
+
+        threads = [threading.Thread(target=count) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(classification_cache._stats, {'memory_hits': 40000, 'db_hits': 0, 'misses': 80000})
+
+
+class ModelFingerprintTests(SimpleTestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+        self.model_path = os.path.join(self.directory, 'model.onnx')
+        self._write_model(b'weights v1')
+        self.encoders = (_Encoder(3), _Encoder(2), _Encoder(3))
+
+        settings_override = override_settings(
+            CLASSIFIER_HASH_CACHE_PATH=os.path.join(self.directory, 'hashes.json')
+        )
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        patcher = mock.patch.dict(classification_cache._file_hashes, clear=True)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def _write_model(self, content, mtime_ns=None):
+        with open(self.model_path, 'wb') as f:
+            f.write(content)
+        if mtime_ns is not None:
+            os.utime(self.model_path, ns=(mtime_ns, mtime_ns))
+
+    def _fingerprint(self, config=None):
+        return classification_cache.compute_model_fingerprint(self.model_path, self.encoders, config or {})
+
+    def test_stable_for_the_same_model_and_config(self):
+        self.assertEqual(self._fingerprint(), self._fingerprint())
+
+    def test_changes_with_config_and_encoder_classes(self):
+        fingerprint = self._fingerprint()
+        self.assertNotEqual(self._fingerprint({'max_windows': 4}), fingerprint)
+        self.encoders = (_Encoder(4), _Encoder(2), _Encoder(3))
+        self.assertNotEqual(self._fingerprint(), fingerprint)
+
+    def test_file_is_hashed_once_per_version(self):
+        with mock.patch.object(classification_cache, 'file_sha256', wraps=classification_cache.file_sha256) as hashed:
+            first = self._fingerprint()
+            self._fingerprint()
+            # A new process: the in-memory memo is empty, the hash cache file is not
+            classification_cache._file_hashes.clear()
+            self._fingerprint()
+            self.assertEqual(hashed.call_count, 1)
+
+            self._write_model(b'weights v2', mtime_ns=os.stat(self.model_path).st_mtime_ns + 10 ** 9)
+            self.assertNotEqual(self._fingerprint(), first)
+            self.assertEqual(hashed.call_count, 2)
+
+    def test_onnx_backend_fingerprints_the_onnx_file(self):
+        onnx_model = object.__new__(ml.OnnxTripleBERTClassifier)
+        onnx_model.onnx_path = self.model_path
+        components = (onnx_model, None) + self.encoders + (torch.device('cpu'),)
+
+        with mock.patch.object(ml, 'get_weights_path', return_value=os.path.join(self.directory, 'missing.pt')):
+            fingerprint = ml._fingerprint(components)
+            self.assertIsNotNone(fingerprint)
+            self._write_model(b're-exported', mtime_ns=os.stat(self.model_path).st_mtime_ns + 10 ** 9)
+            self.assertNotEqual(ml._fingerprint(components), fingerprint)
+
+    def test_missing_model_file_disables_the_cache_with_a_warning(self):
+        components = (object(), None) + self.encoders + (torch.device('cpu'),)
+        with mock.patch.object(ml, 'get_weights_path', return_value=os.path.join(self.directory, 'missing.pt')):
+            with self.assertLogs(ml.logger, 'WARNING'):
+                self.assertIsNone(ml._fingerprint(components))
+
+
+# =========================================================
+# INFERENCE SERVER
+# =========================================================
+
+class MicroBatcherTests(SimpleTestCase):
+    def test_database_connections_are_checked_around_each_batch(self):
+        calls = []
+
+        def classify(texts, batch_size):
+            calls.append('classify')
+            return [{'text': text} for text in texts]
+
+        with mock.patch.object(inference_server, 'close_old_connections', lambda: calls.append('close')):
+            batcher = inference_server.MicroBatcher(classify, max_wait_ms=0)
+            self.assertEqual(batcher.submit(['a', 'b']), [{'text': 'a'}, {'text': 'b'}])
+            batcher.submit(['c'])
+        # submit() returns only after the batch is finished, connections included
+        self.assertEqual(calls, ['close', 'classify', 'close'] * 2)
+
+
+# =========================================================
+# LLM RATE LIMITER
+# =========================================================
+
+class _FakeClock:
+    """time.time() and time.sleep() stand-ins: sleeping only advances the clock."""
+
+    def __init__(self, now=1000.0):
+        self.now = now
+        self.sleeps = []
+
+    def __call__(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.sleeps.append(seconds)
+        self.now += seconds
+
+
+class TokenBucketLimiterTests(SimpleTestCase):
+    def setUp(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        self.store_path = os.path.join(directory, 'rate_limit.sqlite3')
+        self.clock = _FakeClock()
+
+    def _limiter(self, requests_per_minute=60, tokens_per_minute=6000, name='groq'):
+        return TokenBucketLimiter(
+            name, SQLiteBucketStore(self.store_path), requests_per_minute, tokens_per_minute,
+            clock=self.clock, sleep=self.clock.sleep,
+        )
+
+    def test_full_bucket_allows_a_burst_then_paces_requests(self):
+        limiter = self._limiter(requests_per_minute=60)
+        for _ in range(60):
+            self.assertEqual(limiter.try_acquire(10), 0)
+        self.assertAlmostEqual(limiter.try_acquire(10), 1.0)
+
+        self.assertAlmostEqual(limiter.acquire(10), 1.0)
+        self.assertEqual(self.clock.sleeps, [1.0])
+
+    def test_token_budget_limits_large_calls(self):
+        limiter = self._limiter(tokens_per_minute=6000)
+        self.assertEqual(limiter.try_acquire(5000), 0)
+        # 4000 more tokens are needed: 40s at 100 tokens/s
+        self.assertAlmostEqual(limiter.try_acquire(5000), 40.0)
+        self.clock.now += 40
+        self.assertEqual(limiter.try_acquire(5000), 0)
+
+    def test_call_larger_than_the_bucket_waits_for_a_full_bucket(self):
+        limiter = self._limiter(tokens_per_minute=6000)
+        self.assertEqual(limiter.try_acquire(100000), 0)
+        self.assertAlmostEqual(limiter.try_acquire(100000), 60.0)
+
+    def test_record_usage_corrects_the_estimate(self):
+        limiter = self._limiter(tokens_per_minute=6000)
+        limiter.acquire(1000)
+        limiter.record_usage(1000, 3000)
+        # 6000 - 3000 left
+        self.assertAlmostEqual(limiter.try_acquire(4000), 10.0)
+        limiter.record_usage(3000, 0)
+        self.assertEqual(limiter.try_acquire(4000), 0)
+
+    def test_block_for_holds_back_every_limiter_on_the_store(self):
+        first, second = self._limiter(), self._limiter()
+        first.block_for(30)
+        self.assertAlmostEqual(second.try_acquire(1), 30.0)
+        self.clock.now += 30
+        self.assertEqual(second.try_acquire(1), 0)
+
+    def test_limiters_with_different_names_are_independent(self):
+        self._limiter(name='groq').block_for(30)
+        self.assertEqual(self._limiter(name='other').try_acquire(1), 0)
+
+    def test_acquire_gives_up_after_max_wait(self):
+        limiter = self._limiter(requests_per_minute=1)
+        limiter.acquire(1)
+        with self.assertRaises(RateLimitTimeout):
+            limiter.acquire(1, max_wait=10)
+        self.assertEqual(self.clock.sleeps, [])
+
+
+class RetryAfterTests(SimpleTestCase):
+    def _error(self, headers):
+        return mock.Mock(response=mock.Mock(headers=headers))
+
+    def test_retry_after_headers(self):
+        self.assertEqual(retry_after_seconds(self._error({'retry-after-ms': '1500'})), 1.5)
+        self.assertEqual(retry_after_seconds(self._error({'retry-after': '7'})), 7.0)
+        self.assertAlmostEqual(retry_after_seconds(self._error({'x-ratelimit-reset-tokens': '2m59.5s'})), 179.5)
+        self.assertAlmostEqual(retry_after_seconds(self._error({'x-ratelimit-reset-tokens': '350ms'})), 0.35)
+
+    def test_no_hint(self):
+        self.assertIsNone(retry_after_seconds(self._error({})))
+        self.assertIsNone(retry_after_seconds(Exception("no response")))
+
+
+# =========================================================
+# LLM RESPONSE CACHE
+# =========================================================
+
+class LLMResponseCacheTests(TestCase):
+    TEXT = "Journal article text sent to the model"
+
+    def setUp(self):
+        patcher = mock.patch.dict(llm_response_cache._stats, {'hits': 0, 'misses': 0})
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def _store(self, text=TEXT, model='llama', version='v1', faculty='Juan Dela Cruz', response=None):
+        llm_response_cache.store_llm_response(model, version, faculty, text, response or {'title': text})
+
+    def _age(self, text, days):
+        LLMResponseCache.objects.filter(text_hash=llm_response_cache.sent_text_hash(text)).update(
+            created_at=timezone.now() - timedelta(days=days), last_accessed=timezone.now() - timedelta(days=days)
+        )
+
+    def test_key_is_model_prompt_version_faculty_and_text(self):
+        self._store()
+        get = llm_response_cache.get_cached_llm_response
+        self.assertEqual(get('llama', 'v1', 'Juan Dela Cruz', self.TEXT), {'title': self.TEXT})
+        self.assertIsNone(get('other-model', 'v1', 'Juan Dela Cruz', self.TEXT))
+        self.assertIsNone(get('llama', 'v2', 'Juan Dela Cruz', self.TEXT))
+        self.assertIsNone(get('llama', 'v1', 'Maria Santos', self.TEXT))
+        self.assertIsNone(get('llama', 'v1', 'Juan Dela Cruz', self.TEXT + "."))
+
+        process = llm_response_cache.get_llm_cache_stats()['process']
+        self.assertEqual(process, {'hits': 1, 'misses': 4, 'hit_rate': 0.2})
+
+    def test_failed_responses_are_not_cached(self):
+        llm_response_cache.store_llm_response('llama', 'v1', '', self.TEXT, None)
+        self.assertFalse(LLMResponseCache.objects.exists())
+
+    @override_settings(LLM_CACHE_TTL_DAYS=30)
+    def test_expired_entries_miss_and_are_evicted(self):
+        self._store("old")
+        self._store("new")
+        self._age("old", 31)
+
+        self.assertIsNone(llm_response_cache.get_cached_llm_response('llama', 'v1', 'Juan Dela Cruz', "old"))
+        llm_response_cache.evict_llm_cache()
+        self.assertEqual(LLMResponseCache.objects.count(), 1)
+
+    @override_settings(LLM_CACHE_MAX_ENTRIES=2)
+    def test_least_recently_used_entries_are_evicted_above_max_entries(self):
+        for days, text in ((3, "a"), (2, "b")):
+            self._store(text)
+            self._age(text, days)
+        # A hit refreshes 'a', so 'b' is the least recently used
+        llm_response_cache.get_cached_llm_response('llama', 'v1', 'Juan Dela Cruz', "a")
+        self._store("c")
+
+        self.assertEqual(
+            set(LLMResponseCache.objects.values_list('text_hash', flat=True)),
+            {llm_response_cache.sent_text_hash("a"), llm_response_cache.sent_text_hash("c")},
+        )
+
+    def test_concurrent_counts_are_not_lost(self):
+        def count():
+            for _ in range(5000):
+                llm_response_cache._count('hits')
+
+        threads = [threading.Thread(target=count) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(llm_response_cache._stats['hits'], 40000)
+
+
+@override_settings(GROQ_API_KEY='test-key')
+class QueryLLMCacheTests(TestCase):
+    TEXT = "Journal article text sent to the model"
+
+    def setUp(self):
+        self.client = mock.Mock()
+        self.client.chat.completions.create.side_effect = lambda **kwargs: mock.Mock(
+            choices=[mock.Mock(message=mock.Mock(content='{"title": "Fresh %d"}' % self.client.chat.completions.create.call_count))],
+            usage=mock.Mock(total_tokens=120),
+        )
+        self.limiter = mock.Mock()
+        self.limiter.acquire.return_value = 0
+        for patcher in (
+            mock.patch.object(extraction_strategies, 'get_groq_client', return_value=self.client),
+            mock.patch.object(extraction_strategies, 'get_llm_rate_limiter', return_value=self.limiter),
+        ):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def _query(self, **kwargs):
+        kwargs.setdefault('prompt_version', 'v1')
+        kwargs.setdefault('faculty_name', 'Juan Dela Cruz')
+        return extraction_strategies.query_llm_for_json("Extract the title.", self.TEXT, **kwargs)
+
+    def test_hit_skips_the_rate_limiter_and_the_api(self):
+        self.assertEqual(self._query(), {'title': 'Fresh 1'})
+        self.assertEqual(self.limiter.acquire.call_count, 1)
+
+        self.assertEqual(self._query(), {'title': 'Fresh 1'})
+        self.assertEqual(self.limiter.acquire.call_count, 1)
+        self.assertEqual(self.client.chat.completions.create.call_count, 1)
+
+    def test_different_faculty_is_a_miss(self):
+        self._query()
+        self.assertEqual(self._query(faculty_name='Maria Santos'), {'title': 'Fresh 2'})
+        self.assertEqual(self.limiter.acquire.call_count, 2)
+
+    def test_bypass_calls_the_api_and_refreshes_the_entry(self):
+        self._query()
+        self.assertEqual(self._query(bypass_cache=True), {'title': 'Fresh 2'})
+        self.assertEqual(self.limiter.acquire.call_count, 2)
+        self.assertEqual(self._query(), {'title': 'Fresh 2'})
+
+        with override_settings(LLM_CACHE_BYPASS=True):
+            self.assertEqual(self._query(), {'title': 'Fresh 3'})
+
+    def test_unversioned_prompts_are_not_cached(self):
+        self._query(prompt_version=None)
+        self._query(prompt_version=None)
+        self.assertEqual(self.client.chat.completions.create.call_count, 2)
+        self.assertFalse(LLMResponseCache.objects.exists())
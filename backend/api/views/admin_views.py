@@ -3,9 +3,12 @@ from rest_framework.decorators import api_view, permission_classes
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.response import Response
 from django.contrib.auth import get_user_model
+from django.db.models import Count, Sum
 User = get_user_model()
 
 from ..models import FacultyProfile, DocumentUpload
+from ..services.classification_cache import get_classification_cache_stats
+from ..services.llm_response_cache import get_llm_cache_stats
 from ..serializers import (
     AdminUserSerializer
 )
@@ -19,9 +22,25 @@ def admin_dashboard_stats(request):
     total_faculty = User.objects.filter(is_staff=False).count()
     total_documents = DocumentUpload.objects.count()
 
+    extraction = DocumentUpload.objects.aggregate(hits=Sum('cache_hits'), misses=Sum('cache_misses'))
+    extraction_hits = extraction['hits'] or 0
+    extraction_lookups = extraction_hits + (extraction['misses'] or 0)
+
     return Response({
         'total_faculty': total_faculty,
-        'total_documents': total_documents
+        'total_documents': total_documents,
+        'extraction_cache': {
+            'hits': extraction_hits,
+            'misses': extraction['misses'] or 0,
+            'hit_rate': round(extraction_hits / extraction_lookups, 3) if extraction_lookups else None,
+        },
+        'classification_cache': get_classification_cache_stats(),
+        'llm_cache': get_llm_cache_stats(),
+        'classification_stages': {
+            row['classification_stage']: row['count']
+            for row in DocumentUpload.objects.exclude(classification_stage__isnull=True)
+                                             .values('classification_stage').annotate(count=Count('id')).order_by()
+        },
     })
 
 @api_view(['GET'])
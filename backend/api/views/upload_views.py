@@ -3,13 +3,14 @@ from rest_framework.decorators import api_view, permission_classes
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.response import Response
 from django.contrib.auth.models import User
+from django.db import transaction
 
 from ..models import DocumentUpload
 from ..serializers import (
     DocumentUploadSerializer,
     UserSerializer
 )
-from ..services.document_processing_service import process_document_upload
+from ..tasks import enqueue_document_upload
 
 class DocumentUploadView(generics.ListCreateAPIView):
     serializer_class = DocumentUploadSerializer
@@ -19,12 +20,9 @@ class DocumentUploadView(generics.ListCreateAPIView):
         return DocumentUpload.objects.filter(user=self.request.user)
 
     def perform_create(self, serializer):
-        # Save the upload record first
+        # Save the upload record first; it stays 'pending' until a worker picks it up
         upload = serializer.save(user=self.request.user)
-        try:
-            process_document_upload(upload)
-        except Exception as e:
-            print(f"Error processing upload {upload.id}: {e}")
+        transaction.on_commit(lambda: enqueue_document_upload(upload))
 
 
 @api_view(['GET'])